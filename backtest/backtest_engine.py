@@ -0,0 +1,121 @@
+import time
+import heapq
+import asyncio
+import logging
+from typing import Dict, Iterable, Iterator, List, Union
+
+from clients.json_decoder import Frame
+from clients.trade_cache import CachedFrames
+from core.events import EventType
+from clients.sharded_websocket import ShardedWebsocketClient
+from strategy.bar_strategy_base import BarStrategyBase
+from backtest.simulated_execution import SimulatedExecutionEngine
+
+rootLogger = logging.getLogger()
+
+
+class BacktestConnection(object):
+    # Stand-in for the websocket connection of backtested clients, which accepts (and drops) subscription commands
+    open = True
+
+    async def send(self, data: str) -> None:
+        pass
+
+    async def recv(self) -> Frame:
+        raise ConnectionError('Backtest connections do not receive frames.')
+
+    async def close(self) -> None:
+        self.open = False
+
+
+def read_recorded_frames(path: str) -> Iterator[str]:
+    # Frames recorded one per line, in the order they were received
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line:
+                yield line
+
+
+def merge_trade_frames(*cached_frames: CachedFrames) -> Iterator[Frame]:
+    # Frames of the trade caches of multiple instruments in order of the timestamps of their last trades
+    for _, frame in heapq.merge(*cached_frames, key=lambda cached_frame: cached_frame[0]):
+        yield frame
+
+
+class BacktestEngine(object):
+    """
+    Replays frames of a trades feed through the websocket client, bar aggregation and event handling of a strategy
+    alike live frames, without a websocket connection. Frames are processed as fast as possible, independent of the
+    timestamps of their trades. The strategy has to be configured with a SimulatedExecutionEngine, which fills its
+    orders against the replayed trades and reports the fills to the strategy's portfolio.
+
+    Orders are placed by tasks created while handling bar events, which are run after the frame that published the
+    bar events, before the next frame is replayed.
+    """
+    def __init__(self, strategy: BarStrategyBase, frames: Iterable[Union[Frame, Dict, List]]):
+        self.strategy = strategy
+        self.frames = frames
+        self.websocket_client = strategy._websocket_client
+        self.execution_engine = strategy._execution_engine
+        if isinstance(self.websocket_client, ShardedWebsocketClient):
+            raise ValueError('Backtests replay frames through a single websocket client, got a sharded client.')
+        if not isinstance(self.execution_engine, SimulatedExecutionEngine):
+            raise ValueError(f'Backtests require a simulated execution engine, got {type(self.execution_engine).__name__}.')
+
+    async def run(self) -> Dict[str, float]:
+        client = self.websocket_client
+        if client.ws is None:
+            client.ws = BacktestConnection()
+        await self.execution_engine.start()
+        await self.strategy._subscribe_data_streams()
+        for instrument in self.strategy._instruments:
+            await client.subscribe_trades(instrument, self.execution_engine)
+
+        n_frames = 0
+        n_events = 0
+        n_trades = 0
+        start = time.perf_counter()
+        for frame in self.frames:
+            msg = client._decode_frame(frame) if isinstance(frame, (str, bytes)) else frame
+            n_frames += 1
+            if msg is None:
+                continue
+            event_list = client._handle_message(msg)
+            if not event_list:
+                continue
+
+            client._publish_events(event_list)
+            n_events += len(event_list)
+            n_trades += sum(event.type is EventType.TICK for _, event in event_list)
+            # Bar events follow the tick events of their message; only bar events trigger orders
+            if event_list[-1][1].type is EventType.BAR:
+                await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+
+        stats = self._get_stats(n_frames, n_events, n_trades, elapsed)
+        rootLogger.info(
+            f'Backtest of {self.strategy.strategy_name}-strategy replayed {n_frames} frames ({n_events} events) in '
+            f'{elapsed:.2f}s: {stats["events_per_sec"]:.0f} events/sec.'
+        )
+        return stats
+
+    def _get_stats(self, n_frames: int, n_events: int, n_trades: int, elapsed: float) -> Dict[str, float]:
+        positions = self.strategy._portfolio_manager.get_current_position().to_dict()
+        return {
+            'frames': n_frames,
+            'events': n_events,
+            'trades': n_trades,
+            'fills': len(self.execution_engine.fills),
+            'elapsed': elapsed,
+            'frames_per_sec': n_frames / elapsed if elapsed > 0 else float('inf'),
+            'events_per_sec': n_events / elapsed if elapsed > 0 else float('inf'),
+            'fees': self.execution_engine.fees,
+            'equity': self.execution_engine.get_equity(positions)
+        }
+
+    async def close(self) -> None:
+        for instrument in self.strategy._instruments:
+            await self.websocket_client.unsubscribe_trades(instrument, self.execution_engine)
+        await self.strategy.close()
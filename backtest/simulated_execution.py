@@ -0,0 +1,97 @@
+import logging
+from itertools import count
+from typing import Callable, Dict, List, Optional
+
+from core.fill import Fill
+from core.trade import Trade
+from core.instrument import Instrument
+from core.order_side import OrderSide
+from core.order_status import OrderStatus
+from core.events import Event, EventType, TradeExecutedEvent
+from execution.base_execution_engine import BaseExecutionEngine
+
+rootLogger = logging.getLogger()
+
+
+class SimulatedExecutionEngine(BaseExecutionEngine):
+    """
+    Execution engine of backtests, which fills market orders against the replayed trades instead of placing them on
+    an exchange. Orders are filled in full at the price of the next replayed trade of their instrument, i.e. the first
+    trade after the message which triggered them, moved against the order by slippage_bps basis points. Fills are
+    charged fee_rate of their notional value and recorded with the resulting cash balance.
+    """
+    def __init__(
+            self,
+            name: str = 'simulated_execution_engine',
+            save_path: Optional[str] = None,
+            fee_rate: float = 0.0,
+            slippage_bps: float = 0.0
+    ):
+        super().__init__(name, save_path)
+        self.fee_rate = fee_rate
+        self.slippage_bps = slippage_bps
+        self.fills: List[Fill] = []
+        self.cash = 0.0
+        self.fees = 0.0
+        # Price and timestamp of the last replayed trade by instrument name
+        self.last_prices: Dict[str, float] = {}
+        self.last_timestamps: Dict[str, float] = {}
+        # Orders waiting for the next trade of their instrument by instrument name
+        self._pending_trades: Dict[str, List[Trade]] = {}
+        self._order_ids = count(1)
+
+    async def start(self):
+        # Orders and fills are simulated, hence neither feed is subscribed
+        pass
+
+    async def close(self):
+        pass
+
+    async def execute_trade(self, instrument: Instrument, size: float, exec_callback: Callable):
+        trade = Trade(instrument, size, self.api_client, exec_callback)
+        trade.order_id = next(self._order_ids)
+        trade.order_status = OrderStatus.OPEN
+        self.active_trades[trade.order_id] = trade
+        self._pending_trades.setdefault(instrument.name, []).append(trade)
+
+    def handle_event(self, event: Event):
+        # Consumer of the trades feeds of the backtested instruments
+        if event.type is EventType.TICK:
+            tick = event.data
+            name = tick.instrument.name
+            self.last_prices[name] = tick.price
+            self.last_timestamps[name] = tick.timestamp
+            if name in self._pending_trades:
+                for trade in self._pending_trades.pop(name):
+                    self._fill(trade, tick)
+
+    def _fill(self, trade: Trade, tick) -> None:
+        direction = 1 if trade.side == OrderSide.BUY else -1
+        price = tick.price * (1 + direction * self.slippage_bps / 10000)
+        fee = abs(trade.size) * price * self.fee_rate
+        self.cash -= trade.size * price + fee
+        self.fees += fee
+        self.fills.append(Fill(
+            tick.timestamp,
+            trade.instrument,
+            trade.order_id,
+            len(self.fills) + 1,
+            tick.trade_id,
+            'buy' if direction > 0 else 'sell',
+            price,
+            abs(trade.size),
+            'taker',
+            self.fee_rate,
+            fee
+        ))
+
+        trade.order_status = OrderStatus.CLOSED
+        self.active_trades.pop(trade.order_id)
+        try:
+            trade.execution_callback(TradeExecutedEvent(trade, self.name))
+        except Exception as e:
+            rootLogger.error(f'Error in execution callback of simulated order {trade}: {e}')
+
+    def get_equity(self, positions: Dict[str, float]) -> float:
+        # Cash balance plus the given positions valued at the last replayed prices
+        return self.cash + sum(size * self.last_prices.get(name, 0.0) for name, size in positions.items() if size != 0)
@@ -0,0 +1,112 @@
+"""
+Measures the memory allocated for market data objects with tracemalloc, comparing the __slots__-based classes of ./core
+and the compact tick event with the __dict__-based classes they replaced. Reports bytes and allocated memory blocks
+(objects) per million ticks, or per million published bars. Run from the repository root with:
+
+    python -m benchmarks.bench_allocations
+"""
+import copy
+import tracemalloc
+from typing import Callable, Tuple
+
+from core.bar import Bar
+from core.tick import Tick
+from core.event_type import EventType
+from core.events import TickEvent, CompactTickEvent
+from core.const import FTX_TICKER_TO_INSTRUMENTS
+
+N_OBJECTS = 100000
+
+INSTRUMENT = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+
+
+##########################
+# LEGACY __dict__ LAYOUT #
+##########################
+class LegacyTick(object):
+    def __init__(self, timestamp, instrument, trade_id, price, size, side, liquidation):
+        self.timestamp = timestamp
+        self.instrument = instrument
+        self.trade_id = trade_id
+        self.price = price
+        self.size = size
+        self.side = side
+        self.liquidation = liquidation
+
+
+class LegacyTickEvent(object):
+    def __init__(self, tick, publisher_id=''):
+        self._type = EventType.TICK
+        self._data = tick
+        self._publisher_id = publisher_id
+        self.received_at = None
+        self.dispatched_at = None
+
+
+class LegacyBar(object):
+    def __init__(self, instrument, freq):
+        self.instrument = instrument
+        self.freq = freq
+        self.norm_seconds = 60.0
+        self.timestamp = 1626900540.0
+        self.open = 31708.0
+        self.high = 31710.0
+        self.low = 31700.0
+        self.close = 31705.0
+        self.volume = 1.5
+        self.is_closed = False
+
+
+##############
+# ALLOCATION #
+##############
+def measure(create: Callable[[int], object]) -> Tuple[float, float]:
+    # Objects are kept alive in a preallocated list, such that only the allocations of the objects are measured
+    objects = [None] * N_OBJECTS
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for idx in range(N_OBJECTS):
+        objects[idx] = create(idx)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats)
+    count = sum(stat.count_diff for stat in stats)
+    del objects
+    return size * 1e6 / N_OBJECTS, count * 1e6 / N_OBJECTS
+
+
+def create_legacy_tick(idx: int):
+    return LegacyTickEvent(LegacyTick(1626900540.0 + idx, INSTRUMENT, idx, 31708.0 + idx, 0.1, 'buy', False), 'ftx')
+
+
+def create_tick(idx: int):
+    return TickEvent(Tick(1626900540.0 + idx, INSTRUMENT, idx, 31708.0 + idx, 0.1, 'buy', False), 'ftx')
+
+
+def create_compact_tick(idx: int):
+    return CompactTickEvent(1626900540.0 + idx, INSTRUMENT, idx, 31708.0 + idx, 0.1, 'buy', False, 'ftx')
+
+
+def main() -> None:
+    legacy_bar = LegacyBar(INSTRUMENT, '1m')
+    bar = Bar(INSTRUMENT, '1m')
+    bar.merge(1626900540.0, 31708.0, 31710.0, 31700.0, 31705.0, 1.5)
+
+    print(f'Memory allocated per million objects (measured over {N_OBJECTS} objects)')
+    print(f'{"objects":>36} {"MB":>8} {"blocks":>10}')
+    for name, create in [
+        ('Tick + TickEvent (__dict__)', create_legacy_tick),
+        ('Tick + TickEvent (__slots__)', create_tick),
+        ('CompactTickEvent', create_compact_tick),
+        ('copy.copy(Bar) (__dict__)', lambda idx: copy.copy(legacy_bar)),
+        ('copy.copy(Bar) (__slots__)', lambda idx: copy.copy(bar)),
+        ('Bar.snapshot()', lambda idx: bar.snapshot())
+    ]:
+        size, count = measure(create)
+        print(f'{name:>36} {size / 1e6:>8.1f} {count:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures the replay throughput of the backtest engine, which runs the example strategy on 1-minute bars of BTC-PERP
+with simulated execution. Trades are replayed as frames of the FTX trades feed holding a few trades each, spread over
+one simulated day. Reports events (ticks and bars) and trades per second and the resulting replay time of a month of
+trades at MONTHLY_TRADES trades. Run from the repository root with:
+
+    python -m benchmarks.bench_backtest
+"""
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List
+from unittest.mock import Mock
+
+from backtest.backtest_engine import BacktestEngine
+from backtest.simulated_execution import SimulatedExecutionEngine
+from clients.ftx.ftx_websocket import FTXWebsocketClient
+from core.const import FTX_TICKER_TO_INSTRUMENTS
+from portfolio.portfolio import Portfolio
+from strategy.strategy_implementations.example_strategy import ExampleBarStrategy
+
+N_FRAMES = 100000
+TRADES_PER_FRAME = 4
+START = 1626912000.0
+# Order of magnitude of the number of BTC-PERP trades per month
+MONTHLY_TRADES = 30000000
+
+
+def get_frames() -> List[str]:
+    # Frames spread evenly over one day, with prices following a sawtooth around 31700
+    frames = []
+    for frame_idx in range(N_FRAMES):
+        timestamp = START + frame_idx * 86400 / N_FRAMES
+        time_str = datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+        trades = [
+            {
+                'id': frame_idx * TRADES_PER_FRAME + idx,
+                'price': 31700.0 + (frame_idx * TRADES_PER_FRAME + idx) % 97 - 48,
+                'size': 0.01,
+                'side': 'buy' if idx % 2 == 0 else 'sell',
+                'liquidation': False,
+                'time': time_str
+            }
+            for idx in range(TRADES_PER_FRAME)
+        ]
+        frames.append(json.dumps({'channel': 'trades', 'market': 'BTC-PERP', 'type': 'update', 'data': trades}))
+    return frames
+
+
+def get_config(websocket_params: Dict) -> Dict:
+    return {
+        'exchange': {
+            'api_client': Mock,
+            'websocket_client': FTXWebsocketClient,
+            'api_keys': {'key': f'bench_{len(websocket_params)}'},
+            'websocket_params': websocket_params
+        },
+        'instruments': [FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']],
+        'strategy_params': {'bar_freq': '1m', 'bar_updates': 'close', 'price_df_min_window': 60},
+        'trading_volume': 10000.0,
+        'portfolio_manager': Portfolio,
+        'execution_engine': SimulatedExecutionEngine,
+        'position_save_path': '',
+        'execution_save_path': None
+    }
+
+
+async def run_backtest(frames: List[str], websocket_params: Dict) -> Dict[str, float]:
+    strategy = ExampleBarStrategy(get_config(websocket_params))
+    engine = BacktestEngine(strategy, frames)
+    stats = await engine.run()
+    await engine.close()
+    return stats
+
+
+def main() -> None:
+    # Rebalancing logs every minute bar
+    logging.getLogger().setLevel(logging.WARNING)
+    frames = get_frames()
+    print(f'Backtest replay ({N_FRAMES} frames, {N_FRAMES * TRADES_PER_FRAME} trades over one day)')
+    print(f'{"tick events":>14} {"events/sec":>12} {"trades/sec":>12} {"fills":>6} {"month (min)":>12}')
+    for label, websocket_params in [('tick', {}), ('compact', {'compact_tick_events': True})]:
+        stats = asyncio.run(run_backtest(frames, websocket_params))
+        trades_per_sec = stats['trades'] / stats['elapsed']
+        month_minutes = MONTHLY_TRADES / trades_per_sec / 60
+        print(f'{label:>14} {stats["events_per_sec"]:>12.0f} {trades_per_sec:>12.0f} {stats["fills"]:>6} {month_minutes:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
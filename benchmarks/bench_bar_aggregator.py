@@ -0,0 +1,80 @@
+"""
+Compares the per-tick and the vectorized batch path of the bar aggregator on trades messages of increasing size,
+aggregated into bars of three frequencies, as well as the per-tick cost with and without roll-up of coarser bars for an
+increasing number of frequencies. Run from the repository root with:
+
+    python -m benchmarks.bench_bar_aggregator
+"""
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from core.tick import Tick
+from core.const import FTX_TICKER_TO_INSTRUMENTS
+from clients.bar_aggregator import BarAggregator
+
+N_TICKS = 100000
+MESSAGE_SIZES = (1, 4, 16, 32, 64, 200, 1000)
+FREQUENCIES = ('1m', '5m', '60m')
+ROLL_UP_FREQUENCIES = ('1m', '5m', '15m', '30m', '60m', '4h', '1d')
+
+INSTRUMENT = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+
+
+def get_ticks(n_ticks: int) -> List[Tick]:
+    # Trades arriving at ~50 trades per second
+    rng = np.random.default_rng(0)
+    timestamps = 1626900540 + np.cumsum(rng.exponential(0.02, n_ticks))
+    prices = 31708 + np.cumsum(rng.normal(0, 0.5, n_ticks))
+    sizes = rng.exponential(0.1, n_ticks)
+    return [
+        Tick(ts, INSTRUMENT, idx, price, size, 'buy', False)
+        for idx, (ts, price, size) in enumerate(zip(timestamps.tolist(), prices.tolist(), sizes.tolist()))
+    ]
+
+
+def run_aggregator(
+        ticks: List[Tick],
+        message_size: int,
+        batch_threshold: int,
+        frequencies: Tuple[str, ...] = FREQUENCIES,
+        roll_up: bool = False,
+        update_interval: Optional[float] = 0.0
+) -> float:
+    aggregator = BarAggregator('benchmark', batch_threshold=batch_threshold, roll_up=roll_up)
+    for freq in frequencies:
+        aggregator.add_bar(INSTRUMENT, freq, f'bar.{INSTRUMENT.instrument_id}.{freq}', update_interval)
+    messages = [ticks[idx:idx + message_size] for idx in range(0, len(ticks), message_size)]
+
+    start = time.perf_counter()
+    for message_ticks in messages:
+        aggregator.update(INSTRUMENT, message_ticks)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    ticks = get_ticks(N_TICKS)
+    print(f'Aggregation of {N_TICKS} ticks into {len(FREQUENCIES)} bar frequencies (µs per tick)')
+    print(f'{"ticks/message":>14} {"per-tick":>10} {"batch":>10} {"speedup":>8}')
+    for message_size in MESSAGE_SIZES:
+        per_tick_time = run_aggregator(ticks, message_size, batch_threshold=N_TICKS + 1)
+        batch_time = run_aggregator(ticks, message_size, batch_threshold=1)
+        print(
+            f'{message_size:>14} {per_tick_time / N_TICKS * 1e6:>10.3f} {batch_time / N_TICKS * 1e6:>10.3f} '
+            f'{per_tick_time / batch_time:>7.2f}x'
+        )
+
+    # Completed bars only, such that the cost is not dominated by the update events published per message and frequency
+    print(f'\nAggregation of {N_TICKS} ticks (4 per message) into completed bars with and without roll-up (µs per tick)')
+    print(f'{"frequencies":>14} {"direct":>10} {"roll-up":>10}')
+    for n_frequencies in range(1, len(ROLL_UP_FREQUENCIES) + 1):
+        frequencies = ROLL_UP_FREQUENCIES[:n_frequencies]
+        params = dict(batch_threshold=N_TICKS + 1, frequencies=frequencies, update_interval=None)
+        direct_time = run_aggregator(ticks, 4, **params)
+        roll_up_time = run_aggregator(ticks, 4, roll_up=True, **params)
+        print(f'{n_frequencies:>14} {direct_time / N_TICKS * 1e6:>10.3f} {roll_up_time / N_TICKS * 1e6:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
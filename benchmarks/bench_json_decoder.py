@@ -0,0 +1,56 @@
+"""
+Replays the websocket fixture messages of ./tests/clients/* through all installed JSON backends and reports decoded
+messages per second. Run from the repository root with:
+
+    python -m benchmarks.bench_json_decoder
+"""
+import json
+import time
+from typing import Callable, List
+
+from clients.json_decoder import JSON_BACKENDS, peek_field, peek_list_tail
+from benchmarks.fixtures import FIXTURE_MODULES, get_fixture_frames, get_ftx_burst_trades_msg
+
+N_ROUNDS = 20000
+
+
+def measure(func: Callable, frames: List[str], n_rounds: int = N_ROUNDS) -> float:
+    start = time.perf_counter()
+    for _ in range(n_rounds):
+        for frame in frames:
+            func(frame)
+    return n_rounds * len(frames) / (time.perf_counter() - start)
+
+
+def peek_ftx(frame: str):
+    return peek_field(frame, 'channel'), peek_field(frame, 'type'), peek_field(frame, 'market')
+
+
+def peek_kraken_futures(frame: str):
+    return peek_field(frame, 'feed'), peek_field(frame, 'product_id')
+
+
+PEEK_FUNCTIONS = {
+    'ftx': peek_ftx,
+    'kraken_spot': peek_list_tail,
+    'kraken_futures': peek_kraken_futures,
+}
+
+
+def main():
+    print(f'{"exchange":<16}{"backend":<12}{"msg/s":>14}')
+    for exchange in FIXTURE_MODULES.keys():
+        frames = get_fixture_frames(exchange)
+        for backend, loads in JSON_BACKENDS.items():
+            print(f'{exchange:<16}{backend:<12}{measure(loads, frames):>14,.0f}')
+        print(f'{exchange:<16}{"peek":<12}{measure(PEEK_FUNCTIONS[exchange], frames):>14,.0f}')
+
+    # A single trades message with 200 trades, where prefix peeking is independent of message size
+    frames = [json.dumps(get_ftx_burst_trades_msg(), separators=(',', ':'))]
+    for backend, loads in JSON_BACKENDS.items():
+        print(f'{"ftx (burst)":<16}{backend:<12}{measure(loads, frames, N_ROUNDS // 10):>14,.0f}')
+    print(f'{"ftx (burst)":<16}{"peek":<12}{measure(peek_ftx, frames, N_ROUNDS // 10):>14,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Compares the table-driven message routing of the websocket clients with the predicate chains (is_subscription_msg,
+is_pong, ..., is_feed_msg followed by an if/elif chain on the channel) they replaced. Run from the repository root with:
+
+    python -m benchmarks.bench_message_router
+"""
+import time
+from typing import Callable, Dict, List, Union
+
+from clients.ftx.ftx_websocket import FTXWebsocketClient
+from clients.kraken.spot.kraken_spot_ws import KrakenSpotWSClient
+from clients.kraken.futures.kraken_futures_ws import KrakenFuturesWSClient
+from benchmarks.fixtures import get_fixture_messages
+
+N_ROUNDS = 200000
+
+
+###########################
+# LEGACY PREDICATE CHAINS #
+###########################
+def route_ftx_legacy(msg: Dict) -> str:
+    if msg['type'] == 'error':
+        return 'error'
+    elif msg['type'] in {'subscribed', 'unsubscribed'}:
+        return 'subscription'
+    elif msg['type'] == 'info':
+        return 'info'
+    elif msg['type'] == 'pong':
+        return 'pong'
+    elif msg.get('channel', '') in ['trades', 'ticker', 'fills', 'orders']:
+        if msg['channel'] == 'trades':
+            return 'trades'
+        elif msg['channel'] == 'ticker':
+            return 'ticker'
+        elif msg['channel'] == 'fills':
+            return 'fills'
+        elif msg['channel'] == 'orders':
+            return 'orders'
+    return 'unknown'
+
+
+def route_kraken_spot_legacy(msg: Union[List, Dict]) -> str:
+    if isinstance(msg, Dict) and msg['event'] == 'error':
+        return 'error'
+    elif isinstance(msg, Dict) and msg['event'] == 'subscriptionStatus':
+        return 'subscription'
+    elif (isinstance(msg, Dict) and msg['event'] == 'pong') or (isinstance(msg, Dict) and msg['event'] == 'heartbeat'):
+        return 'pong'
+    elif isinstance(msg, List):
+        if msg[-2] == 'trade':
+            return 'trade'
+        elif msg[-2] == 'spread':
+            return 'spread'
+        elif msg[-2] == 'openOrders':
+            return 'openOrders'
+    return 'unknown'
+
+
+def route_kraken_futures_legacy(msg: Dict) -> str:
+    if msg.get('event', '') == 'error':
+        return 'error'
+    elif isinstance(msg, dict) and 'event' in msg.keys() and msg['event'] == 'challenge':
+        return 'challenge'
+    elif isinstance(msg, dict) and 'event' in msg.keys() and (msg['event'] == 'subscribed' or msg['event'] == 'unsubscribed'):
+        return 'subscription'
+    elif msg.get('feed', '') == 'heartbeat':
+        return 'heartbeat'
+    elif msg.get('event', '') == 'alert':
+        return 'alert'
+    elif 'feed' in msg.keys():
+        if msg["feed"] == "ticker":
+            return 'ticker'
+        elif msg["feed"] == "fills_snapshot" or msg["feed"] == "fills":
+            return 'fills'
+        elif msg["feed"] == "open_orders_snapshot" or msg["feed"] == "open_orders":
+            return 'open_orders'
+        elif msg["feed"] == "trade_snapshot" or msg["feed"] == "trade":
+            return 'trade'
+    return 'unknown'
+
+
+def measure(func: Callable, messages: List, n_rounds: int = N_ROUNDS) -> float:
+    start = time.perf_counter()
+    for _ in range(n_rounds):
+        for msg in messages:
+            func(msg)
+    return n_rounds * len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    clients = {
+        'ftx': (FTXWebsocketClient({}), route_ftx_legacy),
+        'kraken_spot': (KrakenSpotWSClient({}), route_kraken_spot_legacy),
+        'kraken_futures': (KrakenFuturesWSClient({}), route_kraken_futures_legacy),
+    }
+
+    print(f'{"exchange":<16}{"router":<10}{"msg/s":>14}')
+    for exchange, (client, route_legacy) in clients.items():
+        messages = list(get_fixture_messages(exchange).values())
+        handlers, get_route_key = client._message_handlers, client._get_route_key
+
+        def route_table(msg):
+            return handlers.get(get_route_key(msg))
+
+        print(f'{exchange:<16}{"legacy":<10}{measure(route_legacy, messages):>14,.0f}')
+        print(f'{exchange:<16}{"table":<10}{measure(route_table, messages):>14,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares the price ring buffers of BarStrategyBase with the data frames they replaced, which appended every bar update
+by .loc and resliced the time window afterwards. Reports the time per bar update for windows of increasing length (in
+bars); bars are updated twice before they are rolled, as with bar updates after every trades message. Run from the
+repository root with:
+
+    python -m benchmarks.bench_price_buffer
+"""
+import time
+from typing import List
+
+import pandas as pd
+
+from core.bar import BarSnapshot
+from core.const import FTX_TICKER_TO_INSTRUMENTS
+from strategy.price_buffer import PriceBuffer
+
+N_UPDATES = 2000
+
+INSTRUMENT = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+
+
+def get_bars(n_bars: int) -> List[BarSnapshot]:
+    return [
+        BarSnapshot(INSTRUMENT, '1s', 1626900540.0 + idx // 2, 31708.0, 31710.0, 31700.0, 31705.0 + idx, 1.5, False)
+        for idx in range(n_bars)
+    ]
+
+
+##########################
+# LEGACY DATA FRAME PATH #
+##########################
+def update_price_df(price_df: pd.DataFrame, bar: BarSnapshot, window: pd.Timedelta) -> pd.DataFrame:
+    candle_ts = pd.Timestamp(bar.timestamp, unit='s', tz='utc')
+    price_df.loc[candle_ts, :] = {'open': bar.open, 'high': bar.high, 'low': bar.low, 'close': bar.close, 'volume': bar.volume}
+    return price_df.loc[candle_ts - window:candle_ts]
+
+
+def run_legacy(window_bars: int) -> float:
+    bars = get_bars(2 * window_bars + N_UPDATES)
+    window = pd.Timedelta(seconds=window_bars)
+    price_df = pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume'])
+    for bar in bars[:-N_UPDATES]:
+        price_df = update_price_df(price_df, bar, window)
+
+    start = time.perf_counter()
+    for bar in bars[-N_UPDATES:]:
+        price_df = update_price_df(price_df, bar, window)
+    return time.perf_counter() - start
+
+
+################
+# PRICE BUFFER #
+################
+def run_price_buffer(window_bars: int) -> float:
+    bars = get_bars(2 * window_bars + N_UPDATES)
+    price_buffer = PriceBuffer(window_bars + 1)
+    for bar in bars[:-N_UPDATES]:
+        price_buffer.update(bar)
+
+    start = time.perf_counter()
+    for bar in bars[-N_UPDATES:]:
+        price_buffer.update(bar)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    print(f'Bar updates of the price history ({N_UPDATES} updates, us per update)')
+    print(f'{"window (bars)":>14} {"data frame":>12} {"ring buffer":>12}')
+    for window_bars in [100, 1000, 10000]:
+        legacy = run_legacy(window_bars) / N_UPDATES * 1e6
+        buffered = run_price_buffer(window_bars) / N_UPDATES * 1e6
+        print(f'{window_bars:>14} {legacy:>12.1f} {buffered:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares parse_timestamp with datetime.fromisoformat and ciso8601 on streams of FTX trade timestamps: distinct
+timestamps of consecutive trades, and timestamps of which half are repeated as in trades messages of taker orders
+filled against multiple makers. On CPython 3.11, parsing seconds and fraction of timestamps of a cached minute in
+Python is slower than parsing the whole timestamp by ciso8601. Run from the repository root with:
+
+    python -m benchmarks.bench_timestamp_parser
+"""
+import time
+from datetime import datetime, timezone
+from typing import Callable, List
+
+import numpy as np
+from ciso8601 import parse_datetime
+
+from utils.timestamp_parser import parse_timestamp
+
+N_TIMESTAMPS = 200000
+
+
+def get_timestamps(n_timestamps: int, repeated: bool) -> List[str]:
+    # Trades arriving at ~50 trades per second with microsecond timestamps, of which half share the timestamp of their
+    # predecessor if repeated
+    rng = np.random.default_rng(0)
+    intervals = rng.exponential(0.02, n_timestamps)
+    if repeated:
+        intervals *= rng.integers(0, 2, n_timestamps)
+    timestamps = 1626900540 + np.cumsum(intervals)
+    return [datetime.fromtimestamp(ts, timezone.utc).isoformat() for ts in timestamps.tolist()]
+
+
+def parse_ciso8601(value: str) -> float:
+    return parse_datetime(value).timestamp()
+
+
+def parse_fromisoformat(value: str) -> float:
+    return datetime.fromisoformat(value).timestamp()
+
+
+def run_parser(parse: Callable[[str], float], values: List[str]) -> float:
+    start = time.perf_counter()
+    for value in values:
+        parse(value)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    streams = {'distinct': get_timestamps(N_TIMESTAMPS, False), 'repeated': get_timestamps(N_TIMESTAMPS, True)}
+    print(f'Parsing of {N_TIMESTAMPS} timestamps (ns per timestamp)')
+    print(f'{"":>24} {"distinct":>9} {"repeated":>9}')
+    for name, parse in [
+        ('datetime.fromisoformat', parse_fromisoformat),
+        ('ciso8601', parse_ciso8601),
+        ('parse_timestamp', parse_timestamp)
+    ]:
+        timings = [run_parser(parse, values) / N_TIMESTAMPS * 1e9 for values in streams.values()]
+        print(f'{name:>24} {timings[0]:>9.0f} {timings[1]:>9.0f}')
+
+
+if __name__ == '__main__':
+    main()
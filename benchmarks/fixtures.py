@@ -0,0 +1,32 @@
+import copy
+import json
+from types import ModuleType
+from typing import Dict, List
+
+from tests.clients.ftx import test_ftx_websocket
+from tests.clients.kraken.spot import test_kraken_spot_websocket
+from tests.clients.kraken.futures import test_kraken_futures_websocket
+
+FIXTURE_MODULES: Dict[str, ModuleType] = {
+    'ftx': test_ftx_websocket,
+    'kraken_spot': test_kraken_spot_websocket,
+    'kraken_futures': test_kraken_futures_websocket,
+}
+
+
+def get_fixture_messages(exchange: str) -> Dict[str, object]:
+    module = FIXTURE_MODULES[exchange]
+    return {name: value for name, value in vars(module).items() if name.endswith('_MSG')}
+
+
+def get_fixture_frames(exchange: str) -> List[str]:
+    # Websocket frames as sent by the exchanges, i.e. compact JSON
+    return [json.dumps(msg, separators=(',', ':')) for msg in get_fixture_messages(exchange).values()]
+
+
+def get_ftx_burst_trades_msg(n_trades: int = 200) -> Dict:
+    # Trades message as received under bursty trade flow, built by repeating the trades of the FTX fixture message
+    msg = copy.deepcopy(test_ftx_websocket.TRADES_MSG)
+    trades = msg['data']
+    msg['data'] = [dict(trades[idx % len(trades)], id=trades[0]['id'] + idx) for idx in range(n_trades)]
+    return msg
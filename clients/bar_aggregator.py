@@ -0,0 +1,397 @@
+import math
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from core.bar import Bar, BarSnapshot, InformationBar, get_bar
+from core.tick import Tick
+from core.events import BarEvent
+from core.instrument import Instrument
+
+# Emission policies of bar updates: completed bars only or an update of the current bar after every trades message.
+# Alternatively, updates are throttled to at most one per given number of milliseconds.
+BAR_UPDATES_CLOSE = 'close'
+BAR_UPDATES_ALL = 'all'
+
+
+def get_update_interval(updates: Union[str, int, float]) -> Optional[float]:
+    # Minimum interval between updates of the current bar in seconds; None if only completed bars are published
+    if updates == BAR_UPDATES_CLOSE:
+        return None
+    elif updates == BAR_UPDATES_ALL:
+        return 0.0
+    elif isinstance(updates, (int, float)) and not isinstance(updates, bool) and updates >= 0:
+        return updates / 1000
+    raise ValueError(f'Invalid bar update policy: {updates}')
+
+
+def get_most_permissive_interval(update_intervals: Iterable[Optional[float]]) -> Optional[float]:
+    # Bars without requested update interval are updated after every trades message
+    return min(update_intervals, key=lambda interval: math.inf if interval is None else interval, default=0.0)
+
+
+class BarUpdateFilter(object):
+    """
+    Consumer of bar events forwarding them to a consumer with a stricter update policy than the bar is aggregated at,
+    which happens if consumers of different policies share the bar: completed bars are always forwarded, updates of the
+    current bar at most once per update interval of the consumer (in trade time) or not at all (None).
+    """
+    __slots__ = ('consumer', 'update_interval', '_last_update_at')
+
+    def __init__(self, consumer: object, update_interval: Optional[float]):
+        self.consumer = consumer
+        self.update_interval = update_interval
+        self._last_update_at: Optional[float] = None
+
+    def handle_event(self, event: BarEvent) -> None:
+        if event.data.is_closed:
+            # The first update of the next bar is never throttled
+            self._last_update_at = None
+        elif self.update_interval is None:
+            return
+        elif self._last_update_at is not None and event.updated_at - self._last_update_at < self.update_interval:
+            return
+        else:
+            self._last_update_at = event.updated_at
+        self.consumer.handle_event(event)
+
+
+class _AggregatedBar:
+    def __init__(self, sub_key: str, bar: Bar, update_interval: Optional[float]):
+        self.sub_key = sub_key
+        self.bar = bar
+        self.update_interval = update_interval
+        # Trade timestamp of the last published update of the current bar, by which updates are throttled
+        self.last_update_at: Optional[float] = None
+        # Finer bar this bar is rolled up from; None for bars aggregated from ticks
+        self.source: Optional[_AggregatedBar] = None
+        # Close of the last completed bar, which is carried forward by bars of intervals without trades
+        self.last_close: Optional[float] = None
+
+
+class BarAggregator:
+    """
+    Exchange-agnostic aggregation of ticks into bars of arbitrary frequencies. Websocket clients feed the parsed ticks
+    of every trades message into the aggregator, which returns the (subscription key, bar event) tuples to publish:
+    one event per completed bar and, depending on the update interval of the bar, one update event of every current
+    bar. Update intervals are measured in trade time, such that replayed trades are aggregated alike. Bar events carry
+    immutable snapshots of the bars, while the mutable bars being aggregated are private to the aggregator.
+
+    Messages of at least batch_threshold ticks are aggregated into time bars by a vectorized batch path, which converts
+    the ticks into arrays once and splits them into runs of ticks of the same bar interval per frequency. Information
+    bars (tick, volume, dollar and imbalance bars) are always updated tick by tick.
+
+    With roll_up, time bars are rolled up from the finest time bar of the instrument aggregated from ticks if their
+    frequency is a multiple of it: completed finer bars are merged into the coarser bars, whose updates additionally
+    include the finer bar in progress. Hence, the cost per tick does not grow with the number of frequencies.
+
+    Time bars are completed by the first tick of a later interval or, independent of trading activity, by close_bars
+    once their interval has passed. Bars closed by time are followed by a pending bar of the next interval, which is
+    published as carry-forward bar (last close, no volume) if no tick arrives in its interval. Ticks of an interval
+    before the current bar (e.g. arriving after their bar has been closed by time) are dropped and counted by
+    late_ticks, since they would corrupt the open and volume of the current bar.
+    """
+    def __init__(self, publisher_id: str, batch_threshold: int = 64, roll_up: bool = False):
+        self.publisher_id = publisher_id
+        self.batch_threshold = batch_threshold
+        self.roll_up = roll_up
+        # Aggregated bars by instrument id and frequency
+        self._bars: Dict[str, Dict[str, _AggregatedBar]] = {}
+        # Number of dropped ticks of intervals before the current time bar
+        self.late_ticks = 0
+
+    def __contains__(self, instrument_id: str) -> bool:
+        return instrument_id in self._bars
+
+    def __len__(self) -> int:
+        return len(self._bars)
+
+    def add_bar(self, instrument: Instrument, freq: str, sub_key: str, update_interval: Optional[float] = 0.0) -> None:
+        # Bars already aggregated keep their state; only their update interval is replaced
+        instrument_bars = self._bars.setdefault(instrument.instrument_id, {})
+        if freq in instrument_bars:
+            instrument_bars[freq].update_interval = update_interval
+            return
+
+        aggregated_bar = _AggregatedBar(sub_key, get_bar(instrument, freq), update_interval)
+        if self.roll_up:
+            aggregated_bar.source = self._get_source(instrument_bars.values(), aggregated_bar.bar)
+            if aggregated_bar.source is None:
+                # Coarser bars are rolled up from the new bar if it is finer than their source (in order of increasing
+                # length, such that bars switching to the new bar are no longer sources of others). Their previous
+                # source keeps its bar in progress, which is taken over.
+                for other_bar in instrument_bars.values():
+                    candidates = [aggregated_bar] + ([other_bar.source] if other_bar.source is not None else [])
+                    if self._get_source(candidates, other_bar.bar) is aggregated_bar:
+                        if other_bar.source is not None:
+                            self._merge_source_bar(other_bar.bar, other_bar.source.bar)
+                        other_bar.source = aggregated_bar
+        instrument_bars[freq] = aggregated_bar
+        self._sort_bars(instrument_bars)
+
+    @staticmethod
+    def _sort_bars(instrument_bars: Dict[str, _AggregatedBar]) -> None:
+        # Information bars followed by time bars of increasing length, such that sources are updated before the bars
+        # rolled up from them, independent of the order of subscription
+        sorted_bars = sorted(
+            instrument_bars.items(),
+            key=lambda item: (item[1].bar.is_time_bar, item[1].bar.norm_seconds if item[1].bar.is_time_bar else 0)
+        )
+        instrument_bars.clear()
+        instrument_bars.update(sorted_bars)
+
+    def remove_bar(self, instrument: Instrument, freq: str) -> None:
+        instrument_bars = self._bars.get(instrument.instrument_id, {})
+        removed_bar = instrument_bars.pop(freq, None)
+        if len(instrument_bars) == 0:
+            self._bars.pop(instrument.instrument_id, None)
+
+        # Bars rolled up from the removed bar take over its bar in progress and are aggregated from ticks henceforth
+        for aggregated_bar in instrument_bars.values():
+            if removed_bar is not None and aggregated_bar.source is removed_bar:
+                self._merge_source_bar(aggregated_bar.bar, removed_bar.bar)
+                aggregated_bar.source = None
+
+    @staticmethod
+    def _get_source(aggregated_bars: Iterable[_AggregatedBar], bar: Bar) -> Optional[_AggregatedBar]:
+        # Bars are only rolled up from bars aggregated from ticks, whose intervals are nested within their own
+        candidates = [
+            aggregated_bar for aggregated_bar in aggregated_bars
+            if aggregated_bar.source is None and aggregated_bar.bar.is_time_bar and bar.is_time_bar
+            and aggregated_bar.bar.norm_seconds < bar.norm_seconds
+            and bar.norm_seconds % aggregated_bar.bar.norm_seconds == 0
+        ]
+        return min(candidates, key=lambda aggregated_bar: aggregated_bar.bar.norm_seconds, default=None)
+
+    @staticmethod
+    def _merge_source_bar(bar: Bar, source_bar: Union[Bar, BarSnapshot]) -> None:
+        if source_bar.timestamp is None:
+            return
+
+        timestamp = (source_bar.timestamp // bar.norm_seconds) * bar.norm_seconds
+        if source_bar.volume > 0:
+            bar.merge(timestamp, source_bar.open, source_bar.high, source_bar.low, source_bar.close, source_bar.volume)
+        elif bar.timestamp is None:
+            # Finer bars without trades (pending or carried forward) only open the interval of the coarser bar
+            bar.timestamp = timestamp
+
+    def get_next_close_time(self) -> Optional[float]:
+        # End of the earliest interval of all current time bars
+        return min(
+            (
+                aggregated_bar.bar.timestamp + aggregated_bar.bar.norm_seconds
+                for instrument_bars in self._bars.values() for aggregated_bar in instrument_bars.values()
+                if aggregated_bar.bar.is_time_bar and aggregated_bar.bar.timestamp is not None
+            ),
+            default=None
+        )
+
+    def close_bars(self, until: float) -> List[Tuple[str, BarEvent]]:
+        # Publishes all time bars whose intervals ended until the given time, also for intervals without trades
+        bar_events = []
+        for instrument_bars in self._bars.values():
+            completed_bars: Dict[str, List[BarSnapshot]] = {}
+            for aggregated_bar in instrument_bars.values():
+                if not aggregated_bar.bar.is_time_bar:
+                    continue
+
+                n_events = len(bar_events)
+                if aggregated_bar.source is not None:
+                    source_bars = completed_bars[aggregated_bar.source.sub_key]
+                    bar_events.extend(self._merge_source_bars(aggregated_bar, source_bars))
+                bar_events.extend(self._close_bar_by_time(aggregated_bar, until))
+                completed_bars[aggregated_bar.sub_key] = [event.data for _, event in bar_events[n_events:]]
+        return bar_events
+
+    def _close_bar_by_time(self, aggregated_bar: _AggregatedBar, until: float) -> List[Tuple[str, BarEvent]]:
+        bar_events = []
+        current_bar = aggregated_bar.bar
+        while current_bar.timestamp is not None and current_bar.timestamp + current_bar.norm_seconds <= until:
+            next_timestamp = current_bar.timestamp + current_bar.norm_seconds
+            closed_bar_events = self._close_bar(aggregated_bar)
+            if not closed_bar_events:
+                break
+            bar_events.extend(closed_bar_events)
+            current_bar.timestamp = next_timestamp
+        return bar_events
+
+    def update(self, instrument: Instrument, ticks: List[Tick]) -> List[Tuple[str, BarEvent]]:
+        instrument_bars = self._bars.get(instrument.instrument_id)
+        if instrument_bars is None or not ticks:
+            return []
+
+        bar_events = []
+        arrays = None
+        # Completed bars by subscription key of the bars aggregated from ticks, from which coarser bars are rolled up
+        completed_bars: Dict[str, List[BarSnapshot]] = {}
+        for aggregated_bar in instrument_bars.values():
+            if aggregated_bar.source is not None:
+                source_bars = completed_bars[aggregated_bar.source.sub_key]
+                bar_events.extend(self._roll_up_bar(aggregated_bar, source_bars, ticks[-1].timestamp))
+                continue
+
+            n_events = len(bar_events)
+            if not aggregated_bar.bar.is_time_bar:
+                bar_events.extend(self._update_information_bar(aggregated_bar, ticks))
+            elif len(ticks) >= self.batch_threshold:
+                if arrays is None:
+                    n_ticks = len(ticks)
+                    arrays = (
+                        np.fromiter((tick.timestamp for tick in ticks), dtype=float, count=n_ticks),
+                        np.fromiter((tick.price for tick in ticks), dtype=float, count=n_ticks),
+                        np.fromiter((tick.size for tick in ticks), dtype=float, count=n_ticks)
+                    )
+                bar_events.extend(self._update_bar_batch(aggregated_bar, *arrays))
+            else:
+                bar_events.extend(self._update_bar(aggregated_bar, ticks))
+            if self.roll_up:
+                completed_bars[aggregated_bar.sub_key] = [
+                    event.data for _, event in bar_events[n_events:] if event.data.is_closed
+                ]
+        return bar_events
+
+    def _update_bar(self, aggregated_bar: _AggregatedBar, ticks: List[Tick]) -> List[Tuple[str, BarEvent]]:
+        bar_events = []
+        current_bar = aggregated_bar.bar
+        for tick in ticks:
+            if current_bar.is_complete(tick.timestamp):
+                # Current bar is completed and should be published; initialize new bar object
+                bar_events.extend(self._close_bar(aggregated_bar))
+            elif current_bar.timestamp is not None and tick.timestamp < current_bar.timestamp:
+                self.late_ticks += 1
+                continue
+            current_bar.update_bar(tick.timestamp, tick.price, tick.size)
+
+        bar_events.extend(self._get_update_events(aggregated_bar, ticks[-1].timestamp))
+        return bar_events
+
+    def _update_information_bar(self, aggregated_bar: _AggregatedBar, ticks: List[Tick]) -> List[Tuple[str, BarEvent]]:
+        bar_events = []
+        current_bar: InformationBar = aggregated_bar.bar
+        for tick in ticks:
+            current_bar.update_bar(tick.timestamp, tick.price, tick.size, tick.side)
+            if current_bar.is_full():
+                bar_events.extend(self._close_bar(aggregated_bar))
+
+        bar_events.extend(self._get_update_events(aggregated_bar, ticks[-1].timestamp))
+        return bar_events
+
+    def _roll_up_bar(
+            self,
+            aggregated_bar: _AggregatedBar,
+            source_bars: List[BarSnapshot],
+            timestamp: float
+    ) -> List[Tuple[str, BarEvent]]:
+        bar_events = self._merge_source_bars(aggregated_bar, source_bars)
+
+        # The finer bar in progress completes the current bar as soon as it is part of the next interval
+        source_timestamp = aggregated_bar.source.bar.timestamp
+        if source_timestamp is not None and aggregated_bar.bar.is_complete(source_timestamp):
+            bar_events.extend(self._close_bar(aggregated_bar))
+
+        bar_events.extend(self._get_update_events(aggregated_bar, timestamp))
+        return bar_events
+
+    def _merge_source_bars(self, aggregated_bar: _AggregatedBar, source_bars: List[BarSnapshot]) -> List[Tuple[str, BarEvent]]:
+        bar_events = []
+        current_bar = aggregated_bar.bar
+        for source_bar in source_bars:
+            if current_bar.is_complete(source_bar.timestamp):
+                bar_events.extend(self._close_bar(aggregated_bar))
+            self._merge_source_bar(current_bar, source_bar)
+        return bar_events
+
+    def _update_bar_batch(
+            self,
+            aggregated_bar: _AggregatedBar,
+            timestamps: np.ndarray,
+            prices: np.ndarray,
+            sizes: np.ndarray
+    ) -> List[Tuple[str, BarEvent]]:
+        # Runs of consecutive ticks in the same bar interval are aggregated at once, which is equivalent to updating
+        # the bar tick by tick: a run of a later interval than the current bar completes it.
+        current_bar = aggregated_bar.bar
+        intervals = timestamps // current_bar.norm_seconds
+        run_starts = np.flatnonzero(np.diff(intervals)) + 1
+        run_starts = np.concatenate(([0], run_starts))
+        run_ends = np.append(run_starts[1:], len(intervals)) - 1
+
+        run_intervals = intervals[run_starts].tolist()
+        opens = prices[run_starts].tolist()
+        highs = np.maximum.reduceat(prices, run_starts).tolist()
+        lows = np.minimum.reduceat(prices, run_starts).tolist()
+        closes = prices[run_ends].tolist()
+        volumes = np.add.reduceat(sizes, run_starts).tolist()
+
+        bar_events = []
+        norm_seconds = current_bar.norm_seconds
+        for run_idx, interval in enumerate(run_intervals):
+            if current_bar.timestamp is not None:
+                current_interval = current_bar.timestamp // norm_seconds
+                if interval > current_interval:
+                    bar_events.extend(self._close_bar(aggregated_bar))
+                elif interval < current_interval:
+                    self.late_ticks += int(run_ends[run_idx] - run_starts[run_idx]) + 1
+                    continue
+            current_bar.merge(
+                interval * norm_seconds, opens[run_idx], highs[run_idx], lows[run_idx], closes[run_idx], volumes[run_idx]
+            )
+
+        bar_events.extend(self._get_update_events(aggregated_bar, timestamps[-1]))
+        return bar_events
+
+    def _close_bar(self, aggregated_bar: _AggregatedBar) -> List[Tuple[str, BarEvent]]:
+        current_bar = aggregated_bar.bar
+        if current_bar.open is None:
+            if aggregated_bar.last_close is None:
+                # Pending bar without any previous price to carry forward
+                current_bar.reset()
+                return []
+            current_bar.open = current_bar.high = current_bar.low = current_bar.close = aggregated_bar.last_close
+
+        current_bar.is_closed = True
+        bar_event = BarEvent(current_bar.snapshot(), self.publisher_id)
+        aggregated_bar.last_close = current_bar.close
+        current_bar.reset()
+        current_bar.seq += 1
+        # The first update of the next bar is never throttled
+        aggregated_bar.last_update_at = None
+        return [(aggregated_bar.sub_key, bar_event)]
+
+    def _get_update_events(self, aggregated_bar: _AggregatedBar, timestamp: float) -> List[Tuple[str, BarEvent]]:
+        update_interval = aggregated_bar.update_interval
+        if update_interval is None:
+            return []
+
+        last_update_at = aggregated_bar.last_update_at
+        if update_interval > 0 and last_update_at is not None and timestamp - last_update_at < update_interval:
+            return []
+
+        if aggregated_bar.source is not None:
+            # Updates of rolled-up bars include the finer bar in progress
+            snapshot = self._snapshot_with_source(aggregated_bar.bar, aggregated_bar.source.bar)
+        else:
+            snapshot = aggregated_bar.bar.snapshot()
+        if snapshot.open is None:
+            return []
+
+        aggregated_bar.last_update_at = float(timestamp)
+        return [(aggregated_bar.sub_key, BarEvent(snapshot, self.publisher_id, float(timestamp)))]
+
+    @staticmethod
+    def _snapshot_with_source(bar: Bar, source_bar: Bar) -> BarSnapshot:
+        # Snapshot of the bar as if the source bar had been merged into it (see _merge_source_bar). Finer bars without
+        # trades add nothing to publish.
+        if source_bar.timestamp is None or source_bar.volume <= 0:
+            return bar.snapshot()
+
+        timestamp = bar.timestamp
+        if timestamp is None:
+            timestamp = (source_bar.timestamp // bar.norm_seconds) * bar.norm_seconds
+        return BarSnapshot(
+            bar.instrument, bar.freq, timestamp,
+            bar.open if bar.open is not None else source_bar.open,
+            max(bar.high, source_bar.high) if bar.high is not None else source_bar.high,
+            min(bar.low, source_bar.low) if bar.low is not None else source_bar.low,
+            source_bar.close, bar.volume + source_bar.volume, bar.is_closed, bar.seq
+        )
@@ -0,0 +1,119 @@
+import os
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from clients.api_client_base import APIClientBase
+from clients.websocket_base import WebsocketBase
+from clients.sharded_websocket import ShardedWebsocketClient
+from storage.bar_store import BarStore, BarStoreWriter
+
+rootLogger = logging.getLogger()
+
+
+class ConnectionManager:
+    """
+    Process-level registry of exchange clients, which hands out one websocket client and one REST API client per
+    (exchange client class, account, subaccount). Strategies running in the same process therefore share connections,
+    logins and data feeds: every message is parsed once and fanned out to all subscribed consumers. Feed
+    subscriptions of shared websocket clients are reference counted by their consumer subscriptions.
+    """
+    def __init__(self):
+        self._clients: Dict[Tuple, object] = {}
+        self._client_keys: Dict[int, Tuple] = {}
+        self._ref_counts: Dict[Tuple, int] = {}
+        self._start_tasks: Dict[Tuple, asyncio.Task] = {}
+
+    @staticmethod
+    def _get_client_key(client_cls: Type, api_keys: Optional[Dict], subaccount: Optional[str]) -> Tuple:
+        account = api_keys.get('key') if api_keys else None
+        return client_cls, account, subaccount
+
+    def _acquire(self, client_cls: Type, api_keys: Optional[Dict], subaccount: Optional[str] = None, factory: Optional[Callable] = None, **kwargs):
+        key = self._get_client_key(client_cls, api_keys, subaccount)
+        client = self._clients.get(key)
+
+        if client is None:
+            if subaccount is not None:
+                kwargs['subaccount'] = subaccount
+            client = (factory or client_cls)(api_keys=api_keys, **kwargs)
+            self._clients[key] = client
+            self._client_keys[id(client)] = key
+            self._ref_counts[key] = 0
+            rootLogger.info(f'Created shared client {client_cls.__name__} for subaccount {subaccount}.')
+
+        self._ref_counts[key] += 1
+        return client
+
+    def _release(self, client: object) -> bool:
+        key = self._client_keys[id(client)]
+        self._ref_counts[key] -= 1
+        if self._ref_counts[key] > 0:
+            return False
+
+        del self._clients[key]
+        del self._client_keys[id(client)]
+        del self._ref_counts[key]
+        self._start_tasks.pop(key, None)
+        return True
+
+    def acquire_api_client(self, client_cls: Type[APIClientBase], api_keys: Dict, subaccount: Optional[str] = None, **kwargs) -> APIClientBase:
+        return self._acquire(client_cls, api_keys, subaccount, **kwargs)
+
+    def release_api_client(self, client: APIClientBase) -> None:
+        self._release(client)
+
+    def acquire_websocket_client(
+            self,
+            client_cls: Type[WebsocketBase],
+            api_keys: Optional[Dict],
+            subaccount: Optional[str] = None,
+            num_shards: int = 1,
+            shard_groups: Optional[List[List[str]]] = None,
+            **kwargs
+    ) -> WebsocketBase:
+        # Keyword arguments (e.g. websocket_params) only take effect for the first acquisition of a client
+        factory = None
+        if num_shards > 1 or shard_groups:
+            def factory(**client_kwargs) -> ShardedWebsocketClient:
+                return ShardedWebsocketClient(client_cls, num_shards=num_shards, shard_groups=shard_groups, **client_kwargs)
+        return self._acquire(client_cls, api_keys, subaccount, factory=factory, **kwargs)
+
+    async def start_websocket_client(self, client: WebsocketBase) -> None:
+        # Shared websocket clients are started once; subsequent calls wait until the connection has been established
+        key = self._client_keys[id(client)]
+        if key not in self._start_tasks:
+            self._start_tasks[key] = asyncio.create_task(client.start())
+
+        while not client.is_running:
+            await asyncio.sleep(0.1)
+
+    async def release_websocket_client(self, client: WebsocketBase) -> None:
+        # The websocket connection is closed once the last user of a shared client has released it
+        if self._release(client) and client.is_running:
+            await client.close()
+
+    def acquire_bar_store_writer(self, root: str, exchange: str) -> BarStoreWriter:
+        # Bar store writers are shared per store and exchange, such that bars of the same series are written once
+        key = (BarStoreWriter, os.path.abspath(root), exchange)
+        writer = self._clients.get(key)
+        if writer is None:
+            writer = BarStoreWriter(BarStore(root), exchange)
+            self._clients[key] = writer
+            self._client_keys[id(writer)] = key
+            self._ref_counts[key] = 0
+
+        self._ref_counts[key] += 1
+        return writer
+
+    def release_bar_store_writer(self, writer: BarStoreWriter) -> None:
+        # Queued bars are written before the last user of a shared writer returns
+        if self._release(writer):
+            writer.close()
+
+    def get_ref_count(self, client: object) -> int:
+        key = self._client_keys.get(id(client))
+        return self._ref_counts[key] if key is not None else 0
+
+
+connection_manager = ConnectionManager()
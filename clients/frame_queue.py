@@ -0,0 +1,99 @@
+import asyncio
+from enum import Enum
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Optional, Union
+
+from clients.json_decoder import Frame
+
+
+class OverflowPolicy(Enum):
+    # Wait for the consumer to free a slot, i.e. apply backpressure on the websocket connection
+    BLOCK = "block"
+    # Drop the oldest frame in the queue to make room for the new frame
+    DROP_OLDEST = "drop_oldest"
+    # Replace a queued frame with the same conflation key (e.g. ticker of the same market) by the newer frame.
+    # Frames without conflation key are subject to the BLOCK policy.
+    CONFLATE = "conflate"
+
+    def __str__(self):
+        return '{}'.format(self.name)
+
+
+class FrameQueue:
+    """
+    Bounded FIFO queue of raw websocket frames between the receive loop and the message dispatcher of a websocket
+    client. Keeps track of queue depth, dropped and conflated frames.
+    """
+    def __init__(self, maxsize: int = 10000, policy: Union[OverflowPolicy, str] = OverflowPolicy.BLOCK):
+        if maxsize <= 0:
+            raise ValueError(f'Invalid frame queue size: {maxsize}')
+        self.maxsize = maxsize
+        self.policy = OverflowPolicy(policy)
+
+        # Entries are mutable [conflation_key, frame] pairs, such that conflated frames can be replaced in place
+        self._entries: Deque[List] = deque()
+        self._conflated_entries: Dict[Hashable, List] = {}
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def put(self, frame: Frame, conflation_key: Optional[Hashable] = None) -> None:
+        if conflation_key is not None and self.policy is OverflowPolicy.CONFLATE:
+            entry = self._conflated_entries.get(conflation_key)
+            if entry is not None:
+                entry[1] = frame
+                self.conflated += 1
+                return
+        else:
+            conflation_key = None
+
+        if len(self._entries) >= self.maxsize:
+            if self.policy is OverflowPolicy.DROP_OLDEST:
+                self._drop_oldest()
+            else:
+                while len(self._entries) >= self.maxsize:
+                    self._not_full.clear()
+                    await self._not_full.wait()
+
+        entry = [conflation_key, frame]
+        self._entries.append(entry)
+        if conflation_key is not None:
+            self._conflated_entries[conflation_key] = entry
+
+        self.enqueued += 1
+        if len(self._entries) > self.max_depth:
+            self.max_depth = len(self._entries)
+        self._not_empty.set()
+
+    async def get(self) -> Frame:
+        while not self._entries:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        entry = self._entries.popleft()
+        if entry[0] is not None:
+            del self._conflated_entries[entry[0]]
+        self._not_full.set()
+        return entry[1]
+
+    def _drop_oldest(self) -> None:
+        entry = self._entries.popleft()
+        if entry[0] is not None:
+            del self._conflated_entries[entry[0]]
+        self.dropped += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'depth': len(self._entries),
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'conflated': self.conflated
+        }
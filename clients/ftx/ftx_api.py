@@ -2,14 +2,17 @@
 Taken from: https://github.com/ftexchange/ftx/blob/master/rest/client.py
 """
 import time
-from datetime import datetime
 import urllib.parse
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
 from requests import Request, Session, Response
 import hmac
 from ciso8601 import parse_datetime
 
+# Maximum number of trades per request of the trades endpoint and initial length of windows of trades (in seconds)
+TRADES_PAGE_LIMIT = 5000
+TRADES_WINDOW = 60.0
+
 
 class FTXClient:
     _ENDPOINT = 'https://ftx.com/api/'
@@ -74,6 +77,45 @@ class FTXClient:
     def get_trades(self, market: str) -> dict:
         return self._get(f'markets/{market}/trades')
 
+    def get_all_trades(self, market: str, start_time: float, end_time: Optional[float] = None) -> List[dict]:
+        # Trades between start_time and end_time (default: now) in ascending order of time. The trades endpoint returns
+        # the latest trades of the requested interval, hence the interval is paged forward in windows, which are each
+        # paged backwards until complete. Windows grow while they fit into a single page and shrink otherwise.
+        end_time = time.time() if end_time is None else end_time
+        window = TRADES_WINDOW
+        ids = set()
+        results = []
+        while start_time < end_time:
+            window_end = min(start_time + window, end_time)
+            window_trades, n_pages = self._get_window_trades(market, start_time, window_end)
+            for trade in reversed(window_trades):
+                if trade['id'] not in ids:
+                    ids.add(trade['id'])
+                    results.append(trade)
+            window = window * 2 if n_pages == 1 else max(window / n_pages, 1.0)
+            start_time = window_end
+        return results
+
+    def _get_window_trades(self, market: str, start_time: float, end_time: float) -> Tuple[List[dict], int]:
+        # Trades of the interval in descending order of time and the number of requested pages
+        ids = set()
+        results = []
+        n_pages = 0
+        while True:
+            response = self._get(f'markets/{market}/trades', {
+                'start_time': start_time,
+                'end_time': end_time,
+                'limit': TRADES_PAGE_LIMIT
+            })
+            n_pages += 1
+            deduped_trades = [r for r in response if r['id'] not in ids]
+            results.extend(deduped_trades)
+            ids |= {r['id'] for r in deduped_trades}
+            if len(deduped_trades) == 0 or len(response) < TRADES_PAGE_LIMIT:
+                break
+            end_time = min(parse_datetime(t['time']) for t in response).timestamp()
+        return results, n_pages
+
     def get_account_info(self) -> dict:
         return self._get(f'account')
 
@@ -172,23 +214,3 @@ class FTXClient:
 
     def get_position(self, name: str, show_avg_price: bool = False) -> dict:
         return next(filter(lambda x: x['future'] == name, self.get_positions(show_avg_price)), None)
-
-    def get_all_trades(self, market: str, start_time: float = None, end_time: float = None) -> List:
-        limit = 5000
-        ids = set()
-        results = []
-        while True:
-            response = self._get(f'markets/{market}/trades', {
-                'end_time': end_time,
-                'start_time': start_time,
-            })
-            deduped_trades = [r for r in response if r['id'] not in ids]
-            results.extend(deduped_trades)
-            ids |= {r['id'] for r in deduped_trades}
-            print(f'Adding {len(response)} trades with end time {datetime.utcfromtimestamp(end_time)}')
-            if len(response) == 0:
-                break
-            end_time = min(parse_datetime(t['time']) for t in response).timestamp()
-            if len(response) < limit:
-                break
-        return results
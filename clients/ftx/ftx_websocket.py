@@ -1,68 +1,54 @@
 import hmac
 import json
-import copy
 import time
+import zlib
 import asyncio
 import logging
 import websockets
-from datetime import datetime
-from collections import defaultdict, deque
-from typing import DefaultDict, Deque, List, Dict, Optional, Tuple, Set
+from typing import List, Dict, Optional, Tuple
 
-from core.bar import Bar
 from core.tick import Tick
+from core.tick_batch import TickBatch
 from core.quote import Quote
 from core.fill import Fill
 from core.order_update import OrderUpdate
 from core.instrument import Instrument
+from core.order_book import OrderBook
 from core.const import FTX_TICKER_TO_INSTRUMENTS
-from core.events import OrderUpdateEvent, TickEvent, QuoteEvent, FillEvent, BarEvent
+from core.events import OrderUpdateEvent, QuoteEvent, FillEvent, BookEvent
 
-from clients.websocket_base import WebsocketBase
+from clients.websocket_base import WebsocketBase, get_subscription_key
+from clients.json_decoder import Frame, peek_field
 
 
 rootLogger = logging.getLogger()
 
 
-def get_subscription_key(channel: str, instrument: Optional[Instrument] = None, freq: Optional[str] = None) -> str:
-    instrument_id = instrument.instrument_id if instrument is not None else None
-    return '.'.join((param for param in [channel, instrument_id, freq] if param is not None))
+FEED_CHANNELS = ('trades', 'ticker', 'fills', 'orders', 'orderbook')
 
+# Channels requiring login
+PRIVATE_CHANNELS = {'fills', 'orders'}
 
-def is_subscription_msg(msg: Dict) -> bool:
-    return msg['type'] in {'subscribed', 'unsubscribed'}
+# Channels whose messages carry the market in their top-level fields
+MARKET_CHANNELS = {'trades', 'ticker', 'orderbook'}
 
-
-def is_pong(msg: Dict) -> bool:
-    return msg['type'] == 'pong'
-
-
-def is_error(msg: Dict):
-    return msg['type'] == 'error'
-
-
-def is_info_msg(msg: Dict) -> bool:
-    return msg['type'] == 'info'
-
-
-def is_feed_msg(msg: Dict) -> bool:
-    return msg.get('channel', '') in ['trades', 'ticker', 'fills', 'orders']
+# Number of levels per side the checksum of orderbook messages is computed over
+BOOK_CHECKSUM_LEVELS = 100
 
 
 class FTXWebsocketClient(WebsocketBase):
     _ENDPOINT = 'wss://ftx.com/ws/'
+    _CONFLATABLE_CHANNELS = {'ticker'}
+    _TRADES_CHANNEL = 'trades'
 
-    def __init__(self, api_keys: Dict, websocket_id: str = 'ftx_websocket', subaccount: str = None):
-        super().__init__(websocket_id)
-        self.ws = None
+    def __init__(self, api_keys: Dict, websocket_id: str = 'ftx_websocket', subaccount: str = None, **kwargs):
+        super().__init__(websocket_id, **kwargs)
         self._api_keys = api_keys
         self.subaccount = subaccount
         self.keepalive = False
 
-        self._feed_subscriptions: Set[str] = set()
-        self._consumer_subscriptions: DefaultDict[str, List] = defaultdict(list)
-        self._bars = {}
         self._logged_in = False
+        self._register_handlers()
 
     def _get_url(self) -> str:
         return self._ENDPOINT
@@ -80,6 +66,8 @@ class FTXWebsocketClient(WebsocketBase):
             await asyncio.sleep(interval)
 
     async def _login(self) -> None:
+        # Flag is set before sending, such that concurrent subscribers of a shared client log in only once
+        self._logged_in = True
         ts = int(time.time() * 1000)
         await self._send_command({'op': 'login', 'args': {
             'key': self._api_keys['key'],
@@ -88,7 +76,6 @@ class FTXWebsocketClient(WebsocketBase):
             'time': ts,
             'subaccount': self.subaccount,
         }})
-        self._logged_in = True
 
     async def _connect(self, keepalive: bool = False) -> None:
         if self.ws:
@@ -105,39 +92,19 @@ class FTXWebsocketClient(WebsocketBase):
         except Exception as e:
             rootLogger.error(f'Error in connection process of {self.websocket_id}-websocket: {e}')
 
-    async def _reconnect(self, reconnection_interval: float = 0.5) -> None:
-        await self.ws.close()
-        self.ws = None
-        await asyncio.sleep(reconnection_interval)
-        await self._connect()
-
-        for subscription_key in self._feed_subscriptions:
-            if 'bar' in subscription_key:
-                channel, market, freq = subscription_key.split('.')
-                await self.subscribe_bars(market, freq)
-            else:
-                await self._subscribe(*subscription_key.split('.'), force=True)
-
-    async def start(self, keepalive: bool = True) -> None:
-        await self._connect(keepalive)
+    def _on_disconnect(self) -> None:
+        self._logged_in = False
 
-        while self.is_running:
-            try:
-                if not self.ws.open:
-                    await self._reconnect()
-                    rootLogger.info(f"Reopened {self.websocket_id}-websocket connection.")
-                else:
-                    data = await self.ws.recv()
-                    msg = json.loads(data)
-                    await self._on_message(msg)
-            except Exception as e:
-                rootLogger.error(f'Error in running {self.websocket_id}-websocket: {e}')
+    async def _resubscribe(self) -> None:
+        # Every subscription covers a single channel and market, hence all subscriptions are sent at once
+        if self._feed_subscriptions & PRIVATE_CHANNELS:
+            await self._login()
 
-    async def close(self) -> None:
-        self.is_running = False
-        await self.ws.close()
-        self.ws = None
-        rootLogger.info(f'Closed {self.websocket_id}-websocket connection.')
+        commands = []
+        for sub_key in self._feed_subscriptions:
+            channel, _, market = sub_key.partition('.')
+            commands.append({'op': 'subscribe', 'channel': channel, **({'market': market} if market else {})})
+        await asyncio.gather(*(self._send_command(command) for command in commands))
 
     ###########################
     # SUBSCRIBE / UNSUBSCRIBE #
@@ -148,43 +115,31 @@ class FTXWebsocketClient(WebsocketBase):
     async def _subscribe(self, channel: str, instrument: Optional[Instrument] = None, consumer: object = None, force: bool = False) -> None:
         sub_key = get_subscription_key(channel, instrument)
         if sub_key not in self._feed_subscriptions or force:
+            # Subscription is registered before sending, such that concurrent subscribers of a shared client
+            # subscribe to the feed only once
+            self._feed_subscriptions.add(sub_key)
+
             params = {'channel': channel}
             if instrument:
                 params['market'] = instrument.instrument_id
             await self._send_command({'op': 'subscribe', **params})
 
-            self._feed_subscriptions.add(sub_key)
-
         if consumer is not None:
             self._subscribe_consumer(sub_key, consumer)
 
-    def _subscribe_consumer(self, subscription_key: str, consumer: object):
-        subscribed_consumers = self._consumer_subscriptions.get(subscription_key, [])
-
-        if consumer not in subscribed_consumers:
-            self._consumer_subscriptions[subscription_key].append(consumer)
-            rootLogger.info(f'Subscribed consumer {consumer} to subscription key {subscription_key}')
-
     async def _unsubscribe(self, channel: str, instrument: Optional[Instrument] = None, consumer: object = None) -> None:
         subscription_key = get_subscription_key(channel, instrument)
 
         if consumer is not None:
             self._unsubscribe_consumer(subscription_key, consumer)
 
-        if subscription_key in self._feed_subscriptions and len(self._consumer_subscriptions[subscription_key]) == 0:
+        if subscription_key in self._feed_subscriptions and not self._is_feed_required(subscription_key):
             params = {'channel': channel}
             if instrument:
                 params['market'] = instrument.instrument_id
             await self._send_command({'op': 'unsubscribe', **params})
             self._feed_subscriptions.remove(subscription_key)
 
-    def _unsubscribe_consumer(self, subscription_key: str, consumer: object) -> None:
-        try:
-            self._consumer_subscriptions[subscription_key].remove(consumer)
-            rootLogger.info(f'Unsubscribed consumer {consumer} to subscription key {subscription_key}')
-        except Exception as e:
-            rootLogger.error(f'Error when unsubscribing consumer {e}')
-
     async def subscribe_fills(self, consumer: object = None) -> None:
         if not self._logged_in:
             await self._login()
@@ -213,95 +168,77 @@ class FTXWebsocketClient(WebsocketBase):
     async def unsubscribe_quotes(self, instrument: Instrument, consumer: object = None) -> None:
         await self._unsubscribe('ticker', instrument, consumer)
 
-    async def subscribe_bars(self, instrument: Instrument, freq: str, consumer: object = None) -> None:
-        # FTX does not provide bar data
-        await self.subscribe_trades(instrument)
-        self._initialize_bar_variables(instrument, freq)
-
-        sub_key = get_subscription_key('bar', instrument, freq)
-        if consumer is not None:
-            self._subscribe_consumer(sub_key, consumer)
+    async def subscribe_book(self, instrument: Instrument, consumer: object = None) -> None:
+        sub_key = get_subscription_key('orderbook', instrument)
+        if sub_key not in self._order_books:
+            self._order_books[sub_key] = OrderBook(instrument)
+        await self._subscribe('orderbook', instrument, consumer)
 
-    def _initialize_bar_variables(self, instrument: Instrument, freq: str) -> None:
-        if instrument.instrument_id not in self._bars.keys():
-            self._bars[instrument.instrument_id] = {}
-        if freq not in self._bars[instrument.instrument_id].keys():
-            self._bars[instrument.instrument_id][freq] = Bar(instrument, freq)
+    async def unsubscribe_book(self, instrument: Instrument, consumer: object = None) -> None:
+        await self._unsubscribe('orderbook', instrument, consumer)
 
-    async def unsubscribe_bars(self, instrument: Instrument,  freq: str, consumer: object = None):
-        sub_key = get_subscription_key('bar', instrument, freq)
+        sub_key = get_subscription_key('orderbook', instrument)
+        if sub_key not in self._feed_subscriptions:
+            self._order_books.pop(sub_key, None)
 
-        if consumer is not None:
-            self._unsubscribe_consumer(sub_key, consumer)
+    def get_order_book(self, instrument: Instrument) -> Optional[OrderBook]:
+        book = self._order_books.get(get_subscription_key('orderbook', instrument))
+        return book if book is not None and book.is_valid else None
 
-        trade_key = get_subscription_key('trades', instrument)
-        has_consumers = len(self._consumer_subscriptions[sub_key]) > 0 and len(self._consumer_subscriptions[trade_key]) > 0
-        if trade_key in self._feed_subscriptions and not has_consumers:
-            await self.unsubscribe_trades(instrument)
+    async def _resync_book(self, instrument: Instrument) -> None:
+        # Orderbook snapshots (partials) are only sent upon subscription, hence out-of-sync books are resubscribed
+        rootLogger.info(f'Resynchronizing orderbook of {instrument.instrument_id} on {self.websocket_id}-websocket.')
+        for op in ('unsubscribe', 'subscribe'):
+            await self._send_command({'op': op, 'channel': 'orderbook', 'market': instrument.instrument_id})
 
     ####################
     # MESSAGE HANDLERS #
     ####################
-    async def _on_message(self, msg: Dict) -> None:
-        if is_error(msg):
-            rootLogger.info(f'Received error message on {self.websocket_id}-websocket stream: {msg}')
-        else:
-            await self._handle_message(msg)
-
-    async def _handle_message(self, msg: Dict) -> None:
-        if is_subscription_msg(msg):
-            self._handle_subscription_msg(msg)
-        elif is_info_msg(msg):
-            await self._handle_info_msg(msg)
-        elif is_pong(msg):
-            self._handle_pong_msg(msg)
-        elif is_feed_msg(msg):
-            event_list = self._handle_feed_message(msg)
-
-            for sub_key, event in event_list:
-                for consumer in self._consumer_subscriptions[sub_key]:
-                    consumer.handle_event(event)
-        else:
-            rootLogger.info(f'Received message on {self.websocket_id}-websocket stream on unknown channel: {msg}')
+    def _register_handlers(self) -> None:
+        # Messages are routed on (type, channel); control messages without channel are registered with channel None.
+        self._register_handler(('update', 'trades'), self._handle_trades_msg)
+        self._register_handler(('update', 'ticker'), self._parse_ticker_message)
+        self._register_handler(('update', 'fills'), self._parse_fills_message)
+        self._register_handler(('update', 'orders'), self._parse_orders_message)
+        self._register_handler(('partial', 'orderbook'), self._handle_orderbook_msg)
+        self._register_handler(('update', 'orderbook'), self._handle_orderbook_msg)
+        for channel in FEED_CHANNELS + (None,):
+            self._register_handler(('subscribed', channel), self._handle_subscription_msg)
+            self._register_handler(('unsubscribed', channel), self._handle_subscription_msg)
+        self._register_handler(('info', None), self._handle_info_msg)
+        self._register_handler(('pong', None), self._handle_pong_msg)
+        self._register_handler(('error', None), self._handle_error_msg)
+
+    def _get_route_key(self, msg: Dict) -> Tuple[str, Optional[str]]:
+        return msg['type'], msg.get('channel')
+
+    def _peek_subscription_key(self, data: Frame) -> Optional[str]:
+        channel = peek_field(data, 'channel')
+        if channel not in MARKET_CHANNELS or peek_field(data, 'type') not in {'update', 'partial'}:
+            return None
+        market = peek_field(data, 'market')
+        return f'{channel}.{market}' if market is not None else None
+
+    def _handle_error_msg(self, msg: Dict) -> None:
+        rootLogger.info(f'Received error message on {self.websocket_id}-websocket stream: {msg}')
 
     def _handle_subscription_msg(self, msg: Dict) -> None:
         rootLogger.info(f'Subscription message received at {self.websocket_id}: {msg}.')
 
-    async def _handle_info_msg(self, msg: Dict) -> None:
+    def _handle_info_msg(self, msg: Dict) -> None:
         rootLogger.info('Info message received: {}'.format(msg))
         if msg['code'] == 20001:
             rootLogger.info('Resubscribing data streams upon server restart.')
-            await self._reconnect()
+            # Closing the connection makes the receive loop reconnect and resubscribe all data streams
+            asyncio.create_task(self.ws.close())
 
     def _handle_pong_msg(self, msg: Dict) -> None:
         # One could add an implementation of a timeout to detect connectivity issues.
         pass
 
-    def _handle_feed_message(self, msg: Dict) -> List:
-        event_list = []
-        if msg['channel'] == 'trades':
-            event_list.extend(self._parse_trades_message(msg))
-            event_list.extend(self._parse_bars_message(msg))
-        elif msg['channel'] == 'ticker':
-            event_list.extend(self._parse_ticker_message(msg))
-        elif msg['channel'] == 'fills':
-            event_list.extend(self._parse_fills_message(msg))
-        elif msg['channel'] == 'orders':
-            event_list.extend(self._parse_orders_message(msg))
-        else:
-            rootLogger.info(f'Received message on {self.websocket_id}-websocket stream on unknown channel: {msg}')
-        return event_list
-
-    def _parse_trades_message(self, msg: Dict) -> List[Tuple[str, TickEvent]]:
+    def _handle_trades_msg(self, msg: Dict) -> List:
         instrument = FTX_TICKER_TO_INSTRUMENTS[msg['market']]
-        sub_key = get_subscription_key('trades', instrument)
-        return [
-            (
-                sub_key,
-                TickEvent(tick=Tick.from_ftx_msg(instrument, trade_msg), publisher_id=self.websocket_id)
-            )
-            for trade_msg in msg['data']
-        ]
+        return self._get_trade_events(instrument, msg['data'], self._tick_cls.from_ftx_msg, TickBatch.from_ftx_msg)
 
     def _parse_ticker_message(self, msg: Dict) -> List[Tuple[str, QuoteEvent]]:
         instrument = FTX_TICKER_TO_INSTRUMENTS[msg['market']]
@@ -318,30 +255,55 @@ class FTXWebsocketClient(WebsocketBase):
         sub_key = get_subscription_key('fills')
         return [(sub_key, FillEvent(Fill.from_ftx_msg(instrument, msg), self.websocket_id))]
 
-    def _parse_bars_message(self, msg: Dict) -> List[Tuple[str, BarEvent]]:
-        bar_events = []
-        if msg['market'] in self._bars.keys():
-            bar_events.extend(self._update_bars(msg))
-        return bar_events
-
-    def _update_bars(self, msg: Dict) -> List[Tuple[str, BarEvent]]:
-        bar_updates = []
-        curr_market_bars = self._bars[msg['market']]
-        for freq, bar in curr_market_bars.items():
-            bar_updates.extend(self._update_bar(msg, bar))
-        return bar_updates
-
-    def _update_bar(self, msg: Dict, current_bar: Bar) -> List[Tuple[str, BarEvent]]:
-        bar_events = []
-        sub_key = get_subscription_key('bar', current_bar.instrument, current_bar.freq)
-        for idx, trade_data in enumerate(msg['data']):
-            trade_ts = datetime.fromisoformat(trade_data['time']).timestamp()
-            if current_bar.is_complete(trade_ts):
-                # Current bar is completed and should be published; initialize new bar object
-                bar_events.append((sub_key, BarEvent(copy.copy(current_bar), self.websocket_id)))
-                current_bar.reset()
-            current_bar.update_bar(trade_ts, trade_data['price'], trade_data['size'])
-
-        # Generate bar update events every time bar is updated (not only if it's completed).
-        bar_events.append((sub_key, BarEvent(copy.copy(current_bar), self.websocket_id)))
-        return bar_events
+    def _handle_orderbook_msg(self, msg: Dict) -> List[Tuple[str, BookEvent]]:
+        instrument = FTX_TICKER_TO_INSTRUMENTS[msg['market']]
+        sub_key = get_subscription_key('orderbook', instrument)
+        book = self._order_books.get(sub_key)
+        if book is None:
+            return []
+
+        data = msg['data']
+        if msg['type'] == 'partial':
+            book.apply_snapshot(
+                ((float(price), float(size)) for price, size in data['bids']),
+                ((float(price), float(size)) for price, size in data['asks']),
+                data['time']
+            )
+        elif book.is_valid:
+            for price, size in data['bids']:
+                book.bids.update(float(price), float(size))
+            for price, size in data['asks']:
+                book.asks.update(float(price), float(size))
+            book.end_update(data['time'])
+        else:
+            return []
+
+        if data['checksum'] != self._get_book_checksum(book):
+            rootLogger.warning(f'Checksum mismatch of {sub_key}-book on {self.websocket_id}-websocket.')
+            book.invalidate()
+            asyncio.create_task(self._resync_book(instrument))
+            return []
+        return self._get_book_events(sub_key, book)
+
+    @staticmethod
+    def _get_book_checksum(book: OrderBook) -> int:
+        # CRC32 of the interleaved top bid and ask levels, i.e. 'bid_price:bid_size:ask_price:ask_size:...', with
+        # numbers formatted as Python floats
+        bids = book.bids.levels(BOOK_CHECKSUM_LEVELS)
+        asks = book.asks.levels(BOOK_CHECKSUM_LEVELS)
+        checksum_values = []
+        for idx in range(max(len(bids), len(asks))):
+            if idx < len(bids):
+                checksum_values.extend(bids[idx])
+            if idx < len(asks):
+                checksum_values.extend(asks[idx])
+        return zlib.crc32(':'.join(str(value) for value in checksum_values).encode())
+
+    def _fetch_trade_frames(self, instrument_id: str, since: float) -> List[Frame]:
+        trades = self._api_client.get_all_trades(instrument_id, start_time=since)
+        if not trades:
+            return []
+        return [json.dumps({'channel': 'trades', 'market': instrument_id, 'type': 'update', 'data': trades})]
+
+    def _parse_trades_message(self, instrument: Instrument, msg: Dict) -> List[Tick]:
+        return [Tick.from_ftx_msg(instrument, trade_msg) for trade_msg in msg['data']]
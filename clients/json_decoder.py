@@ -0,0 +1,81 @@
+import re
+import json
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+rootLogger = logging.getLogger()
+
+Frame = Union[str, bytes]
+
+# Number of leading characters of a frame inspected by the prefix peek functions. Routing fields of all supported
+# exchanges are located at the beginning of a message, such that payloads never need to be scanned.
+PEEK_WINDOW = 128
+
+_FIELD_PATTERNS: Dict[str, re.Pattern] = {}
+_LIST_TAIL_PATTERN = re.compile(r',\s*"([^"]*)"\s*,\s*"([^"]*)"\s*\]\s*$')
+
+
+def _get_json_backends() -> Dict[str, Callable[[Frame], Any]]:
+    backends = {}
+    if orjson is not None:
+        backends['orjson'] = orjson.loads
+    if ujson is not None:
+        backends['ujson'] = ujson.loads
+    backends['json'] = json.loads
+    return backends
+
+
+JSON_BACKENDS = _get_json_backends()
+
+
+class JSONDecoder:
+    """
+    Decoder of raw websocket frames shared by all websocket clients. The decoding backend is chosen upon construction,
+    where 'auto' selects the fastest installed backend (orjson > ujson > json).
+    """
+    def __init__(self, backend: Optional[str] = 'auto'):
+        if backend is None or backend == 'auto':
+            backend = next(iter(JSON_BACKENDS))
+        elif backend not in JSON_BACKENDS:
+            rootLogger.warning(f'JSON backend {backend} is not installed. Falling back to stdlib json.')
+            backend = 'json'
+
+        self.backend: str = backend
+        self.loads: Callable[[Frame], Any] = JSON_BACKENDS[backend]
+
+
+def peek_field(data: Frame, field: str, window: int = PEEK_WINDOW) -> Optional[str]:
+    """
+    Returns the string value of a top-level *field* of a JSON object frame without decoding the frame. Only the
+    first *window* characters are scanned; None is returned if the field is not found within this window.
+    """
+    pattern = _FIELD_PATTERNS.get(field)
+    if pattern is None:
+        pattern = _FIELD_PATTERNS[field] = re.compile(r'"%s"\s*:\s*"([^"]*)"' % re.escape(field))
+
+    if isinstance(data, bytes):
+        data = data[:window].decode('utf-8', 'ignore')
+    match = pattern.search(data, 0, window)
+    return match.group(1) if match is not None else None
+
+
+def peek_list_tail(data: Frame, window: int = PEEK_WINDOW // 2) -> Optional[Tuple[str, str]]:
+    """
+    Returns the last two string elements of a JSON array frame (e.g. channel name and pair of a Kraken spot feed
+    message, i.e. msg[-2] and msg[-1]) without decoding the frame.
+    """
+    tail = data[-window:]
+    if isinstance(tail, bytes):
+        tail = tail.decode('utf-8', 'ignore')
+    match = _LIST_TAIL_PATTERN.search(tail)
+    return match.groups() if match is not None else None
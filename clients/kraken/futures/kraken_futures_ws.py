@@ -6,73 +6,43 @@ import json
 import asyncio
 import time
 import logging
-from typing import DefaultDict, Dict, List, Optional, Tuple, Set
 from collections import defaultdict
+from typing import Dict, List, Optional, Tuple, Union
 
 from core.instrument import Instrument
-from core.quote import Quote
 from core.tick import Tick
+from core.quote import Quote
+from core.tick_batch import TickBatch
 from core.order_update import OrderUpdate
 from core.fill import Fill
-from core.events import TickEvent, QuoteEvent, OrderUpdateEvent, FillEvent
-from clients.websocket_base import WebsocketBase
+from core.order_book import OrderBook
+from core.events import QuoteEvent, OrderUpdateEvent, FillEvent, BookEvent
+from clients.websocket_base import WebsocketBase, get_subscription_key
+from clients.json_decoder import Frame, peek_field
 
 from core.const import KRAKEN_NAME_TO_INSTRUMENTS, KRAKEN_TICKER_TO_INSTRUMENTS
+from utils.timestamp_parser import parse_timestamp
 
 
 rootLogger = logging.getLogger()
 
 
-def is_subscription_message(msg: Dict) -> bool:
-    is_dict = isinstance(msg, dict)
-    if is_dict and 'event' in msg.keys() and (msg['event'] == 'subscribed' or msg['event'] == 'unsubscribed'):
-        return True
-    return False
-
-
-def is_challenge(msg: Dict) -> bool:
-    is_dict = isinstance(msg, dict)
-    if is_dict and 'event' in msg.keys() and msg['event'] == 'challenge':
-        return True
-    return False
-
-
-def is_heartbeat(msg: Dict) -> bool:
-    return msg.get('feed', '') == 'heartbeat'
-
-
-def is_alert(msg: Dict) -> bool:
-    return msg.get('event', '') == 'alert'
-
-
-def is_feed_msg(msg: Dict) -> bool:
-    return 'feed' in msg.keys()
-
-
-def is_error(msg: Dict) -> bool:
-    return msg.get('event', '') == 'error'
-
-
-def get_subscription_key(channel: str, instrument: Optional[Instrument] = None, freq: Optional[str] = None) -> str:
-    instrument_id = instrument.instrument_id if instrument is not None else None
-    return '.'.join((param for param in [channel, instrument_id, freq] if param is not None))
-
-
 class KrakenFuturesWSClient(WebsocketBase):
     _ENDPOINT = 'wss://futures.kraken.com/ws/v1'
+    _CONFLATABLE_CHANNELS = {'ticker'}
+    _TRADES_CHANNEL = 'trade'
 
-    def __init__(self, api_keys: Optional[Dict] = None, websocket_id: str = 'kraken_futures_websocket'):
-        super().__init__(websocket_id)
-        self.ws = None
+    def __init__(self, api_keys: Optional[Dict] = None, websocket_id: str = 'kraken_futures_websocket', **kwargs):
+        super().__init__(websocket_id, **kwargs)
         self._api_keys = api_keys
         self.keepalive = False
 
         self._original_challenge = None
         self._signed_challenge = None
         self._is_authenticated = None
-
-        self._feed_subscriptions: Set[str] = set()
-        self._consumer_subscriptions: DefaultDict[str, List] = defaultdict(list)
+        # Sequence numbers of the last applied book message per book
+        self._book_sequences: Dict[str, int] = {}
+        self._register_handlers()
 
     def _get_url(self) -> str:
         return self._ENDPOINT
@@ -106,38 +76,22 @@ class KrakenFuturesWSClient(WebsocketBase):
         except Exception as e:
             rootLogger.error(f'Error in connection process of {self.websocket_id}-websocket: {e}')
 
-    async def _reconnect(self, reconnection_interval: int = 0.5) -> None:
-        await self.ws.close()
-        self.ws = None
+    def _on_disconnect(self) -> None:
         self._is_authenticated = False
 
-        await asyncio.sleep(reconnection_interval)
-        await self._connect(self.keepalive)
-
+    async def _resubscribe(self) -> None:
+        # Subscriptions of a feed are batched into a single command over all of its products. Private feeds are
+        # resubscribed with the previously signed challenge.
+        product_ids_by_feed = defaultdict(list)
         for sub_key in self._feed_subscriptions:
-            await self._subscribe(*sub_key.split('.'), force=True)
-
-    async def start(self, keepalive: bool = True) -> None:
-        await self._connect(keepalive)
-
-        # Infinite loop
-        while self.is_running:
-            try:
-                if not self.ws.open:
-                    await self._reconnect()
-                    rootLogger.info(f'Reopened {self.websocket_id}-websocket connection.')
-                else:
-                    data = await self.ws.recv()
-                    msg = json.loads(data)
-                    self._on_message(msg)
-            except Exception as e:
-                rootLogger.error(f'Error in running {self.websocket_id}-websocket: {e}')
-
-    async def close(self) -> None:
-        self.is_running = False
-        await self.ws.close()
-        self.ws = None
-        rootLogger.info(f'Closed {self.websocket_id}-websocket connection.')
+            feed, _, product_id = sub_key.partition('.')
+            product_ids_by_feed[feed].append(product_id)
+
+        for feed, product_ids in product_ids_by_feed.items():
+            cmd_params = {'event': 'subscribe', 'feed': feed}
+            if any(product_ids):
+                cmd_params['product_ids'] = product_ids
+            await self._send_command(cmd_params)
 
     ###########################
     # SUBSCRIBE / UNSUBSCRIBE #
@@ -154,42 +108,28 @@ class KrakenFuturesWSClient(WebsocketBase):
     async def _subscribe(self, channel: str, instrument: Optional[Instrument] = None, consumer: object = None, force: bool = False) -> None:
         sub_key = get_subscription_key(channel, instrument)
         if sub_key not in self._feed_subscriptions or force:
+            self._feed_subscriptions.add(sub_key)
             cmd_params = {"event": "subscribe", "feed": channel}
             if instrument is not None:
                 cmd_params['product_ids'] = [instrument.instrument_id]
             await self._send_command(cmd_params)
-            self._feed_subscriptions.add(sub_key)
 
         if consumer is not None:
             self._subscribe_consumer(sub_key, consumer)
 
-    def _subscribe_consumer(self, sub_key: str, consumer: object) -> None:
-        subscribed_consumers = self._consumer_subscriptions[sub_key]
-
-        if consumer not in subscribed_consumers:
-            self._consumer_subscriptions[sub_key].append(consumer)
-            rootLogger.info(f'Subscribed consumer {consumer} to subscription key {sub_key}')
-
     async def _unsubscribe(self, channel: str, instrument: Optional[Instrument] = None, consumer: object = None) -> None:
         sub_key = get_subscription_key(channel, instrument)
 
         if consumer is not None:
             self._unsubscribe_consumer(sub_key, consumer)
 
-        if sub_key in self._feed_subscriptions and len(self._consumer_subscriptions[sub_key]) == 0:
+        if sub_key in self._feed_subscriptions and not self._is_feed_required(sub_key):
             cmd_params = {'event': 'unsubscribe', 'feed': channel}
             if instrument is not None:
                 cmd_params['product_ids'] = [instrument.instrument_id]
             await self._send_command(cmd_params)
             self._feed_subscriptions.remove(sub_key)
 
-    def _unsubscribe_consumer(self, sub_key: str, consumer: object) -> None:
-        try:
-            self._consumer_subscriptions[sub_key].remove(consumer)
-            rootLogger.info(f'Unsubscribed consumer {consumer} to subscription key {sub_key}')
-        except Exception as e:
-            rootLogger.error(f'Error when unsubscribing consumer {e}')
-
     async def subscribe_fills(self, consumer: object = None) -> None:
         if not self._is_authenticated:
             await self._authenticate()
@@ -218,39 +158,65 @@ class KrakenFuturesWSClient(WebsocketBase):
     async def unsubscribe_quotes(self, instrument: Instrument, consumer: object = None) -> None:
         await self._unsubscribe('ticker', instrument, consumer)
 
-    async def subscribe_bars(self, instrument: Instrument, freq: str, consumer: object = None) -> None:
-        raise NotImplementedError('Subscription of OHLCV-bars is not implemented yet.')
+    async def subscribe_book(self, instrument: Instrument, consumer: object = None) -> None:
+        sub_key = get_subscription_key('book', instrument)
+        if sub_key not in self._order_books:
+            self._order_books[sub_key] = OrderBook(instrument)
+        await self._subscribe('book', instrument, consumer)
+
+    async def unsubscribe_book(self, instrument: Instrument, consumer: object = None) -> None:
+        await self._unsubscribe('book', instrument, consumer)
+
+        sub_key = get_subscription_key('book', instrument)
+        if sub_key not in self._feed_subscriptions:
+            self._order_books.pop(sub_key, None)
+            self._book_sequences.pop(sub_key, None)
 
-    async def unsubscribe_bars(self, instrument: Instrument, freq: str, consumer: object = None) -> None:
-        raise NotImplementedError('Unsubscription of OHLCV-bars is not implemented yet.')
+    def get_order_book(self, instrument: Instrument) -> Optional[OrderBook]:
+        book = self._order_books.get(get_subscription_key('book', instrument))
+        return book if book is not None and book.is_valid else None
+
+    async def _resync_book(self, instrument: Instrument) -> None:
+        # Book snapshots are only sent upon subscription, hence out-of-sync books are resubscribed
+        rootLogger.info(f'Resynchronizing book of {instrument.instrument_id} on {self.websocket_id}-websocket.')
+        for event in ('unsubscribe', 'subscribe'):
+            await self._send_command({'event': event, 'feed': 'book', 'product_ids': [instrument.instrument_id]})
 
     ####################
     # MESSAGE HANDLERS #
     ####################
-    def _on_message(self, msg: Dict) -> None:
-        print(msg)
-        if is_error(msg):
-            rootLogger.error(f'Received error message on {self.websocket_id}-websocket stream: {msg}')
-        else:
-            self._handle_message(msg)
-
-    def _handle_message(self, msg: Dict) -> None:
-        if is_challenge(msg):
-            self._handle_challenge(msg)
-        elif is_subscription_message(msg):
-            self._handle_subscription_msg(msg)
-        elif is_heartbeat(msg):
-            self._handle_heartbeat(msg)
-        elif is_alert(msg):
-            self._handle_alert_msg(msg)
-        elif is_feed_msg(msg):
-            event_list = self._handle_feed_message(msg)
-
-            for sub_key, event in event_list:
-                for consumer in self._consumer_subscriptions[sub_key]:
-                    consumer.handle_event(event)
-        else:
-            rootLogger.info(f'Received message on {self.websocket_id}-websocket stream on unknown channel: {msg}')
+    def _register_handlers(self) -> None:
+        # Feed messages are routed on their feed, event messages (which may also carry a feed) on their event.
+        self._register_handler('ticker', self._handle_ticker_msg)
+        self._register_handler('trade', self._handle_trade_msg)
+        self._register_handler('trade_snapshot', self._handle_trade_msg)
+        self._register_handler('fills', self._handle_fills_msg)
+        self._register_handler('fills_snapshot', self._handle_fills_msg)
+        self._register_handler('open_orders', self._handle_open_order_msg)
+        self._register_handler('open_orders_snapshot', self._handle_open_order_msg)
+        self._register_handler('book', self._handle_book_msg)
+        self._register_handler('book_snapshot', self._handle_book_snapshot_msg)
+        self._register_handler('heartbeat', self._handle_heartbeat)
+        self._register_handler(('event', 'challenge'), self._handle_challenge)
+        self._register_handler(('event', 'subscribed'), self._handle_subscription_msg)
+        self._register_handler(('event', 'unsubscribed'), self._handle_subscription_msg)
+        self._register_handler(('event', 'alert'), self._handle_alert_msg)
+        self._register_handler(('event', 'error'), self._handle_error_msg)
+
+    def _get_route_key(self, msg: Dict) -> Union[str, Tuple[str, str]]:
+        event = msg.get('event')
+        return msg.get('feed') if event is None else ('event', event)
+
+    def _peek_subscription_key(self, data: Frame) -> Optional[str]:
+        feed = peek_field(data, 'feed')
+        product_id = peek_field(data, 'product_id')
+        if feed is None or product_id is None:
+            return None
+        # Snapshot feeds (e.g. trade_snapshot) are delivered on the subscription of their base feed
+        return f'{feed[:-len("_snapshot")] if feed.endswith("_snapshot") else feed}.{product_id}'
+
+    def _handle_error_msg(self, msg: Dict) -> None:
+        rootLogger.error(f'Received error message on {self.websocket_id}-websocket stream: {msg}')
 
     def _handle_challenge(self, msg: Dict) -> None:
         self._original_challenge = msg["message"]
@@ -267,20 +233,6 @@ class KrakenFuturesWSClient(WebsocketBase):
     def _handle_alert_msg(self, msg: Dict) -> None:
         rootLogger.info(f'Received alert message at {self.websocket_id}: {msg}')
 
-    def _handle_feed_message(self, msg:  Dict) -> List:
-        event_list = []
-        if msg["feed"] == "ticker":
-            event_list = self._handle_ticker_msg(msg)
-        elif msg["feed"] == "fills_snapshot" or msg["feed"] == "fills":
-            event_list = self._handle_fills_msg(msg)
-        elif msg["feed"] == "open_orders_snapshot" or msg["feed"] == "open_orders":
-            event_list = self._handle_open_order_msg(msg)
-        elif msg["feed"] == "trade_snapshot" or msg["feed"] == "trade":
-            event_list = self._handle_trade_msg(msg)
-        else:
-            rootLogger.error(f'Received message of unknown {self.websocket_id}-websocket channel: {msg}.')
-        return event_list
-
     def _handle_open_order_msg(self, msg: Dict) -> List[Tuple[str, OrderUpdateEvent]]:
         event_list = []
         sub_key = get_subscription_key('open_orders')
@@ -297,16 +249,51 @@ class KrakenFuturesWSClient(WebsocketBase):
         sub_key = get_subscription_key('ticker', instrument)
         return [(sub_key, QuoteEvent(Quote.from_kraken_fut_msg(instrument, msg), publisher_id=self.websocket_id))]
 
-    def _handle_trade_msg(self, msg: Dict) -> List[Tuple[str, TickEvent]]:
+    def _handle_trade_msg(self, msg: Dict) -> List:
         instrument = KRAKEN_TICKER_TO_INSTRUMENTS[msg['product_id']]
-        sub_key = get_subscription_key('trade', instrument)
 
-        tick_events = []
+        # Trade snapshots sent upon the initial subscription contain past trades, which are not aggregated into bars.
+        # Snapshots upon resubscription only contain new trades after deduplication.
+        aggregate_bars = msg['feed'] == 'trade' or instrument.instrument_id in self._last_trades
+
         tick_msgs = msg['trades'] if 'trades' in msg.keys() else [msg]
-        for tick_msg in tick_msgs:
-            tick = Tick.from_kraken_fut_msg(instrument, tick_msg)
-            tick_events.append((sub_key, TickEvent(tick, publisher_id=self.websocket_id)))
-        return tick_events
+        return self._get_trade_events(
+            instrument, tick_msgs, self._tick_cls.from_kraken_fut_msg, TickBatch.from_kraken_fut_msg, aggregate_bars
+        )
+
+    def _handle_book_snapshot_msg(self, msg: Dict) -> List[Tuple[str, BookEvent]]:
+        instrument = KRAKEN_TICKER_TO_INSTRUMENTS[msg['product_id']]
+        sub_key = get_subscription_key('book', instrument)
+        book = self._order_books.get(sub_key)
+        if book is None:
+            return []
+
+        book.apply_snapshot(
+            ((level['price'], level['qty']) for level in msg['bids']),
+            ((level['price'], level['qty']) for level in msg['asks']),
+            msg['timestamp'] / 1000
+        )
+        self._book_sequences[sub_key] = msg['seq']
+        return self._get_book_events(sub_key, book)
+
+    def _handle_book_msg(self, msg: Dict) -> List[Tuple[str, BookEvent]]:
+        # Book updates of the v1 API carry no checksum, hence the book is resynchronized on gaps in their sequence
+        instrument = KRAKEN_TICKER_TO_INSTRUMENTS[msg['product_id']]
+        sub_key = get_subscription_key('book', instrument)
+        book = self._order_books.get(sub_key)
+        if book is None or not book.is_valid:
+            return []
+
+        if msg['seq'] != self._book_sequences[sub_key] + 1:
+            rootLogger.warning(f'Sequence gap of {sub_key}-book on {self.websocket_id}-websocket.')
+            book.invalidate()
+            asyncio.create_task(self._resync_book(instrument))
+            return []
+
+        self._book_sequences[sub_key] = msg['seq']
+        book.update(msg['side'] == 'buy', msg['price'], msg['qty'])
+        book.end_update(msg['timestamp'] / 1000)
+        return self._get_book_events(sub_key, book)
 
     def _handle_fills_msg(self, msg: Dict) -> List[Tuple[str, FillEvent]]:
         event_list = []
@@ -318,6 +305,43 @@ class KrakenFuturesWSClient(WebsocketBase):
             event_list.append((sub_key, FillEvent(fill, publisher_id=self.websocket_id)))
         return event_list
 
+    def _fetch_trade_frames(self, instrument_id: str, since: float) -> List[Frame]:
+        # The trade history is paginated backwards in time and converted into a message of the trade feed
+        trades = []
+        last_time = ''
+        while True:
+            history = self._api_client.get_history(instrument_id, lastTime=last_time).get('history', [])
+            new_trades = [(parse_timestamp(trade['time']), trade) for trade in history]
+            new_trades = [(timestamp, trade) for timestamp, trade in new_trades if timestamp >= since]
+            trades.extend(new_trades)
+            if not history or len(new_trades) < len(history) or history[-1]['time'] == last_time:
+                break
+            last_time = history[-1]['time']
+
+        if not trades:
+            return []
+        return [json.dumps({
+            'feed': 'trade',
+            'product_id': instrument_id,
+            'trades': [
+                {
+                    'feed': 'trade',
+                    'product_id': instrument_id,
+                    'uid': trade.get('uid', trade.get('trade_id')),
+                    'side': trade['side'],
+                    'type': trade.get('type', 'fill'),
+                    'time': int(timestamp * 1000),
+                    'qty': trade['size'],
+                    'price': trade['price']
+                }
+                for timestamp, trade in reversed(trades)
+            ]
+        })]
+
+    def _parse_trades_message(self, instrument: Instrument, msg: Dict) -> List[Tick]:
+        tick_msgs = msg['trades'] if 'trades' in msg.keys() else [msg]
+        return [Tick.from_kraken_fut_msg(instrument, tick_msg) for tick_msg in tick_msgs]
+
     def _sign_challenge(self, msg: Dict) -> Optional[str]:
         """
         Based on https://github.com/CryptoFacilities/WebSocket-v1-Python/blob/master/cfWebSocketApiV1.py.
@@ -1,58 +1,44 @@
 import json
+import time
+import zlib
 import asyncio
 import logging
 import websockets
-
 from collections import defaultdict
-from typing import Optional, Dict, List, DefaultDict, Union, Set, Tuple
+from typing import Optional, Dict, List, Union, Tuple
 
 from core.instrument import Instrument
-from core.quote import Quote
 from core.tick import Tick
-from core.events import TickEvent, QuoteEvent
-from clients.websocket_base import WebsocketBase
+from core.quote import Quote
+from core.tick_batch import TickBatch
+from core.order_book import OrderBook
+from core.events import QuoteEvent, BookEvent
+from clients.websocket_base import WebsocketBase, get_subscription_key
+from clients.json_decoder import Frame, peek_list_tail
 from core.const import KRAKEN_TICKER_TO_INSTRUMENTS
 
 rootLogger = logging.getLogger()
 
-
-def is_subscription_msg(msg: Union[List, Dict]) -> bool:
-    return isinstance(msg, Dict) and msg['event'] == 'subscriptionStatus'
-
-
-def is_feed_msg(msg: Union[List, Dict]) -> bool:
-    return isinstance(msg, List)
-
-
-def is_pong_msg(msg: Union[List, Dict]) -> bool:
-    return isinstance(msg, Dict) and msg['event'] == 'pong'
-
-
-def is_heartbeat_msg(msg: Union[List, Dict]) -> bool:
-    return isinstance(msg, Dict) and msg['event'] == 'heartbeat'
-
-
-def is_error(msg: Union[List, Dict]):
-    return isinstance(msg, Dict) and msg['event'] == 'error'
-
-
-def get_subscription_key(channel: str, instrument: Optional[Instrument] = None, freq: Optional[str] = None) -> str:
-    instrument_id = instrument.instrument_id if instrument is not None else None
-    return '.'.join((param for param in [channel, instrument_id, freq] if param is not None))
+BOOK_DEPTHS = (10, 25, 100, 500, 1000)
+# Number of levels per side the checksum of book updates is computed over
+BOOK_CHECKSUM_LEVELS = 10
+# Maximum number of trades returned per request of the public Trades endpoint
+TRADES_PAGE_LIMIT = 1000
 
 
 class KrakenSpotWSClient(WebsocketBase):
     _ENDPOINT = 'wss://ws.kraken.com'
+    _CONFLATABLE_CHANNELS = {'spread'}
+    _TRADES_CHANNEL = 'trade'
 
-    def __init__(self, api_keys: Optional[Dict] = None, websocket_id: str = 'kraken_spot_websocket'):
-        super().__init__(websocket_id)
+    def __init__(self, api_keys: Optional[Dict] = None, websocket_id: str = 'kraken_spot_websocket', **kwargs):
+        super().__init__(websocket_id, **kwargs)
         self._api_keys = api_keys
-        self.ws = None
         self.keepalive = False
         self._is_authenticated = None
-
-        self._feed_subscriptions: Set[str] = set()
-        self._consumer_subscriptions: DefaultDict[str, List] = defaultdict(list)
+        # Number of decimals of prices and volumes per book, as needed to reproduce the exchange's book checksum
+        self._book_precisions: Dict[str, Tuple[int, int]] = {}
+        self._register_handlers()
 
     def _get_url(self) -> str:
         return self._ENDPOINT
@@ -88,37 +74,24 @@ class KrakenSpotWSClient(WebsocketBase):
         except Exception as e:
             rootLogger.error(f'Error in connection process of {self.websocket_id}-websocket: {e}')
 
-    async def _reconnect(self, reconnection_interval: int = 10) -> None:
-        await self.ws.close()
-        self.ws = None
+    def _on_disconnect(self) -> None:
         self._is_authenticated = False
+        self._book_precisions.clear()
 
-        await asyncio.sleep(reconnection_interval)
-        await self._connect(self.keepalive)
-
+    async def _resubscribe(self) -> None:
+        # Subscriptions of a channel are batched into a single command over all of its pairs
+        pairs_by_channel = defaultdict(list)
         for sub_key in self._feed_subscriptions:
-            await self._subscribe(*sub_key.split('_'), force=True)
+            channel, _, pair = sub_key.partition('.')
+            pairs_by_channel[channel].append(pair)
 
-    async def start(self, keepalive: bool = True) -> None:
-        await self._connect(keepalive)
-
-        while self.is_running:
-            try:
-                if not self.ws.open:
-                    await self._reconnect()
-                    rootLogger.info(f"Reopened {self.websocket_id}-websocket connection.")
-                else:
-                    data = await self.ws.recv()
-                    msg = json.loads(data)
-                    self._on_message(msg)
-            except Exception as e:
-                rootLogger.error(f'Error in running {self.websocket_id}-websocket: {e}')
-
-    async def close(self):
-        self.is_running = False
-        await self.ws.close()
-        self.ws = None
-        rootLogger.info(f'Closed {self.websocket_id}-websocket connection.')
+        for channel, pairs in pairs_by_channel.items():
+            cmd_params = {'event': 'subscribe', 'subscription': self._get_subscription(channel)}
+            if any(pairs):
+                cmd_params['pair'] = pairs
+            if self._is_authenticated:
+                cmd_params['subscription']['token'] = self._signed_challenge
+            await self._send_command(cmd_params)
 
     ###########################
     # SUBSCRIBE / UNSUBSCRIBE #
@@ -126,36 +99,36 @@ class KrakenSpotWSClient(WebsocketBase):
     async def _send_command(self, params: Dict):
         await self.ws.send(json.dumps(params))
 
+    @staticmethod
+    def _get_subscription(channel: str) -> Dict:
+        # Book channels are named by their depth (e.g. book-10), as are the book messages of the exchange
+        if channel.startswith('book-'):
+            return {'name': 'book', 'depth': int(channel[len('book-'):])}
+        return {'name': channel}
+
     async def _subscribe(self, channel: str, instrument: Optional[Instrument] = None, consumer: object = None, force: bool = False):
         sub_key = get_subscription_key(channel, instrument)
 
         if sub_key not in self._feed_subscriptions or force:
-            cmd_params = {"event": "subscribe", "subscription": {'name': channel}}
+            self._feed_subscriptions.add(sub_key)
+            cmd_params = {"event": "subscribe", "subscription": self._get_subscription(channel)}
             if instrument is not None:
                 cmd_params["pair"] = [instrument.instrument_id]
             if self._is_authenticated:
                 cmd_params['subscription']['token'] = self._signed_challenge
             await self._send_command(cmd_params)
-            self._feed_subscriptions.add(sub_key)
 
         if consumer is not None:
             self._subscribe_consumer(sub_key, consumer)
 
-    def _subscribe_consumer(self, sub_key: str, consumer: object) -> None:
-        subscribed_consumers = self._consumer_subscriptions[sub_key]
-
-        if consumer not in subscribed_consumers:
-            self._consumer_subscriptions[sub_key].append(consumer)
-            rootLogger.info(f'Subscribed consumer {consumer} to subscription key {sub_key}')
-
     async def _unsubscribe(self, channel: str, instrument: Optional[Instrument] = None, consumer: object = None, force: bool = False):
         sub_key = get_subscription_key(channel, instrument)
 
         if consumer is not None:
             self._unsubscribe_consumer(sub_key, consumer)
 
-        if sub_key in self._feed_subscriptions and len(self._consumer_subscriptions[sub_key]) == 0:
-            cmd_params = {"event": "unsubscribe", "subscription": {'name': channel}}
+        if sub_key in self._feed_subscriptions and not self._is_feed_required(sub_key):
+            cmd_params = {"event": "unsubscribe", "subscription": self._get_subscription(channel)}
             if instrument is not None:
                 cmd_params["pair"] = [instrument.instrument_id]
             if self._is_authenticated:
@@ -163,13 +136,6 @@ class KrakenSpotWSClient(WebsocketBase):
             await self._send_command(cmd_params)
             self._feed_subscriptions.remove(sub_key)
 
-    def _unsubscribe_consumer(self, sub_key: str, consumer: object) -> None:
-        try:
-            self._consumer_subscriptions[sub_key].remove(consumer)
-            rootLogger.info(f'Unsubscribed consumer {consumer} to subscription key {sub_key}')
-        except Exception as e:
-            rootLogger.error(f'Error when unsubscribing consumer {e}')
-
     async def subscribe_orders(self, consumer: object = None) -> None:
         # TODO: Authentication method is not implemented yet
         if not self._is_authenticated:
@@ -191,34 +157,65 @@ class KrakenSpotWSClient(WebsocketBase):
     async def unsubscribe_quotes(self, instrument: Instrument, consumer: object = None) -> None:
         await self._unsubscribe('spread', instrument, consumer)
 
-    async def subscribe_bars(self, instrument: Instrument, freq: str, consumer: object = None) -> None:
-        raise NotImplementedError('Subscription of OHLCV-bars is not implemented yet.')
+    async def subscribe_book(self, instrument: Instrument, consumer: object = None, depth: int = 10) -> None:
+        if depth not in BOOK_DEPTHS:
+            raise ValueError(f'Invalid book depth {depth}, supported depths are {BOOK_DEPTHS}.')
 
-    async def unsubscribe_bars(self, instrument: Instrument, freq: str, consumer: object = None) -> None:
-        raise NotImplementedError('Unsubscription of OHLCV-bars is not implemented yet.')
+        channel = f'book-{depth}'
+        sub_key = get_subscription_key(channel, instrument)
+        if sub_key not in self._order_books:
+            self._order_books[sub_key] = OrderBook(instrument, depth)
+        await self._subscribe(channel, instrument, consumer)
+
+    async def unsubscribe_book(self, instrument: Instrument, consumer: object = None, depth: int = 10) -> None:
+        channel = f'book-{depth}'
+        await self._unsubscribe(channel, instrument, consumer)
+
+        sub_key = get_subscription_key(channel, instrument)
+        if sub_key not in self._feed_subscriptions:
+            self._order_books.pop(sub_key, None)
+            self._book_precisions.pop(sub_key, None)
+
+    def get_order_book(self, instrument: Instrument, depth: int = 10) -> Optional[OrderBook]:
+        book = self._order_books.get(get_subscription_key(f'book-{depth}', instrument))
+        return book if book is not None and book.is_valid else None
+
+    async def _resync_book(self, channel: str, instrument: Instrument) -> None:
+        # Book snapshots are only sent upon subscription, hence out-of-sync books are resubscribed
+        rootLogger.info(f'Resynchronizing {channel} of {instrument.instrument_id} on {self.websocket_id}-websocket.')
+        for event in ('unsubscribe', 'subscribe'):
+            await self._send_command({'event': event, 'pair': [instrument.instrument_id], 'subscription': self._get_subscription(channel)})
 
     ####################
     # MESSAGE HANDLERS #
     ####################
-    def _on_message(self, msg: Union[List, Dict]) -> None:
-        if is_error(msg):
-            rootLogger.error(f'Received error message on {self.websocket_id}-websocket stream: {msg}')
-        else:
-            self._handle_message(msg)
-
-    def _handle_message(self, msg: Union[List, Dict]):
-        if is_subscription_msg(msg):
-            self._handle_subscription_msg(msg)
-        elif is_pong_msg(msg) or is_heartbeat_msg(msg):
-            self._handle_pong_msg(msg)
-        elif is_feed_msg(msg):
-            event_list = self._handle_feed_message(msg)
-
-            for key, event in event_list:
-                for consumer in self._consumer_subscriptions[key]:
-                    consumer.handle_event(event)
-        else:
-            rootLogger.info(f'Received message on {self.websocket_id}-websocket stream on unknown channel: {msg}')
+    def _register_handlers(self) -> None:
+        # Feed messages are arrays routed on their channel name (msg[-2]), other messages are routed on their event.
+        self._register_handler('trade', self._handle_trade_msg)
+        self._register_handler('spread', self._handle_ticker_msg)
+        self._register_handler('openOrders', self._handle_orders_msg)
+        for depth in BOOK_DEPTHS:
+            self._register_handler(f'book-{depth}', self._handle_book_msg)
+        self._register_handler(('event', 'subscriptionStatus'), self._handle_subscription_msg)
+        self._register_handler(('event', 'pong'), self._handle_pong_msg)
+        self._register_handler(('event', 'heartbeat'), self._handle_pong_msg)
+        self._register_handler(('event', 'error'), self._handle_error_msg)
+
+    def _get_route_key(self, msg: Union[List, Dict]) -> Union[str, Tuple[str, str]]:
+        if isinstance(msg, list):
+            return msg[-2]
+        return 'event', msg.get('event')
+
+    def _peek_subscription_key(self, data: Frame) -> Optional[str]:
+        # Feed messages are arrays ending with channel name and pair, i.e. [channel_id, ..., channel_name, pair]
+        tail = peek_list_tail(data)
+        if tail is None:
+            return None
+        channel_name, pair = tail
+        return f'{channel_name}.{pair}'
+
+    def _handle_error_msg(self, msg: Dict) -> None:
+        rootLogger.error(f'Received error message on {self.websocket_id}-websocket stream: {msg}')
 
     def _handle_subscription_msg(self, msg: List) -> None:
         rootLogger.info(f'Received subscription message at {self.websocket_id}-websocket: {msg}')
@@ -227,32 +224,95 @@ class KrakenSpotWSClient(WebsocketBase):
         # One could add an implementation of a timeout to detect connectivity issues.
         pass
 
-    def _handle_feed_message(self, msg: List) -> List:
-        event_list = []
-        if msg[-2] == 'trade':
-            event_list = self._handle_trade_msg(msg)
-        elif msg[-2] == 'spread':
-            event_list = self._handle_ticker_msg(msg)
-        elif msg[-2] == 'openOrders':
-            event_list = self._handle_orders_msg(msg)
-        else:
-            rootLogger.error(f'Received message of unknown {self.websocket_id}-websocket channel: {msg}.')
-        return event_list
-
     def _handle_orders_msg(self, msg: List):
         # TODO: Implement handle ownOrder messages after authentication mechanism has been established
         return []
 
-    def _handle_trade_msg(self, msg: List) -> List[Tuple[str, TickEvent]]:
+    def _handle_trade_msg(self, msg: List) -> List:
         instrument = KRAKEN_TICKER_TO_INSTRUMENTS[msg[-1]]
-        sub_key = get_subscription_key('trade', instrument)
-
-        event_list = []
-        for trade_msg in msg[1]:
-            event_list.append((sub_key, TickEvent(Tick.from_kraken_spot_msg(instrument, trade_msg), publisher_id=self.websocket_id)))
-        return event_list
+        return self._get_trade_events(
+            instrument, msg[1], self._tick_cls.from_kraken_spot_msg, TickBatch.from_kraken_spot_msg
+        )
 
     def _handle_ticker_msg(self, msg: List) -> List[Tuple[str, QuoteEvent]]:
         instrument = KRAKEN_TICKER_TO_INSTRUMENTS[msg[-1]]
         sub_key = get_subscription_key('spread', instrument)
         return [(sub_key, QuoteEvent(Quote.from_kraken_spot_msg(instrument, msg), publisher_id=self.websocket_id))]
+
+    def _handle_book_msg(self, msg: List) -> List[Tuple[str, BookEvent]]:
+        # Snapshots carry 'as'/'bs' levels, updates 'a' and/or 'b' levels (possibly in two separate objects) and the
+        # checksum 'c' of the top levels after the update: [channel_id, {...}, ({...},) channel_name, pair]
+        instrument = KRAKEN_TICKER_TO_INSTRUMENTS[msg[-1]]
+        sub_key = get_subscription_key(msg[-2], instrument)
+        book = self._order_books.get(sub_key)
+        if book is None:
+            return []
+
+        updates = msg[1:-2]
+        if 'as' in updates[0] or 'bs' in updates[0]:
+            snapshot = updates[0]
+            levels = snapshot.get('as') or snapshot.get('bs')
+            if levels:
+                self._book_precisions[sub_key] = (_get_decimals(levels[0][0]), _get_decimals(levels[0][1]))
+            book.apply_snapshot(
+                ((float(price), float(volume)) for price, volume, _ in snapshot.get('bs', [])),
+                ((float(price), float(volume)) for price, volume, _ in snapshot.get('as', [])),
+                max((float(level[2]) for level in snapshot.get('as', []) + snapshot.get('bs', [])), default=None)
+            )
+            return self._get_book_events(sub_key, book)
+
+        if not book.is_valid:
+            return []
+
+        timestamp = book.timestamp
+        checksum = None
+        for update in updates:
+            for price, volume, level_ts, *_ in update.get('a', ()):
+                book.asks.update(float(price), float(volume))
+                timestamp = max(timestamp or 0.0, float(level_ts))
+            for price, volume, level_ts, *_ in update.get('b', ()):
+                book.bids.update(float(price), float(volume))
+                timestamp = max(timestamp or 0.0, float(level_ts))
+            checksum = update.get('c', checksum)
+        book.end_update(timestamp)
+
+        if checksum is not None and int(checksum) != self._get_book_checksum(sub_key, book):
+            rootLogger.warning(f'Checksum mismatch of {sub_key}-book on {self.websocket_id}-websocket.')
+            book.invalidate()
+            asyncio.create_task(self._resync_book(msg[-2], instrument))
+            return []
+        return self._get_book_events(sub_key, book)
+
+    def _fetch_trade_frames(self, instrument_id: str, since: float) -> List[Frame]:
+        # Trades of the REST API share the layout of trade messages, i.e. [price, volume, time, side, type, misc, ...].
+        # Pages are followed by their 'last' cursor until a page is incomplete or reaches the time of the first request,
+        # which live trades of the websocket stream continue from. Every page is returned as a frame.
+        frames = []
+        cursor = int(since * 1e9)
+        until = time.time()
+        while True:
+            result = self._api_client.query_public('Trades', {'pair': instrument_id, 'since': cursor})['result']
+            trades = next((trades for pair, trades in result.items() if pair != 'last'), [])
+            if trades:
+                frames.append(json.dumps([0, trades, 'trade', instrument_id]))
+            last = int(result.get('last', cursor))
+            if len(trades) < TRADES_PAGE_LIMIT or last <= cursor or float(trades[-1][2]) >= until:
+                return frames
+            cursor = last
+
+    def _parse_trades_message(self, instrument: Instrument, msg: List) -> List[Tick]:
+        return [Tick.from_kraken_spot_msg(instrument, trade_msg) for trade_msg in msg[1]]
+
+    def _get_book_checksum(self, sub_key: str, book: OrderBook) -> int:
+        # CRC32 of the top ask levels (ascending) followed by the top bid levels (descending), where each price and
+        # volume is formatted as on the exchange with decimal point and leading zeros removed
+        price_decimals, volume_decimals = self._book_precisions.get(sub_key, (5, 8))
+        checksum_str = ''.join(
+            f'{price:.{price_decimals}f}'.replace('.', '').lstrip('0') + f'{volume:.{volume_decimals}f}'.replace('.', '').lstrip('0')
+            for side in (book.asks, book.bids) for price, volume in side.levels(BOOK_CHECKSUM_LEVELS)
+        )
+        return zlib.crc32(checksum_str.encode())
+
+
+def _get_decimals(value: str) -> int:
+    return len(value) - value.index('.') - 1 if '.' in value else 0
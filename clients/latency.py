@@ -0,0 +1,113 @@
+import math
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from clients.json_decoder import Frame
+
+# Latency stages of market data from the exchange to the consumers of a websocket client
+EXCHANGE_TO_RECEIVE = 'exchange_to_receive'
+RECEIVE_TO_PARSE = 'receive_to_parse'
+PARSE_TO_DISPATCH = 'parse_to_dispatch'
+
+
+class StampedFrame(NamedTuple):
+    data: Frame
+    # Monotonic and wall-clock time of receipt; the latter is used to compare against exchange timestamps
+    received_at: float
+    received_at_wall: float
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies with logarithmic buckets (BUCKETS_PER_OCTAVE buckets per power of two) between one
+    microsecond and roughly 18 hours, with larger latencies collected in an overflow bucket. Percentiles are reported
+    as the upper bound of their bucket, i.e. with a relative error below 2 ** (1 / BUCKETS_PER_OCTAVE) - 1 (~9%).
+    """
+    BUCKETS_PER_OCTAVE = 8
+    NUM_BUCKETS = 36 * BUCKETS_PER_OCTAVE
+
+    def __init__(self):
+        self._counts: List[int] = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.max = -math.inf
+        self.min = math.inf
+
+    def record(self, latency: float) -> None:
+        micros = latency * 1e6
+        idx = int(math.log2(micros) * self.BUCKETS_PER_OCTAVE) + 1 if micros >= 1 else 0
+        self._counts[min(idx, self.NUM_BUCKETS - 1)] += 1
+        self.count += 1
+        if latency > self.max:
+            self.max = latency
+        if latency < self.min:
+            self.min = latency
+
+    def percentile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+
+        rank = max(math.ceil(q / 100 * self.count), 1)
+        cumulative_count = 0
+        for idx, count in enumerate(self._counts):
+            cumulative_count += count
+            if cumulative_count >= rank and idx < self.NUM_BUCKETS - 1:
+                upper_bound = 2 ** (idx / self.BUCKETS_PER_OCTAVE) * 1e-6
+                return min(upper_bound, self.max)
+        return self.max
+
+    def get_stats(self) -> Dict[str, Optional[float]]:
+        return {
+            'count': self.count,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max if self.count > 0 else None
+        }
+
+
+class LatencyMonitor:
+    """
+    Keeps latency histograms of all stages per (channel, instrument id) of a websocket client. Only every
+    *sample_every*-th received frame is stamped and measured, such that the overhead can be kept low.
+    """
+    def __init__(self, sample_every: int = 1):
+        if sample_every < 1:
+            raise ValueError(f'Invalid latency sampling interval: {sample_every}')
+        self.sample_every = sample_every
+        self._frame_counter = 0
+        self._histograms: Dict[Tuple[str, Optional[str]], Dict[str, LatencyHistogram]] = {}
+
+    def stamp_frame(self, data: Frame):
+        self._frame_counter += 1
+        if self._frame_counter < self.sample_every:
+            return data
+        self._frame_counter = 0
+        return StampedFrame(data, time.monotonic(), time.time())
+
+    def _get_histograms(self, channel: str, instrument_id: Optional[str]) -> Dict[str, LatencyHistogram]:
+        histograms = self._histograms.get((channel, instrument_id))
+        if histograms is None:
+            histograms = self._histograms[(channel, instrument_id)] = {
+                EXCHANGE_TO_RECEIVE: LatencyHistogram(),
+                RECEIVE_TO_PARSE: LatencyHistogram(),
+                PARSE_TO_DISPATCH: LatencyHistogram()
+            }
+        return histograms
+
+    def record_event(self, sub_key: str, event, frame: StampedFrame, parsed_at: float, dispatched_at: float) -> None:
+        channel = sub_key.split('.', 1)[0]
+        instrument = getattr(event.data, 'instrument', None)
+        histograms = self._get_histograms(channel, instrument.instrument_id if instrument is not None else None)
+
+        # Bars are time-stamped with the start of their interval, which is not comparable to their time of receipt
+        exchange_ts = getattr(event.data, 'timestamp', None)
+        if channel != 'bar' and isinstance(exchange_ts, float) and not math.isnan(exchange_ts):
+            histograms[EXCHANGE_TO_RECEIVE].record(frame.received_at_wall - exchange_ts)
+        histograms[RECEIVE_TO_PARSE].record(parsed_at - frame.received_at)
+        histograms[PARSE_TO_DISPATCH].record(dispatched_at - parsed_at)
+
+    def get_stats(self, channel: Optional[str] = None, instrument_id: Optional[str] = None) -> Dict[Tuple[str, Optional[str]], Dict[str, Dict]]:
+        return {
+            (hist_channel, hist_instrument_id): {stage: histogram.get_stats() for stage, histogram in histograms.items()}
+            for (hist_channel, hist_instrument_id), histograms in self._histograms.items()
+            if (channel is None or channel == hist_channel) and (instrument_id is None or instrument_id == hist_instrument_id)
+        }
@@ -0,0 +1,226 @@
+import zlib
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+from core.events import BarEvent
+from core.instrument import Instrument
+from core.order_book import OrderBook
+from clients.websocket_base import WebsocketBase
+from clients.bar_aggregator import BAR_UPDATES_ALL
+
+rootLogger = logging.getLogger()
+
+
+class ShardedWebsocketClient(WebsocketBase):
+    """
+    Websocket client distributing the subscriptions of an exchange over multiple connections (shards) of the given
+    websocket client class. Instruments are assigned to shards by explicit shard groups (lists of instrument names or
+    ids) or, otherwise, by a stable hash of their instrument id. Subscriptions without instrument (e.g. orders and
+    fills) are handled by the first shard.
+
+    All shards share the consumer subscription registry, while every shard keeps track of its own feed subscriptions
+    and reconnects and resubscribes independently of the others. Messages are routed by the shard that received
+    them, hence messages cannot be fed to the sharded client itself (e.g. by backtests).
+    """
+    def __init__(
+            self,
+            websocket_client_cls: Type[WebsocketBase],
+            api_keys: Optional[Dict] = None,
+            num_shards: int = 2,
+            shard_groups: Optional[List[List[str]]] = None,
+            websocket_id: Optional[str] = None,
+            start_timeout: float = 30.0,
+            **kwargs
+    ):
+        websocket_id = websocket_id or f'sharded_{websocket_client_cls.__name__}'
+        super().__init__(websocket_id, **kwargs)
+        # Seconds to wait for all shards to connect on start
+        self._start_timeout = start_timeout
+
+        shard_groups = shard_groups or []
+        num_shards = max(num_shards, len(shard_groups), 1)
+        self._shards: List[WebsocketBase] = [
+            websocket_client_cls(api_keys=api_keys, websocket_id=f'{websocket_id}_{idx}', **kwargs)
+            for idx in range(num_shards)
+        ]
+        for shard in self._shards:
+            shard._consumer_subscriptions = self._consumer_subscriptions
+
+        self._shard_assignments: Dict[str, int] = {
+            instrument_key: idx for idx, group in enumerate(shard_groups) for instrument_key in group
+        }
+
+    @property
+    def shards(self) -> List[WebsocketBase]:
+        return self._shards
+
+    def _get_shard(self, instrument: Optional[Instrument] = None) -> WebsocketBase:
+        if instrument is None:
+            return self._shards[0]
+
+        idx = self._shard_assignments.get(instrument.instrument_id, self._shard_assignments.get(instrument.name))
+        if idx is None:
+            idx = zlib.crc32(instrument.instrument_id.encode()) % len(self._shards)
+        return self._shards[idx]
+
+    ########################
+    # WEBSOCKET CONNECTION #
+    ########################
+    async def start(self, keepalive: bool = True) -> None:
+        shard_tasks = [asyncio.create_task(shard.start(keepalive)) for shard in self._shards]
+        try:
+            await asyncio.wait_for(self._wait_for_shards(shard_tasks), self._start_timeout)
+            self.is_running = True
+            await asyncio.gather(*shard_tasks)
+        except asyncio.TimeoutError:
+            raise ConnectionError(
+                f'Shards of {self.websocket_id}-websocket not connected within {self._start_timeout}s.'
+            ) from None
+        finally:
+            # Remaining shards are stopped if any shard failed (or the sharded client was cancelled)
+            self.is_running = False
+            for task in shard_tasks:
+                task.cancel()
+
+    async def _wait_for_shards(self, shard_tasks: List[asyncio.Task]) -> None:
+        # Waits until all shards are running, raising the exception of any shard which stopped before
+        while not all(shard.is_running for shard in self._shards):
+            done, _ = await asyncio.wait(shard_tasks, timeout=0.1, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+                raise ConnectionError(f'Shard of {self.websocket_id}-websocket stopped before connecting.')
+
+    async def close(self) -> None:
+        self.is_running = False
+        await asyncio.gather(*(shard.close() for shard in self._shards))
+        rootLogger.info(f'Closed all shards of {self.websocket_id}-websocket.')
+
+    async def _keepalive(self, **kwargs) -> None:
+        await asyncio.gather(*(shard._keepalive(**kwargs) for shard in self._shards))
+
+    async def _connect(self, **kwargs) -> None:
+        await asyncio.gather(*(shard._connect(**kwargs) for shard in self._shards))
+
+    async def _reconnect(self) -> None:
+        await asyncio.gather(*(shard._reconnect() for shard in self._shards))
+
+    async def _resubscribe(self) -> None:
+        await asyncio.gather(*(shard._resubscribe() for shard in self._shards))
+
+    def set_api_client(self, api_client) -> None:
+        super().set_api_client(api_client)
+        for shard in self._shards:
+            shard.set_api_client(api_client)
+
+    def pause_dispatch(self) -> None:
+        for shard in self._shards:
+            shard.pause_dispatch()
+
+    def resume_dispatch(self) -> None:
+        for shard in self._shards:
+            shard.resume_dispatch()
+
+    async def warm_up_trades(
+            self,
+            instruments: List[Instrument],
+            freq: str,
+            since: float,
+            cache_dir: Optional[str] = None
+    ) -> List[BarEvent]:
+        # Shards warm up their instruments concurrently
+        instruments_by_shard: Dict[int, List[Instrument]] = {}
+        for instrument in instruments:
+            instruments_by_shard.setdefault(self._shards.index(self._get_shard(instrument)), []).append(instrument)
+        results = await asyncio.gather(*(
+            self._shards[idx].warm_up_trades(shard_instruments, freq, since, cache_dir)
+            for idx, shard_instruments in instruments_by_shard.items()
+        ))
+        return [bar_event for bar_events in results for bar_event in bar_events]
+
+    def get_ingestion_stats(self) -> Dict[str, int]:
+        shard_stats = [shard.get_ingestion_stats() for shard in self._shards]
+        stats = {key: sum(stats[key] for stats in shard_stats) for key in shard_stats[0].keys()}
+        stats['max_depth'] = max(stats['max_depth'] for stats in shard_stats)
+        return stats
+
+    def get_latency_stats(self, channel: Optional[str] = None, instrument_id: Optional[str] = None) -> Dict[Tuple, Dict]:
+        # Instruments are assigned to a single shard, hence the latency statistics of the shards do not overlap
+        stats = {}
+        for shard in self._shards:
+            stats.update(shard.get_latency_stats(channel, instrument_id))
+        return stats
+
+    ###########################
+    # SUBSCRIBE / UNSUBSCRIBE #
+    ###########################
+    async def _subscribe(self, channel: str, instrument: Optional[Instrument] = None, consumer: object = None, force: bool = False) -> None:
+        await self._get_shard(instrument)._subscribe(channel, instrument, consumer=consumer, force=force)
+
+    async def _unsubscribe(self, channel: str, instrument: Optional[Instrument] = None, consumer: object = None) -> None:
+        await self._get_shard(instrument)._unsubscribe(channel, instrument, consumer=consumer)
+
+    async def subscribe_fills(self, consumer: object = None) -> None:
+        await self._get_shard().subscribe_fills(consumer=consumer)
+
+    async def unsubscribe_fills(self, consumer: object = None) -> None:
+        await self._get_shard().unsubscribe_fills(consumer=consumer)
+
+    async def subscribe_orders(self, consumer: object = None) -> None:
+        await self._get_shard().subscribe_orders(consumer=consumer)
+
+    async def unsubscribe_orders(self, consumer: object = None) -> None:
+        await self._get_shard().unsubscribe_orders(consumer=consumer)
+
+    async def subscribe_trades(self, instrument: Instrument, consumer: object = None) -> None:
+        await self._get_shard(instrument).subscribe_trades(instrument, consumer)
+
+    async def unsubscribe_trades(self, instrument: Instrument, consumer: object = None) -> None:
+        await self._get_shard(instrument).unsubscribe_trades(instrument, consumer)
+
+    async def subscribe_quotes(self, instrument: Instrument, consumer: object = None) -> None:
+        await self._get_shard(instrument).subscribe_quotes(instrument, consumer)
+
+    async def unsubscribe_quotes(self, instrument: Instrument, consumer: object = None) -> None:
+        await self._get_shard(instrument).unsubscribe_quotes(instrument, consumer)
+
+    async def subscribe_book(self, instrument: Instrument, consumer: object = None, **kwargs) -> None:
+        await self._get_shard(instrument).subscribe_book(instrument, consumer, **kwargs)
+
+    async def unsubscribe_book(self, instrument: Instrument, consumer: object = None, **kwargs) -> None:
+        await self._get_shard(instrument).unsubscribe_book(instrument, consumer, **kwargs)
+
+    def get_order_book(self, instrument: Instrument, **kwargs) -> Optional[OrderBook]:
+        return self._get_shard(instrument).get_order_book(instrument, **kwargs)
+
+    async def subscribe_bars(
+            self,
+            instrument: Instrument,
+            freq: str,
+            consumer: object = None,
+            updates: Union[str, int] = BAR_UPDATES_ALL
+    ) -> None:
+        await self._get_shard(instrument).subscribe_bars(instrument, freq, consumer, updates)
+
+    async def unsubscribe_bars(self, instrument: Instrument, freq: str, consumer: object = None) -> None:
+        await self._get_shard(instrument).unsubscribe_bars(instrument, freq, consumer)
+
+    async def subscribe_tick_batches(self, instrument: Instrument, consumer: object) -> None:
+        await self._get_shard(instrument).subscribe_tick_batches(instrument, consumer)
+
+    async def unsubscribe_tick_batches(self, instrument: Instrument, consumer: object) -> None:
+        await self._get_shard(instrument).unsubscribe_tick_batches(instrument, consumer)
+
+    ####################
+    # MESSAGE HANDLERS #
+    ####################
+    # Messages are handled by the shard owning the subscription, whose handlers keep the state of its instruments (bars,
+    # order books and last trades), and cannot be attributed to a shard once received
+    def _get_route_key(self, msg: Union[List, Dict]) -> None:
+        raise TypeError(f'Messages of {self.websocket_id}-websocket are routed by its shards.')
+
+    def _on_message(self, msg: Union[List, Dict]) -> None:
+        raise TypeError(f'Messages of {self.websocket_id}-websocket are handled by its shards.')
+
+    def _handle_message(self, msg: Union[List, Dict]) -> List:
+        raise TypeError(f'Messages of {self.websocket_id}-websocket are handled by its shards.')
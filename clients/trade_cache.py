@@ -0,0 +1,43 @@
+import os
+import json
+import logging
+from typing import List, Optional, Tuple
+
+from clients.json_decoder import Frame
+
+rootLogger = logging.getLogger()
+
+# Frames of the trades feed fetched from the REST API, each with the timestamp of its last trade. Caches are stored as
+# JSON lines of timestamp and frame, such that loading a cache never executes code.
+CachedFrames = List[Tuple[float, Frame]]
+
+
+def get_cache_path(cache_dir: str, websocket_id: str, instrument_id: str) -> str:
+    file_name = f'{websocket_id}_{instrument_id}.jsonl'.replace('/', '-')
+    return os.path.join(cache_dir, file_name)
+
+
+def load_trade_frames(path: str, since: Optional[float] = None) -> CachedFrames:
+    # Cached frames whose last trade is not older than since (trades of a frame may be older); corrupt caches are
+    # discarded
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path) as f:
+            frames: CachedFrames = [tuple(json.loads(line)) for line in f if line.strip()]
+    except Exception as e:
+        rootLogger.error(f'Error in loading trade cache {path}: {e}')
+        return []
+    return [(timestamp, frame) for timestamp, frame in frames if since is None or timestamp >= since]
+
+
+def save_trade_frames(path: str, frames: CachedFrames) -> None:
+    # Written to a temporary file first, such that an interrupted write does not corrupt the cache
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        for timestamp, frame in frames:
+            if isinstance(frame, bytes):
+                frame = frame.decode()
+            f.write(json.dumps([timestamp, frame]) + '\n')
+    os.replace(tmp_path, path)
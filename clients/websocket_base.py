@@ -1,20 +1,199 @@
-from typing import Dict
+import time
+import random
+import asyncio
+import logging
+from typing import Callable, DefaultDict, Dict, Hashable, List, Optional, Set, Tuple, Union
+from collections import defaultdict
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+from core.tick import Tick
+from core.tick_batch import TickBatch
+from core.instrument import Instrument
+from core.order_book import OrderBook
+from core.events import BarEvent, BookEvent, TickEvent, CompactTickEvent, TickBatchEvent
+from clients.json_decoder import JSONDecoder, Frame
+from clients.frame_queue import FrameQueue, OverflowPolicy
+from clients.latency import LatencyMonitor, StampedFrame
+from clients.trade_cache import get_cache_path, load_trade_frames, save_trade_frames
+from clients.bar_aggregator import (
+    BarAggregator, BarUpdateFilter, BAR_UPDATES_ALL, get_update_interval, get_most_permissive_interval
+)
+
+rootLogger = logging.getLogger()
+
+
+def get_subscription_key(channel: str, instrument: Optional[Instrument] = None, freq: Optional[str] = None) -> str:
+    instrument_id = instrument.instrument_id if instrument is not None else None
+    return '.'.join((param for param in [channel, instrument_id, freq] if param is not None))
+
 
 class WebsocketBase(ABC):
-    def __init__(self, websocket_id: str, **kwargs):
+    # Channels whose messages only carry the latest state (e.g. quotes) and may be conflated in the frame queue
+    _CONFLATABLE_CHANNELS = set()
+    # Channel of the trades feed, whose gaps are backfilled from the REST API upon reconnection
+    _TRADES_CHANNEL: Optional[str] = None
+
+    def __init__(
+            self,
+            websocket_id: str,
+            json_backend: Optional[str] = 'auto',
+            skip_inactive_frames: bool = False,
+            queue_size: int = 10000,
+            overflow_policy: Union[OverflowPolicy, str] = OverflowPolicy.BLOCK,
+            latency_sample_every: int = 0,
+            book_event_levels: int = 10,
+            reconnect_interval: float = 0.5,
+            max_reconnect_interval: float = 30.0,
+            bar_roll_up: bool = False,
+            bar_close_delay: Optional[float] = None,
+            compact_tick_events: bool = False,
+            **kwargs
+    ):
         self.websocket_id = websocket_id
         self.is_running = False
+        self.ws = None
 
-    @abstractmethod
-    async def start(self, keepalive: bool = True):
-        pass
+        self._json_decoder = JSONDecoder(json_backend)
+        self._skip_inactive_frames = skip_inactive_frames
+        self._feed_subscriptions: Set[str] = set()
+        self._consumer_subscriptions: DefaultDict[str, List] = defaultdict(list)
 
-    @abstractmethod
-    async def close(self, **kwargs):
+        # Trades are parsed into ticks wrapped by tick events or, with compact_tick_events, into tick events carrying the
+        # fields of their ticks themselves
+        self._tick_cls = CompactTickEvent if compact_tick_events else Tick
+
+        # Bars are aggregated from the parsed ticks of the trades feed for all exchanges; with bar_roll_up, coarser time
+        # bars are rolled up from the finest time bar of their instrument
+        self._bar_aggregator = BarAggregator(websocket_id, roll_up=bar_roll_up)
+        # Update intervals requested per bar subscription key and consumer; bars are updated at the shortest of them
+        self._bar_update_intervals: DefaultDict[str, Dict[object, Optional[float]]] = defaultdict(dict)
+        # Subscribed consumers by bar subscription key and consumer, i.e. the consumer or its update filter
+        self._bar_consumers: DefaultDict[str, Dict[object, object]] = defaultdict(dict)
+        # Time bars are closed bar_close_delay seconds after the end of their interval, even without subsequent trades
+        # (disabled for None)
+        self._bar_close_delay = bar_close_delay
+        self._bar_timer_task: Optional[asyncio.Task] = None
+
+        # Order books maintained from book feeds by subscription key; book events carry their top book_event_levels
+        self._order_books: Dict[str, OrderBook] = {}
+        self._book_event_levels = book_event_levels
+
+        # Dispatch table mapping route keys of incoming messages to their handlers. Handlers return a (possibly empty)
+        # list of (subscription key, event) tuples, which are published to the subscribed consumers.
+        self._message_handlers: Dict[Hashable, Callable] = {}
+
+        # Received frames are buffered in a bounded queue and processed by a separate dispatcher task, such that slow
+        # consumers do not stall reading from the websocket connection.
+        self._frame_queue = FrameQueue(queue_size, overflow_policy)
+        self._conflate_frames = self._frame_queue.policy is OverflowPolicy.CONFLATE
+        self._dispatcher_task: Optional[asyncio.Task] = None
+        # Cleared while dispatching is paused by pause_dispatch, in which case received frames remain queued
+        self._dispatch_resumed = asyncio.Event()
+        self._dispatch_resumed.set()
+
+        # Reconnection attempts are delayed by an exponential backoff with jitter. Trades missed while disconnected are
+        # backfilled by the REST API client (if set), starting from the last trade seen per instrument id.
+        self._reconnect_interval = reconnect_interval
+        self._max_reconnect_interval = max_reconnect_interval
+        self._api_client = None
+        self._last_trades: Dict[str, Tuple[float, Set]] = {}
+
+        # Latency instrumentation of every latency_sample_every-th received message (disabled for 0)
+        self._latency_monitor = LatencyMonitor(latency_sample_every) if latency_sample_every > 0 else None
+
+    ########################
+    # WEBSOCKET CONNECTION #
+    ########################
+    async def start(self, keepalive: bool = True) -> None:
+        await self._connect(keepalive)
+        self._dispatcher_task = asyncio.create_task(self._dispatch_frames())
+        if self._bar_close_delay is not None:
+            self._bar_timer_task = asyncio.create_task(self._close_bars_by_time())
+
+        while self.is_running:
+            try:
+                if not self.ws.open:
+                    await self._reconnect()
+                    rootLogger.info(f'Reopened {self.websocket_id}-websocket connection.')
+                else:
+                    data = await self.ws.recv()
+                    conflation_key = self._get_conflation_key(data) if self._conflate_frames else None
+                    if self._latency_monitor is not None:
+                        data = self._latency_monitor.stamp_frame(data)
+                    await self._frame_queue.put(data, conflation_key)
+            except Exception as e:
+                rootLogger.error(f'Error in running {self.websocket_id}-websocket: {e}')
+
+    async def close(self) -> None:
+        self.is_running = False
+        if self._dispatcher_task is not None:
+            self._dispatcher_task.cancel()
+            self._dispatcher_task = None
+        if self._bar_timer_task is not None:
+            self._bar_timer_task.cancel()
+            self._bar_timer_task = None
+        if self.ws:
+            await self.ws.close()
+        self.ws = None
+        rootLogger.info(f'Closed {self.websocket_id}-websocket connection.')
+
+    async def _dispatch_frames(self) -> None:
+        while True:
+            data = await self._frame_queue.get()
+            if not self._dispatch_resumed.is_set():
+                await self._dispatch_resumed.wait()
+            try:
+                if data.__class__ is StampedFrame:
+                    self._on_stamped_frame(data)
+                else:
+                    msg = self._decode_frame(data)
+                    if msg is not None:
+                        self._on_message(msg)
+            except Exception as e:
+                rootLogger.error(f'Error in dispatching message of {self.websocket_id}-websocket: {e}')
+
+    def pause_dispatch(self) -> None:
+        self._dispatch_resumed.clear()
+
+    def resume_dispatch(self) -> None:
+        self._dispatch_resumed.set()
+
+    async def _reconnect(self) -> None:
+        await self.ws.close()
+        self.ws = None
+        self._on_disconnect()
+        # Books are rebuilt from the snapshots sent upon resubscription
+        for book in self._order_books.values():
+            book.invalidate()
+
+        interval = self._reconnect_interval
+        while self.ws is None:
+            await asyncio.sleep(interval * random.uniform(0.5, 1.0))
+            await self._connect(self.keepalive)
+            interval = min(2 * interval, self._max_reconnect_interval)
+
+        await self._resubscribe()
+        await self._backfill_trades()
+
+    def _on_disconnect(self) -> None:
+        # Overwritten by exchange clients to reset connection-specific state (e.g. authentication)
         pass
 
+    def set_api_client(self, api_client) -> None:
+        self._api_client = api_client
+
+    def get_ingestion_stats(self) -> Dict[str, int]:
+        # Frame queue statistics and the number of ticks dropped by bar aggregation as they arrived too late
+        return {**self._frame_queue.get_stats(), 'late_ticks': self._bar_aggregator.late_ticks}
+
+    def get_latency_stats(self, channel: Optional[str] = None, instrument_id: Optional[str] = None) -> Dict[Tuple, Dict]:
+        # Latency percentiles (in seconds) per (channel, instrument id) and stage; empty if instrumentation is disabled
+        if self._latency_monitor is None:
+            return {}
+        return self._latency_monitor.get_stats(channel, instrument_id)
+
     @abstractmethod
     def _keepalive(self, **kwargs):
         pass
@@ -24,19 +203,19 @@ class WebsocketBase(ABC):
         pass
 
     @abstractmethod
-    def _subscribe(self, **kwargs):
+    def _resubscribe(self, **kwargs):
         pass
 
     @abstractmethod
-    def _unsubscribe(self, **kwargs):
+    def _subscribe(self, **kwargs):
         pass
 
     @abstractmethod
-    def _on_message(self, msg: Dict):
+    def _unsubscribe(self, **kwargs):
         pass
 
     @abstractmethod
-    def _handle_message(self, msg: Dict):
+    def _get_route_key(self, msg: Union[List, Dict]) -> Hashable:
         pass
 
     @abstractmethod
@@ -48,9 +227,387 @@ class WebsocketBase(ABC):
         pass
 
     @abstractmethod
-    def subscribe_bars(self, **kwargs):
+    def subscribe_trades(self, **kwargs):
         pass
 
     @abstractmethod
-    def unsubscribe_bars(self, **kwargs):
+    def unsubscribe_trades(self, **kwargs):
         pass
+
+    def _subscribe_consumer(self, sub_key: str, consumer: object) -> None:
+        subscribed_consumers = self._consumer_subscriptions[sub_key]
+
+        if consumer not in subscribed_consumers:
+            subscribed_consumers.append(consumer)
+            rootLogger.info(f'Subscribed consumer {consumer} to subscription key {sub_key}')
+
+    def _unsubscribe_consumer(self, sub_key: str, consumer: object) -> None:
+        try:
+            self._consumer_subscriptions[sub_key].remove(consumer)
+            rootLogger.info(f'Unsubscribed consumer {consumer} to subscription key {sub_key}')
+        except Exception as e:
+            rootLogger.error(f'Error when unsubscribing consumer {e}')
+
+    def _is_feed_required(self, sub_key: str) -> bool:
+        # Feeds are required as long as they have consumers; the trades feed of an instrument is also required by tick
+        # batch consumers and the aggregation of bars of the instrument
+        if self._consumer_subscriptions.get(sub_key):
+            return True
+        channel, _, instrument_id = sub_key.partition('.')
+        if channel != self._TRADES_CHANNEL or not instrument_id:
+            return False
+        return bool(self._consumer_subscriptions.get(f'tick_batch.{instrument_id}')) or instrument_id in self._bar_aggregator
+
+    ################
+    # TICK BATCHES #
+    ################
+    async def subscribe_tick_batches(self, instrument: Instrument, consumer: object) -> None:
+        # Trades of each message of the trades feed are published as one tick batch event holding NumPy arrays. Unless
+        # the instrument has trade or bar consumers, no tick objects are created for the trades.
+        self._subscribe_consumer(get_subscription_key('tick_batch', instrument), consumer)
+        await self.subscribe_trades(instrument)
+
+    async def unsubscribe_tick_batches(self, instrument: Instrument, consumer: object) -> None:
+        self._unsubscribe_consumer(get_subscription_key('tick_batch', instrument), consumer)
+        await self.unsubscribe_trades(instrument)
+
+    ########
+    # BARS #
+    ########
+    async def subscribe_bars(
+            self,
+            instrument: Instrument,
+            freq: str,
+            consumer: object = None,
+            updates: Union[str, int] = BAR_UPDATES_ALL
+    ) -> None:
+        # Bars are aggregated from the trades feed of the instrument. Updates of the current bar are published after
+        # every trades message ('all'), at most every given number of milliseconds or not at all ('close'). Bars are
+        # aggregated at the most frequent policy of their consumers, consumers of other policies receive filtered events.
+        update_interval = get_update_interval(updates)
+        await self.subscribe_trades(instrument)
+
+        sub_key = get_subscription_key('bar', instrument, freq)
+        self._bar_update_intervals[sub_key][consumer] = update_interval
+        self._initialize_bar_variables(instrument, freq)
+
+        if consumer is not None:
+            previous_consumer = self._bar_consumers[sub_key].pop(consumer, None)
+            if previous_consumer is not None:
+                self._unsubscribe_consumer(sub_key, previous_consumer)
+            bar_consumer = consumer if update_interval == 0.0 else BarUpdateFilter(consumer, update_interval)
+            self._bar_consumers[sub_key][consumer] = bar_consumer
+            self._subscribe_consumer(sub_key, bar_consumer)
+
+    async def unsubscribe_bars(self, instrument: Instrument, freq: str, consumer: object = None) -> None:
+        sub_key = get_subscription_key('bar', instrument, freq)
+
+        if consumer is not None:
+            self._unsubscribe_consumer(sub_key, self._bar_consumers[sub_key].pop(consumer, consumer))
+        self._bar_update_intervals[sub_key].pop(consumer, None)
+
+        # Bars are aggregated as long as any consumer is subscribed; the trades feed is kept as long as it has
+        # consumers itself or is required for the aggregation of other bars of the instrument.
+        if len(self._consumer_subscriptions[sub_key]) == 0:
+            self._bar_aggregator.remove_bar(instrument, freq)
+            self._bar_update_intervals.pop(sub_key, None)
+            self._bar_consumers.pop(sub_key, None)
+        else:
+            self._initialize_bar_variables(instrument, freq)
+        if instrument.instrument_id not in self._bar_aggregator:
+            await self.unsubscribe_trades(instrument)
+
+    async def _close_bars_by_time(self) -> None:
+        # Wakes up at the end of the earliest bar interval plus the close delay, but at least every second to pick up
+        # newly subscribed bars
+        while True:
+            next_close_time = self._bar_aggregator.get_next_close_time()
+            delay = 1.0
+            if next_close_time is not None:
+                delay = min(max(next_close_time + self._bar_close_delay - time.time(), 0.0), delay)
+            await asyncio.sleep(delay)
+
+            try:
+                event_list = self._bar_aggregator.close_bars(time.time() - self._bar_close_delay)
+                if event_list:
+                    self._publish_events(event_list)
+            except Exception as e:
+                rootLogger.error(f'Error in closing bars of {self.websocket_id}-websocket: {e}')
+
+    def _initialize_bar_variables(self, instrument: Instrument, freq: str) -> None:
+        sub_key = get_subscription_key('bar', instrument, freq)
+        update_interval = get_most_permissive_interval(self._bar_update_intervals[sub_key].values())
+        self._bar_aggregator.add_bar(instrument, freq, sub_key, update_interval)
+
+    ###################
+    # MESSAGE ROUTING #
+    ###################
+    def _register_handler(self, route_key: Hashable, handler: Callable) -> None:
+        self._message_handlers[route_key] = handler
+
+    def _on_message(self, msg: Union[List, Dict]) -> None:
+        event_list = self._handle_message(msg)
+        if event_list:
+            self._publish_events(event_list)
+
+    def _handle_message(self, msg: Union[List, Dict]) -> List:
+        handler = self._message_handlers.get(self._get_route_key(msg))
+        if handler is None:
+            rootLogger.info(f'Received message on {self.websocket_id}-websocket stream on unknown channel: {msg}')
+            return []
+        return handler(msg)
+
+    def _publish_events(self, event_list: List) -> None:
+        for sub_key, event in event_list:
+            for consumer in self._consumer_subscriptions[sub_key]:
+                consumer.handle_event(event)
+
+    def _get_tick_events(self, sub_key: str, ticks: List[Tick]) -> List[Tuple[str, TickEvent]]:
+        if self._tick_cls is CompactTickEvent:
+            for tick in ticks:
+                tick._publisher_id = self.websocket_id
+            return [(sub_key, tick) for tick in ticks]
+        return [(sub_key, TickEvent(tick, publisher_id=self.websocket_id)) for tick in ticks]
+
+    def _get_trade_events(
+            self,
+            instrument: Instrument,
+            trade_msgs: List,
+            parse_tick: Callable,
+            parse_batch: Callable,
+            aggregate_bars: bool = True
+    ) -> List:
+        # Parses the trades of a message of the trades feed into ticks (parse_tick, per trade) or, if only tick batch
+        # consumers need them, directly into a tick batch (parse_batch, per message)
+        instrument_id = instrument.instrument_id
+        sub_key = get_subscription_key(self._TRADES_CHANNEL, instrument)
+        batch_sub_key = get_subscription_key('tick_batch', instrument)
+        has_batch_consumers = bool(self._consumer_subscriptions.get(batch_sub_key))
+        needs_ticks = bool(self._consumer_subscriptions.get(sub_key)) or (
+                aggregate_bars and instrument_id in self._bar_aggregator
+        )
+
+        if has_batch_consumers and not needs_ticks:
+            tick_batch = self._filter_new_tick_batch(instrument_id, parse_batch(instrument, trade_msgs))
+            if len(tick_batch) == 0:
+                return []
+            return [(batch_sub_key, TickBatchEvent(tick_batch, publisher_id=self.websocket_id))]
+
+        ticks = self._filter_new_ticks(instrument_id, [parse_tick(instrument, trade_msg) for trade_msg in trade_msgs])
+        event_list = self._get_tick_events(sub_key, ticks)
+        if has_batch_consumers and ticks:
+            tick_batch = TickBatch.from_ticks(instrument, ticks)
+            event_list.append((batch_sub_key, TickBatchEvent(tick_batch, publisher_id=self.websocket_id)))
+        if aggregate_bars:
+            event_list.extend(self._bar_aggregator.update(instrument, ticks))
+        return event_list
+
+    def _get_book_events(self, sub_key: str, book: OrderBook) -> List:
+        if not book.is_valid:
+            return []
+        return [(sub_key, BookEvent(book.get_book(self._book_event_levels), publisher_id=self.websocket_id))]
+
+    def _on_stamped_frame(self, frame: StampedFrame) -> None:
+        # Instrumented counterpart of decoding a frame and publishing its events, which stamps and measures every event
+        msg = self._decode_frame(frame.data)
+        if msg is None:
+            return
+
+        event_list = self._handle_message(msg)
+        parsed_at = time.monotonic()
+        for sub_key, event in event_list:
+            event.received_at = frame.received_at
+            event.dispatched_at = time.monotonic()
+            self._latency_monitor.record_event(sub_key, event, frame, parsed_at, event.dispatched_at)
+            for consumer in self._consumer_subscriptions[sub_key]:
+                consumer.handle_event(event)
+
+    ##################
+    # TRADE BACKFILL #
+    ##################
+    def _filter_new_ticks(
+            self,
+            instrument_id: str,
+            ticks: List[Tick],
+            last_trades: Optional[Dict[str, Tuple[float, Set]]] = None
+    ) -> List[Tick]:
+        # Drops trades up to the last trade seen of the instrument, i.e. duplicates of backfilled and live trades.
+        # Trades at the same timestamp are told apart by their id or, lacking ids, by price, size and side. The last
+        # trades seen are those of the live feeds, unless given (e.g. of a warm-up).
+        if last_trades is None:
+            last_trades = self._last_trades
+        last_trade = last_trades.get(instrument_id)
+        if last_trade is not None:
+            last_ts, last_keys = last_trade
+            ticks = [
+                tick for tick in ticks
+                if tick.timestamp > last_ts or (tick.timestamp == last_ts and _get_trade_key(tick) not in last_keys)
+            ]
+        if not ticks:
+            return ticks
+
+        max_ts = max(tick.timestamp for tick in ticks)
+        max_keys = {_get_trade_key(tick) for tick in ticks if tick.timestamp == max_ts}
+        if last_trade is not None and max_ts == last_trade[0]:
+            max_keys |= last_trade[1]
+        last_trades[instrument_id] = (max_ts, max_keys)
+        return ticks
+
+    def _filter_new_tick_batch(self, instrument_id: str, tick_batch: TickBatch) -> TickBatch:
+        # Counterpart of _filter_new_ticks for tick batches, which only compares trade keys of trades at the timestamp of
+        # the last trade seen
+        timestamps = tick_batch.timestamps
+        last_trade = self._last_trades.get(instrument_id)
+        if last_trade is not None:
+            last_ts, last_keys = last_trade
+            mask = timestamps > last_ts
+            for idx in np.flatnonzero(timestamps == last_ts):
+                mask[idx] = tick_batch.get_trade_key(idx) not in last_keys
+            if not mask.all():
+                tick_batch = tick_batch.select(mask)
+                timestamps = tick_batch.timestamps
+        if len(tick_batch) == 0:
+            return tick_batch
+
+        max_ts = float(timestamps.max())
+        max_keys = {tick_batch.get_trade_key(idx) for idx in np.flatnonzero(timestamps == max_ts)}
+        if last_trade is not None and max_ts == last_trade[0]:
+            max_keys |= last_trade[1]
+        self._last_trades[instrument_id] = (max_ts, max_keys)
+        return tick_batch
+
+    async def _backfill_trades(self) -> None:
+        # Missed trades are queued as synthetic feed frames before any live frame of the new connection is received,
+        # such that they are processed in order by the same message handlers
+        if self._api_client is None or self._TRADES_CHANNEL is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        instrument_ids = [
+            instrument_id for instrument_id in self._last_trades.keys()
+            if f'{self._TRADES_CHANNEL}.{instrument_id}' in self._feed_subscriptions
+        ]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(None, self._fetch_trade_frames, instrument_id, self._last_trades[instrument_id][0])
+            for instrument_id in instrument_ids
+        ), return_exceptions=True)
+
+        for instrument_id, frames in zip(instrument_ids, results):
+            if isinstance(frames, Exception):
+                rootLogger.error(f'Error in backfilling trades of {instrument_id} on {self.websocket_id}-websocket: {frames}')
+                continue
+            rootLogger.info(f'Backfilling {len(frames)} trade messages of {instrument_id} on {self.websocket_id}-websocket.')
+            for frame in frames:
+                await self._frame_queue.put(frame)
+
+    async def warm_up_trades(
+            self,
+            instruments: List[Instrument],
+            freq: str,
+            since: float,
+            cache_dir: Optional[str] = None
+    ) -> List[BarEvent]:
+        # Aggregates the trades since the given timestamp into bars of the given frequency and returns their bar events:
+        # the completed bars followed by the current bar of every instrument. Trades are fetched concurrently for all
+        # instruments, starting from the end of their cached trades (if cache_dir is set).
+        # The client may be shared by consumers which are already live, hence warm-up trades are aggregated and
+        # deduplicated privately: neither bars, last trades nor dispatching of the live feeds are affected, and the
+        # bar events are only returned to the caller.
+        if self._api_client is None:
+            rootLogger.error(f'Cannot warm up trades on {self.websocket_id}-websocket without REST API client.')
+            return []
+
+        loop = asyncio.get_running_loop()
+        cache_paths = {
+            instrument.instrument_id: get_cache_path(cache_dir, self.websocket_id, instrument.instrument_id)
+            for instrument in instruments
+        } if cache_dir is not None else {}
+        cached_frames = {
+            instrument_id: load_trade_frames(path, since) for instrument_id, path in cache_paths.items()
+        }
+        fetch_since = {
+            instrument.instrument_id: max(
+                [since] + [timestamp for timestamp, _ in cached_frames.get(instrument.instrument_id, [])]
+            )
+            for instrument in instruments
+        }
+        results = await asyncio.gather(*(
+            loop.run_in_executor(None, self._fetch_trade_frames, instrument_id, instrument_since)
+            for instrument_id, instrument_since in fetch_since.items()
+        ), return_exceptions=True)
+
+        bar_aggregator = BarAggregator(self.websocket_id)
+        last_trades: Dict[str, Tuple[float, Set]] = {}
+        bar_events = []
+        for instrument, frames in zip(instruments, results):
+            instrument_id = instrument.instrument_id
+            if isinstance(frames, Exception):
+                rootLogger.error(f'Error in warming up trades of {instrument_id} on {self.websocket_id}-websocket: {frames}')
+                frames = []
+            bar_aggregator.add_bar(instrument, freq, get_subscription_key('bar', instrument, freq))
+
+            # Frames are cached with the timestamp of their last trade, by which outdated frames are dropped. Trades
+            # before since are dropped individually, since frames may start before it.
+            replayed_frames = []
+            current_bar_event = None
+            for frame in [frame for _, frame in cached_frames.get(instrument_id, [])] + frames:
+                ticks = self._parse_trades_message(instrument, self._json_decoder.loads(frame))
+                ticks = [tick for tick in ticks if tick.timestamp >= since]
+                ticks = self._filter_new_ticks(instrument_id, ticks, last_trades)
+                if not ticks:
+                    continue
+                replayed_frames.append((last_trades[instrument_id][0], frame))
+                for _, bar_event in bar_aggregator.update(instrument, ticks):
+                    if bar_event.data.is_closed:
+                        bar_events.append(bar_event)
+                        current_bar_event = None
+                    else:
+                        current_bar_event = bar_event
+            if current_bar_event is not None:
+                bar_events.append(current_bar_event)
+            rootLogger.info(f'Warmed up {instrument_id} on {self.websocket_id}-websocket by {len(replayed_frames)} trade messages.')
+
+            if instrument_id in cache_paths:
+                try:
+                    save_trade_frames(cache_paths[instrument_id], replayed_frames)
+                except Exception as e:
+                    rootLogger.error(f'Error in saving trade cache of {instrument_id}: {e}')
+        return bar_events
+
+    def _fetch_trade_frames(self, instrument_id: str, since: float) -> List[Frame]:
+        # Overwritten by exchange clients, which fetch the trades since the given timestamp from the REST API client and
+        # return them as frames of their trades feed
+        return []
+
+    def _parse_trades_message(self, instrument: Instrument, msg: Union[List, Dict]) -> List[Tick]:
+        # Overwritten by exchange clients, which parse the trades of a message of their trades feed (e.g. as returned by
+        # _fetch_trade_frames) into ticks
+        return []
+
+    ##################
+    # FRAME DECODING #
+    ##################
+    def _decode_frame(self, data: Frame):
+        # Optionally, frames of feeds which are not (or no longer) subscribed are dropped before being decoded. Peeking
+        # at the frame prefix only pays off for large frames or slow JSON backends, hence it is disabled by default.
+        if self._skip_inactive_frames and not self._is_frame_wanted(data):
+            return None
+        return self._json_decoder.loads(data)
+
+    def _is_frame_wanted(self, data: Frame) -> bool:
+        sub_key = self._peek_subscription_key(data)
+        return sub_key is None or sub_key in self._feed_subscriptions
+
+    def _get_conflation_key(self, data: Frame) -> Optional[str]:
+        sub_key = self._peek_subscription_key(data)
+        if sub_key is not None and sub_key.split('.', 1)[0] in self._CONFLATABLE_CHANNELS:
+            return sub_key
+        return None
+
+    def _peek_subscription_key(self, data: Frame) -> Optional[str]:
+        # Overwritten by exchange clients, which can extract the subscription key of a feed message from its prefix.
+        return None
+
+
+def _get_trade_key(tick: Tick) -> Hashable:
+    return tick.trade_id if tick.trade_id is not None else (tick.price, tick.size, tick.side)
@@ -1,12 +1,49 @@
+from typing import NamedTuple, Optional
+
 from core.instrument import Instrument
 from utils.timedelta_parser import convert_to_timedelta
 
+# Information-driven bars, which are sampled by trading activity instead of time: bars close once the number of trades,
+# traded volume, traded notional or the absolute imbalance of buyer- and seller-initiated trades reaches the threshold
+# of the bar's frequency, e.g. 'tick:500' or 'dollar:1000000'.
+TICK_BAR = 'tick'
+VOLUME_BAR = 'volume'
+DOLLAR_BAR = 'dollar'
+IMBALANCE_BAR = 'imbalance'
+INFORMATION_BAR_TYPES = (TICK_BAR, VOLUME_BAR, DOLLAR_BAR, IMBALANCE_BAR)
+
+
+def is_time_freq(freq: str) -> bool:
+    return ':' not in freq
+
+
+class BarSnapshot(NamedTuple):
+    """
+    Immutable state of a bar at the time it was published by a bar event, which consumers may keep references to.
+    """
+    instrument: Instrument
+    freq: str
+    timestamp: float
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    is_closed: bool
+    # Number of bars completed before the bar by its aggregation, which tells apart bars of the same timestamp
+    seq: int = 0
+
 
 class Bar:
+    __slots__ = (
+        'instrument', 'freq', 'norm_seconds', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'is_closed', 'seq'
+    )
+    is_time_bar = True
+
     def __init__(self, instrument: Instrument, freq: str):
         self.instrument = instrument
         self.freq = freq
-        self.norm_seconds = convert_to_timedelta(freq).total_seconds()
+        self.norm_seconds = convert_to_timedelta(freq).total_seconds() if self.is_time_bar else None
 
         self.timestamp = None
         self.open = None
@@ -14,6 +51,10 @@ class Bar:
         self.low = None
         self.close = None
         self.volume = 0
+        # Set on bars published upon completion, as opposed to updates of the bar in progress
+        self.is_closed = False
+        # Number of completed bars before the bar, which is kept by resets
+        self.seq = 0
 
     def reset(self):
         self.timestamp = None
@@ -22,6 +63,13 @@ class Bar:
         self.low = None
         self.close = None
         self.volume = 0
+        self.is_closed = False
+
+    def snapshot(self) -> BarSnapshot:
+        return BarSnapshot(
+            self.instrument, self.freq, self.timestamp, self.open, self.high, self.low, self.close, self.volume,
+            self.is_closed, self.seq
+        )
 
     def update_bar(self, timestamp: float, price: float, size: float) -> None:
         if self.timestamp is None:
@@ -33,8 +81,73 @@ class Bar:
         self.close = price
         self.volume += size
 
+    def merge(self, timestamp: float, open: float, high: float, low: float, close: float, volume: float) -> None:
+        # Updates the bar by an aggregate of consecutive trades of the bar's interval starting at timestamp
+        if self.timestamp is None:
+            self.timestamp = timestamp
+        if self.open is None:
+            self.open = open
+        self.high = max(self.high, high) if self.high is not None else high
+        self.low = min(self.low, low) if self.low is not None else low
+        self.close = close
+        self.volume += volume
+
     def is_complete(self, timestamp: float) -> bool:
         if self.timestamp is None:
             return False
         else:
             return (timestamp // self.norm_seconds) > (self.timestamp // self.norm_seconds)
+
+
+class InformationBar(Bar):
+    """
+    Bar closing once the trading activity measured by its bar type reaches its threshold. The trade reaching the
+    threshold is part of the closing bar; trades are not split across bars, i.e. volume and dollar bars may overshoot.
+    Bars are time-stamped with the time of their first trade.
+    """
+    __slots__ = ('bar_type', 'threshold', 'progress')
+    is_time_bar = False
+
+    def __init__(self, instrument: Instrument, freq: str):
+        super().__init__(instrument, freq)
+        bar_type, threshold = freq.split(':', 1)
+        if bar_type not in INFORMATION_BAR_TYPES or float(threshold) <= 0:
+            raise ValueError(f'Invalid bar frequency: {freq}')
+        self.bar_type = bar_type
+        self.threshold = float(threshold)
+        # Accumulated trading activity of the bar by its bar type
+        self.progress = 0.0
+
+    def reset(self):
+        super().reset()
+        self.progress = 0.0
+
+    def update_bar(self, timestamp: float, price: float, size: float, side: Optional[str] = None) -> None:
+        if self.timestamp is None:
+            self.timestamp = timestamp
+        if self.open is None:
+            self.open = price
+        self.high = max(self.high, price) if self.high is not None else price
+        self.low = min(self.low, price) if self.low is not None else price
+        self.close = price
+        self.volume += size
+
+        if self.bar_type == TICK_BAR:
+            self.progress += 1
+        elif self.bar_type == VOLUME_BAR:
+            self.progress += size
+        elif self.bar_type == DOLLAR_BAR:
+            self.progress += price * size
+        else:
+            self.progress += 1 if side == 'buy' else -1
+
+    def is_complete(self, timestamp: float) -> bool:
+        # Information bars are completed by their last trade instead of the first trade of the next bar
+        return False
+
+    def is_full(self) -> bool:
+        return abs(self.progress) >= self.threshold
+
+
+def get_bar(instrument: Instrument, freq: str) -> Bar:
+    return Bar(instrument, freq) if is_time_freq(freq) else InformationBar(instrument, freq)
@@ -0,0 +1,22 @@
+from typing import List, Tuple
+
+from core.instrument import Instrument
+
+
+class Book(object):
+    """
+    Top levels of an order book, i.e. lists of (price, size) tuples sorted from the best price downwards.
+    """
+    __slots__ = ('timestamp', 'instrument', 'bids', 'asks')
+
+    def __init__(
+            self,
+            timestamp: float,
+            instrument: Instrument,
+            bids: List[Tuple[float, float]],
+            asks: List[Tuple[float, float]]
+    ):
+        self.timestamp = timestamp
+        self.instrument = instrument
+        self.bids = bids
+        self.asks = asks
@@ -6,8 +6,10 @@ class EventType(Enum):
     ORDER = "ORDER"
     FILL = "FILL"
     TICK = "TRADE"
+    TICK_BATCH = "TRADE_BATCH"
     QUOTE = "QUOTE"
     BAR = "BAR"
+    BOOK = "BOOK"
 
     # Order execution stream
     ORDER_UPDATED = "ORDER_UPDATED"
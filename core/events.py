@@ -1,25 +1,34 @@
-from typing import Union
+from typing import Optional, Union
 from core.event_type import EventType
-from core.bar import Bar
+from core.bar import BarSnapshot
+from core.book import Book
 from core.trade import Trade
 from core.quote import Quote
 from core.fill import Fill
 from core.tick import Tick
+from core.tick_batch import TickBatch
 from core.order_update import OrderUpdate
+from core.instrument import Instrument
 
 
 class Event(object):
-    def __init__(self, _type: EventType, _data: Union[Trade, Bar, Quote, Tick, Fill, OrderUpdate], publisher_id: str):
+    __slots__ = ('_type', '_data', '_publisher_id', 'received_at', 'dispatched_at')
+
+    def __init__(self, _type: EventType, _data: Union[Trade, BarSnapshot, Book, Quote, Tick, TickBatch, Fill, OrderUpdate], publisher_id: str):
         self._type = _type
         self._data = _data
         self._publisher_id = publisher_id
+        # Monotonic times of receipt of the underlying message and of dispatch to consumers (set for sampled messages
+        # of websocket clients with latency instrumentation only)
+        self.received_at: Optional[float] = None
+        self.dispatched_at: Optional[float] = None
 
     @property
     def type(self) -> EventType:
         return self._type
 
     @property
-    def data(self) -> Union[Trade, Bar, Quote, Tick, Fill, OrderUpdate]:
+    def data(self) -> Union[Trade, BarSnapshot, Book, Quote, Tick, TickBatch, Fill, OrderUpdate]:
         return self._data
 
     @property
@@ -29,31 +38,95 @@ class Event(object):
 
 # Data stream events
 class BarEvent(Event):
-    def __init__(self, bar: Bar, publisher_id: str = ''):
+    __slots__ = ('updated_at',)
+
+    def __init__(self, bar: BarSnapshot, publisher_id: str = '', updated_at: Optional[float] = None):
         super().__init__(EventType.BAR, bar, publisher_id)
+        # Trade time of updates of the current bar (None for completed bars), by which consumers throttle updates
+        self.updated_at = updated_at
+
+
+class BookEvent(Event):
+    __slots__ = ()
+
+    def __init__(self, book: Book, publisher_id: str = ''):
+        super().__init__(EventType.BOOK, book, publisher_id)
 
 
 class QuoteEvent(Event):
+    __slots__ = ()
+
     def __init__(self, quote: Quote, publisher_id: str = ''):
         super().__init__(EventType.QUOTE, quote, publisher_id)
 
 
 class TickEvent(Event):
+    __slots__ = ()
+
     def __init__(self, tick: Tick, publisher_id: str = ''):
         super().__init__(EventType.TICK, tick, publisher_id)
 
 
+class TickBatchEvent(Event):
+    __slots__ = ()
+
+    def __init__(self, tick_batch: TickBatch, publisher_id: str = ''):
+        super().__init__(EventType.TICK_BATCH, tick_batch, publisher_id)
+
+
 class FillEvent(Event):
+    __slots__ = ()
+
     def __init__(self, fill: Fill, publisher_id: str = ''):
         super().__init__(EventType.FILL, fill, publisher_id)
 
 
 class OrderUpdateEvent(Event):
+    __slots__ = ()
+
     def __init__(self, order_update: OrderUpdate, publisher_id: str = ''):
         super().__init__(EventType.ORDER_UPDATED, order_update, publisher_id)
 
 
+class CompactTickEvent(TickEvent):
+    """
+    Tick event carrying the fields of its tick itself, such that only a single object is allocated per trade. The
+    event is its own data and can be used wherever ticks are expected.
+    """
+    __slots__ = ('timestamp', 'instrument', 'trade_id', 'price', 'size', 'side', 'liquidation')
+
+    def __init__(
+            self,
+            timestamp: float,
+            instrument: Instrument,
+            trade_id: Optional[int],
+            price: float,
+            size: float,
+            side: str,
+            liquidation: Optional[bool],
+            publisher_id: str = ''
+    ):
+        Event.__init__(self, EventType.TICK, None, publisher_id)
+        self.timestamp = timestamp
+        self.instrument = instrument
+        self.trade_id = trade_id
+        self.price = price
+        self.size = size
+        self.side = side
+        self.liquidation = liquidation
+
+    from_ftx_msg = classmethod(Tick.from_ftx_msg.__func__)
+    from_kraken_fut_msg = classmethod(Tick.from_kraken_fut_msg.__func__)
+    from_kraken_spot_msg = classmethod(Tick.from_kraken_spot_msg.__func__)
+
+    @property
+    def data(self) -> 'CompactTickEvent':
+        return self
+
+
 # Execution Events
 class TradeExecutedEvent(Event):
+    __slots__ = ()
+
     def __init__(self, trade: Trade, publisher_id: str = ''):
         super().__init__(EventType.TRADE_EXECUTED, trade, publisher_id)
@@ -1,11 +1,16 @@
 import numpy as np
 from typing import Dict
-from datetime import datetime
 
 from core.instrument import Instrument
+from utils.timestamp_parser import parse_timestamp
 
 
 class Fill:
+    __slots__ = (
+        'timestamp', 'instrument', 'order_id', 'fill_id', 'trade_id', 'side', 'price', 'size', 'fill_type', 'fee_rate',
+        'fee'
+    )
+
     def __init__(
             self,
             timestamp: float,
@@ -35,7 +40,7 @@ class Fill:
     @classmethod
     def from_ftx_msg(cls, instrument: Instrument, msg: Dict):
         return cls(
-            datetime.fromisoformat(msg['data']['time']).timestamp(),
+            parse_timestamp(msg['data']['time']),
             instrument,
             msg['data']['orderId'],
             msg['data']['id'],
@@ -1,5 +1,7 @@
 
 class Instrument:
+    __slots__ = ('name', 'instrument_id', 'tick_size', 'size_unit')
+
     def __init__(
             self,
             name: str,
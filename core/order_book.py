@@ -0,0 +1,117 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from core.book import Book
+from core.instrument import Instrument
+
+
+class BookSide(object):
+    """
+    One side of an order book kept as a sorted list of price keys and a dict of their sizes, sorted from the best price
+    downwards. Bid prices are stored negated, such that both sides are sorted in ascending order of their keys. Sizes
+    are looked up in O(1), price levels are inserted and deleted in O(log n).
+    """
+    __slots__ = ('is_bid', '_keys', '_sizes')
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self._keys = SortedList()
+        self._sizes: Dict[float, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._sizes.clear()
+
+    def update(self, price: float, size: float) -> None:
+        # Levels with zero size are removed from the book
+        key = -price if self.is_bid else price
+        sizes = self._sizes
+
+        if size == 0:
+            if sizes.pop(key, None) is not None:
+                self._keys.remove(key)
+        else:
+            if key not in sizes:
+                self._keys.add(key)
+            sizes[key] = size
+
+    def truncate(self, depth: int) -> None:
+        if len(self._keys) > depth:
+            for key in self._keys.islice(depth):
+                del self._sizes[key]
+            del self._keys[depth:]
+
+    def get_size(self, price: float) -> float:
+        return self._sizes.get(-price if self.is_bid else price, 0.0)
+
+    def best(self) -> Optional[Tuple[float, float]]:
+        if not self._keys:
+            return None
+        key = self._keys[0]
+        return (-key if self.is_bid else key), self._sizes[key]
+
+    def levels(self, depth: Optional[int] = None) -> List[Tuple[float, float]]:
+        sizes = self._sizes
+        keys = self._keys.islice(stop=depth)
+        if self.is_bid:
+            return [(-key, sizes[key]) for key in keys]
+        return [(key, sizes[key]) for key in keys]
+
+
+class OrderBook(object):
+    """
+    Incrementally maintained L2 order book of an instrument. Exchange clients apply snapshots and level updates and
+    invalidate the book if it got out of sync (e.g. on checksum mismatches) until the next snapshot has been applied.
+    """
+    __slots__ = ('instrument', 'depth', 'timestamp', 'is_valid', 'bids', 'asks')
+
+    def __init__(self, instrument: Instrument, depth: Optional[int] = None):
+        self.instrument = instrument
+        self.depth = depth
+        self.timestamp = None
+        self.is_valid = False
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+
+    def apply_snapshot(self, bids: Iterable[Tuple[float, float]], asks: Iterable[Tuple[float, float]], timestamp: Optional[float] = None) -> None:
+        self.bids.clear()
+        self.asks.clear()
+        for price, size in bids:
+            self.bids.update(price, size)
+        for price, size in asks:
+            self.asks.update(price, size)
+        self._truncate()
+        self.timestamp = timestamp
+        self.is_valid = True
+
+    def update(self, is_bid: bool, price: float, size: float) -> None:
+        (self.bids if is_bid else self.asks).update(price, size)
+
+    def _truncate(self) -> None:
+        # Levels out of scope of a depth-limited subscription are no longer updated by the exchange
+        if self.depth is not None:
+            self.bids.truncate(self.depth)
+            self.asks.truncate(self.depth)
+
+    def end_update(self, timestamp: Optional[float] = None) -> None:
+        self._truncate()
+        if timestamp is not None:
+            self.timestamp = timestamp
+
+    def invalidate(self) -> None:
+        self.is_valid = False
+        self.bids.clear()
+        self.asks.clear()
+
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        return self.bids.best()
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        return self.asks.best()
+
+    def get_book(self, depth: Optional[int] = None) -> Book:
+        return Book(self.timestamp, self.instrument, self.bids.levels(depth), self.asks.levels(depth))
@@ -5,9 +5,15 @@ from core.order_type import OrderType
 from core.order_side import OrderSide
 from core.order_status import OrderStatus
 from core.instrument import Instrument
+from utils.timestamp_parser import parse_timestamp
 
 
 class OrderUpdate:
+    __slots__ = (
+        'timestamp', 'order_id', 'instrument', 'order_type', 'side', 'status', 'size', 'filled_size', 'remaining_size',
+        'avg_fill_price', 'created_at', 'price', 'client_id', 'bid_price', 'bid_size', 'ask_price', 'ask_size'
+    )
+
     def __init__(
             self,
             timestamp: float,
@@ -92,7 +98,7 @@ class OrderUpdate:
             msg_data['filledSize'],
             msg_data['remainingSize'],
             msg_data['avgFillPrice'],
-            datetime.fromisoformat(msg_data['createdAt']).timestamp(),
+            parse_timestamp(msg_data['createdAt']),
             msg_data['price'] if msg_data['price'] is not None else np.nan,
             msg_data['clientId'],
             bid_price=bid_dict['price'] if bid_dict is not None else np.nan,
@@ -6,6 +6,8 @@ from core.instrument import Instrument
 
 
 class Quote(object):
+    __slots__ = ('timestamp', 'instrument', 'bid', 'bid_size', 'ask', 'ask_size', 'last')
+
     def __init__(
             self,
             timestamp: float,
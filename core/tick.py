@@ -1,10 +1,12 @@
-from datetime import datetime
 from typing import Dict, Optional, List
 
 from core.instrument import Instrument
+from utils.timestamp_parser import parse_timestamp
 
 
 class Tick(object):
+    __slots__ = ('timestamp', 'instrument', 'trade_id', 'price', 'size', 'side', 'liquidation')
+
     def __init__(
             self,
             timestamp: float,
@@ -26,7 +28,7 @@ class Tick(object):
     @classmethod
     def from_ftx_msg(cls, instrument: Instrument, trade_msg: Dict):
         return cls(
-            datetime.fromisoformat(trade_msg['time']).timestamp(),
+            parse_timestamp(trade_msg['time']),
             instrument,
             trade_msg['id'],
             trade_msg['price'],
@@ -0,0 +1,112 @@
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+from core.tick import Tick
+from core.instrument import Instrument
+from utils.timestamp_parser import parse_timestamp
+
+BUY = 1
+SELL = -1
+
+
+class TickBatch(object):
+    """
+    Trades of an instrument received in one websocket message, stored column-wise in NumPy arrays: timestamps, prices
+    and sizes (float64), sides (int8, BUY or SELL) and liquidation flags (bool). Trade ids (if sent by the exchange) are
+    kept in a list, as they are only used to tell apart trades of the same timestamp.
+    """
+    __slots__ = ('instrument', 'timestamps', 'prices', 'sizes', 'sides', 'liquidations', 'trade_ids')
+
+    def __init__(
+            self,
+            instrument: Instrument,
+            timestamps: np.ndarray,
+            prices: np.ndarray,
+            sizes: np.ndarray,
+            sides: np.ndarray,
+            liquidations: np.ndarray,
+            trade_ids: Optional[List] = None
+    ):
+        self.instrument = instrument
+        self.timestamps = timestamps
+        self.prices = prices
+        self.sizes = sizes
+        self.sides = sides
+        self.liquidations = liquidations
+        self.trade_ids = trade_ids
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def get_trade_key(self, idx: int) -> Hashable:
+        # Equal to the key of the corresponding tick, see clients.websocket_base._get_trade_key
+        if self.trade_ids is not None:
+            return self.trade_ids[idx]
+        return float(self.prices[idx]), float(self.sizes[idx]), 'buy' if self.sides[idx] == BUY else 'sell'
+
+    def select(self, mask: np.ndarray) -> 'TickBatch':
+        trade_ids = self.trade_ids
+        if trade_ids is not None:
+            trade_ids = [trade_id for trade_id, keep in zip(trade_ids, mask.tolist()) if keep]
+        return TickBatch(
+            self.instrument,
+            self.timestamps[mask],
+            self.prices[mask],
+            self.sizes[mask],
+            self.sides[mask],
+            self.liquidations[mask],
+            trade_ids
+        )
+
+    @classmethod
+    def from_ticks(cls, instrument: Instrument, ticks: List[Tick]):
+        n_ticks = len(ticks)
+        return cls(
+            instrument,
+            np.fromiter((tick.timestamp for tick in ticks), dtype=float, count=n_ticks),
+            np.fromiter((tick.price for tick in ticks), dtype=float, count=n_ticks),
+            np.fromiter((tick.size for tick in ticks), dtype=float, count=n_ticks),
+            np.fromiter((BUY if tick.side == 'buy' else SELL for tick in ticks), dtype=np.int8, count=n_ticks),
+            np.fromiter((bool(tick.liquidation) for tick in ticks), dtype=bool, count=n_ticks),
+            [tick.trade_id for tick in ticks] if n_ticks > 0 and ticks[0].trade_id is not None else None
+        )
+
+    @classmethod
+    def from_ftx_msg(cls, instrument: Instrument, trade_msgs: List[Dict]):
+        n_trades = len(trade_msgs)
+        return cls(
+            instrument,
+            np.fromiter((parse_timestamp(msg['time']) for msg in trade_msgs), dtype=float, count=n_trades),
+            np.fromiter((msg['price'] for msg in trade_msgs), dtype=float, count=n_trades),
+            np.fromiter((msg['size'] for msg in trade_msgs), dtype=float, count=n_trades),
+            np.fromiter((BUY if msg['side'] == 'buy' else SELL for msg in trade_msgs), dtype=np.int8, count=n_trades),
+            np.fromiter((msg['liquidation'] for msg in trade_msgs), dtype=bool, count=n_trades),
+            [msg['id'] for msg in trade_msgs]
+        )
+
+    @classmethod
+    def from_kraken_fut_msg(cls, instrument: Instrument, trade_msgs: List[Dict]):
+        n_trades = len(trade_msgs)
+        return cls(
+            instrument,
+            np.fromiter((msg['time'] for msg in trade_msgs), dtype=float, count=n_trades) / 1000,
+            np.fromiter((msg['price'] for msg in trade_msgs), dtype=float, count=n_trades),
+            np.fromiter((msg['qty'] for msg in trade_msgs), dtype=float, count=n_trades),
+            np.fromiter((BUY if msg['side'] == 'buy' else SELL for msg in trade_msgs), dtype=np.int8, count=n_trades),
+            np.fromiter((msg['type'] == 'liquidation' for msg in trade_msgs), dtype=bool, count=n_trades),
+            [msg['uid'] for msg in trade_msgs]
+        )
+
+    @classmethod
+    def from_kraken_spot_msg(cls, instrument: Instrument, trade_msgs: List[List]):
+        # Trades are sent as lists of strings [price, volume, time, side, order type, misc]
+        columns = np.array([trade_msg[:4] for trade_msg in trade_msgs], dtype=object).reshape(-1, 4)
+        return cls(
+            instrument,
+            columns[:, 2].astype(float),
+            columns[:, 0].astype(float),
+            columns[:, 1].astype(float),
+            np.where(columns[:, 3] == 'b', BUY, SELL).astype(np.int8),
+            np.zeros(len(trade_msgs), dtype=bool)
+        )
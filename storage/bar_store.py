@@ -0,0 +1,203 @@
+import os
+import queue
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.bar import BarSnapshot
+
+rootLogger = logging.getLogger()
+
+# Columns of stored bars with their data types; timestamps are stored in nanoseconds
+BAR_COLUMNS: Dict[str, np.dtype] = {
+    'timestamp': np.dtype(np.int64),
+    'open': np.dtype(np.float64),
+    'high': np.dtype(np.float64),
+    'low': np.dtype(np.float64),
+    'close': np.dtype(np.float64),
+    'volume': np.dtype(np.float64)
+}
+
+NS_PER_DAY = 86400 * 10 ** 9
+
+
+class BarStore(object):
+    """
+    Append-only columnar store of completed bars, partitioned by exchange, instrument, frequency and (UTC) day. Every
+    partition is a directory holding one raw binary file per column, which is appended to and read as memory map.
+    Bars are stored in ascending order of time, such that range queries are answered by binary search of the
+    timestamp column. Reads within a single day are views of the memory-mapped files.
+
+    Bars already stored are skipped by their timestamp and, among bars of the same timestamp (e.g. information bars
+    completed within the same trade timestamp), by their sequence number. Sequence numbers are not stored, hence bars
+    of the timestamp of the last bar on disk are skipped after a restart.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        # Timestamp and sequence number (None if read from disk) of the last stored bar by series directory
+        self._last_bars: Dict[str, Tuple[int, Optional[int]]] = {}
+
+    def _get_series_dir(self, exchange: str, instrument_id: str, freq: str) -> str:
+        return os.path.join(self.root, exchange, instrument_id.replace('/', '-'), freq.replace(':', '-'))
+
+    def _get_partitions(self, series_dir: str) -> List[str]:
+        # Day partitions named by their date (YYYY-MM-DD), which sort chronologically
+        if not os.path.isdir(series_dir):
+            return []
+        return sorted(os.listdir(series_dir))
+
+    def append(self, exchange: str, instrument_id: str, freq: str, bars: Iterable[BarSnapshot]) -> int:
+        # Returns the number of bars written; bars not following the last stored bar of their series are skipped
+        series_dir = self._get_series_dir(exchange, instrument_id, freq)
+        last_bar = self._get_last_bar(series_dir)
+
+        rows_by_day: Dict[str, List[Tuple]] = {}
+        for bar in bars:
+            timestamp = int(bar.timestamp * 1e9)
+            if last_bar is not None and not _is_later_bar(timestamp, bar.seq, *last_bar):
+                continue
+            row = (timestamp, bar.open, bar.high, bar.low, bar.close, bar.volume)
+            rows_by_day.setdefault(_get_day(timestamp), []).append(row)
+            last_bar = (timestamp, bar.seq)
+
+        n_rows = 0
+        for day, rows in rows_by_day.items():
+            partition_dir = os.path.join(series_dir, day)
+            os.makedirs(partition_dir, exist_ok=True)
+            self._truncate_partition(partition_dir)
+            for column, (name, dtype) in zip(zip(*rows), BAR_COLUMNS.items()):
+                with open(os.path.join(partition_dir, name), 'ab') as f:
+                    f.write(np.asarray(column, dtype=dtype).tobytes())
+            n_rows += len(rows)
+
+        if last_bar is not None:
+            self._last_bars[series_dir] = last_bar
+        return n_rows
+
+    def _get_last_bar(self, series_dir: str) -> Optional[Tuple[int, Optional[int]]]:
+        if series_dir not in self._last_bars:
+            partitions = self._get_partitions(series_dir)
+            if partitions:
+                timestamps = self._read_partition(os.path.join(series_dir, partitions[-1]))['timestamp']
+                if len(timestamps) > 0:
+                    self._last_bars[series_dir] = (int(timestamps[-1]), None)
+        return self._last_bars.get(series_dir)
+
+    @staticmethod
+    def _truncate_partition(partition_dir: str) -> None:
+        # Rows of an interrupted append are removed from all columns, such that appended rows stay aligned
+        paths = {name: os.path.join(partition_dir, name) for name in BAR_COLUMNS}
+        sizes = {name: os.path.getsize(path) if os.path.exists(path) else 0 for name, path in paths.items()}
+        n_rows = min(size // BAR_COLUMNS[name].itemsize for name, size in sizes.items())
+        for name, path in paths.items():
+            if sizes[name] > n_rows * BAR_COLUMNS[name].itemsize:
+                os.truncate(path, n_rows * BAR_COLUMNS[name].itemsize)
+
+    @staticmethod
+    def _read_partition(partition_dir: str) -> Dict[str, np.ndarray]:
+        # Columns are truncated to the shortest column, i.e. rows of an interrupted append are ignored
+        columns = {}
+        for name, dtype in BAR_COLUMNS.items():
+            path = os.path.join(partition_dir, name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            n_rows = size // dtype.itemsize
+            columns[name] = np.memmap(path, dtype=dtype, mode='r', shape=(n_rows,)) if n_rows > 0 else np.empty(0, dtype)
+        n_rows = min(len(column) for column in columns.values())
+        return {name: column[:n_rows] for name, column in columns.items()}
+
+    def read(
+            self,
+            exchange: str,
+            instrument_id: str,
+            freq: str,
+            start: Optional[float] = None,
+            end: Optional[float] = None
+    ) -> Dict[str, np.ndarray]:
+        # Columns of the bars with timestamps (in seconds) between start and end (inclusive). Bars of a single day are
+        # returned as views of the memory-mapped files, bars of multiple days are concatenated.
+        series_dir = self._get_series_dir(exchange, instrument_id, freq)
+        start_ns = int(start * 1e9) if start is not None else None
+        end_ns = int(end * 1e9) if end is not None else None
+        start_day = _get_day(start_ns) if start_ns is not None else ''
+        end_day = _get_day(end_ns) if end_ns is not None else '9999-12-31'
+
+        selected = []
+        for day in self._get_partitions(series_dir):
+            if start_day <= day <= end_day:
+                columns = self._read_partition(os.path.join(series_dir, day))
+                timestamps = columns['timestamp']
+                first = np.searchsorted(timestamps, start_ns, side='left') if start_ns is not None else 0
+                last = np.searchsorted(timestamps, end_ns, side='right') if end_ns is not None else len(timestamps)
+                if last > first:
+                    selected.append({name: column[first:last] for name, column in columns.items()})
+
+        if len(selected) == 1:
+            return selected[0]
+        return {
+            name: np.concatenate([columns[name] for columns in selected]) if selected else np.empty(0, dtype)
+            for name, dtype in BAR_COLUMNS.items()
+        }
+
+
+def _is_later_bar(timestamp: float, seq: int, last_timestamp: float, last_seq: Optional[int]) -> bool:
+    # Bars of the same timestamp are ordered by their sequence number; unknown sequence numbers precede none
+    if timestamp != last_timestamp:
+        return timestamp > last_timestamp
+    return last_seq is not None and seq > last_seq
+
+
+def _get_day(timestamp_ns: int) -> str:
+    return datetime.fromtimestamp(timestamp_ns // NS_PER_DAY * 86400, timezone.utc).strftime('%Y-%m-%d')
+
+
+class BarStoreWriter(object):
+    """
+    Consumer of bar events writing completed bars to a bar store in a separate thread, such that disk writes do not
+    block the event loop. Bars queued in the meantime are written in batches per series. Writers are shared by all
+    strategies of the process storing bars of the same exchange (see ConnectionManager), bars received more than once
+    (i.e. of the same timestamp and sequence number) are queued once.
+    """
+    def __init__(self, bar_store: BarStore, exchange: str):
+        self.bar_store = bar_store
+        self.exchange = exchange
+        self._queue: queue.Queue = queue.Queue()
+        # Timestamp and sequence number of the last queued bar by instrument id and frequency
+        self._last_bars: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._thread = threading.Thread(target=self._write_bars, name=f'bar_store_writer_{exchange}', daemon=True)
+        self._thread.start()
+
+    def handle_event(self, event) -> None:
+        # Bar snapshots are immutable, hence they can be handed over to the writer thread without copying
+        bar = event.data
+        if bar.is_closed:
+            series = (bar.instrument.instrument_id, bar.freq)
+            last_bar = self._last_bars.get(series)
+            if last_bar is None or _is_later_bar(bar.timestamp, bar.seq, *last_bar):
+                self._last_bars[series] = (bar.timestamp, bar.seq)
+                self._queue.put(bar)
+
+    def close(self) -> None:
+        # Writes all queued bars before returning
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_bars(self) -> None:
+        is_running = True
+        while is_running:
+            bars = [self._queue.get()]
+            while not self._queue.empty():
+                bars.append(self._queue.get_nowait())
+            # None is queued upon closing the writer
+            is_running = None not in bars
+
+            bars_by_series: Dict[Tuple[str, str], List[BarSnapshot]] = {}
+            for bar in filter(None, bars):
+                bars_by_series.setdefault((bar.instrument.instrument_id, bar.freq), []).append(bar)
+            for (instrument_id, freq), series_bars in bars_by_series.items():
+                try:
+                    self.bar_store.append(self.exchange, instrument_id, freq, series_bars)
+                except Exception as e:
+                    rootLogger.error(f'Error in storing bars of {instrument_id} ({freq}): {e}')
@@ -1,20 +1,33 @@
+import time
 import asyncio
 import logging
+import numpy as np
 import pandas as pd
 from abc import ABC, abstractmethod
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from portfolio.portfolio import Portfolio
 from clients.websocket_base import WebsocketBase
+from clients.bar_aggregator import BAR_UPDATES_ALL
 from clients.api_client_base import APIClientBase
+from clients.connection_manager import connection_manager
 from execution.base_execution_engine import BaseExecutionEngine
+from strategy.price_buffer import PriceBuffer, PRICE_COLUMNS, get_buffer_capacity
+from strategy.price_panel import PricePanel
+from strategy.indicators import Indicator, get_indicator
+from storage.bar_store import BarStore, BarStoreWriter
 
+from core.bar import BarSnapshot, is_time_freq
 from core.instrument import Instrument
 from core.events import Event, EventType, BarEvent, TradeExecutedEvent
+from utils.timedelta_parser import convert_to_timedelta
 
 rootLogger = logging.getLogger()
 
+# Number of buffered bars per instrument for bars without fixed length (information bars)
+DEFAULT_PRICE_BUFFER_SIZE = 100000
+
 
 class BarStrategyBase(ABC):
     def __init__(self, config: Dict, strategy_name: str):
@@ -25,18 +38,26 @@ class BarStrategyBase(ABC):
         self._instruments: List[Instrument] = config['instruments']
         self._strategy_params: Dict = config['strategy_params']
         self._trading_volume: float = config['trading_volume']  # Total value to trade volume in USD
+        if self._strategy_params.get('price_panel', False) and not self._supports_price_panel():
+            raise ValueError(f'{strategy_name}-strategy does not implement _calculate_target_position_from_panel.')
 
-        # API keys and initialization of exchange clients
+        # API keys and initialization of exchange clients. Clients are shared by all strategies of the process
+        # trading on the same exchange account and subaccount.
         self._api_keys: Dict = config['exchange']['api_keys']
-        if 'subaccount' in config['exchange'].keys():
-            self._api_client: APIClientBase = config['exchange']['api_client'](api_keys=self._api_keys, subaccount=config['exchange']['subaccount'])
-        else:
-            self._api_client: APIClientBase = config['exchange']['api_client'](api_keys=self._api_keys)
-
-        self._websocket_client: WebsocketBase = config['exchange']['websocket_client'](
+        subaccount: Optional[str] = config['exchange'].get('subaccount')
+        self._api_client: APIClientBase = connection_manager.acquire_api_client(
+            config['exchange']['api_client'],
+            api_keys=self._api_keys,
+            subaccount=subaccount
+        )
+        self._websocket_client: WebsocketBase = connection_manager.acquire_websocket_client(
+            config['exchange']['websocket_client'],
             api_keys=self._api_keys,
-            subaccount=config['exchange']['subaccount']
+            subaccount=subaccount,
+            **config['exchange'].get('websocket_params', {})
         )
+        # Trades missed while the websocket connection is down are backfilled by the REST API client
+        self._websocket_client.set_api_client(self._api_client)
 
         # Initialize portfolio manager and execution engine
         self._portfolio_manager: Portfolio = config['portfolio_manager'](
@@ -47,27 +68,85 @@ class BarStrategyBase(ABC):
         self._execution_engine.set_api_client(self._api_client)
         self._execution_engine.set_ws_client(self._websocket_client)
 
-        # Initialize class_variables to store price data
-        self._price_dfs: Dict[str, pd.DataFrame] = {}
+        # Initialize class_variables to store price data. Bars are kept in preallocated ring buffers per instrument,
+        # which hold the bars of the last price_df_min_window minutes (or price_buffer_size bars, if given).
+        bar_freq = self._strategy_params['bar_freq']
+        freq_seconds = convert_to_timedelta(bar_freq).total_seconds() if is_time_freq(bar_freq) else None
+        self._price_buffer_size: int = self._strategy_params.get('price_buffer_size') or get_buffer_capacity(
+            self._strategy_params['price_df_min_window'], freq_seconds, DEFAULT_PRICE_BUFFER_SIZE
+        )
+        self._price_buffers: Dict[str, PriceBuffer] = {}
+        # With price_panel, bars of all instruments are kept time-aligned in a single price panel instead, which is
+        # passed to _calculate_target_position_from_panel
+        self._price_panel: Optional[PricePanel] = None
+        if self._strategy_params.get('price_panel', False):
+            if freq_seconds is None:
+                raise ValueError(f'Price panels require time bars, got bar frequency {bar_freq}.')
+            self._price_panel = PricePanel([instrument.name for instrument in self._instruments], self._price_buffer_size)
+        # Streaming indicators by instrument name and indicator name, which are updated by every completed bar. Indicators
+        # are configured by name in strategy_params, optionally restricted to a list of instrument names.
+        self._indicators: Dict[str, Dict[str, Indicator]] = {
+            instrument.name: {
+                indicator_name: get_indicator(indicator_params)
+                for indicator_name, indicator_params in self._strategy_params.get('indicators', {}).items()
+                if instrument.name in indicator_params.get('instruments', [instrument.name])
+            }
+            for instrument in self._instruments
+        }
         self._price_df_rolled: Dict[str, bool] = {instrument.name: False for instrument in self._instruments}
         self._last_roll_ts: Optional[pd.Timestamp] = None
+        # Completed bars are written to the bar store at bar_store_dir (if set) by a separate thread
+        self._exchange_name: str = config['exchange'].get('name', self._websocket_client.websocket_id)
+        self._bar_store: Optional[BarStore] = None
+        self._bar_store_writer: Optional[BarStoreWriter] = None
+        if self._strategy_params.get('bar_store_dir') is not None:
+            self._bar_store_writer = connection_manager.acquire_bar_store_writer(
+                self._strategy_params['bar_store_dir'],
+                self._exchange_name
+            )
+            self._bar_store = self._bar_store_writer.bar_store
+
+        # No trades are placed while bars of the historical warm-up are processed. Live bars received meanwhile are held
+        # back and processed after the warm-up bars.
+        self._is_warming_up: bool = False
+        self._pending_bar_events: Optional[List[BarEvent]] = None
 
     async def start(self) -> None:
-        asyncio.create_task(self._websocket_client.start())
-        while not self._websocket_client.is_running:
-            await asyncio.sleep(0.1)
+        await connection_manager.start_websocket_client(self._websocket_client)
 
         asyncio.create_task(self._execution_engine.start())
-        await self._subscribe_data_streams()
+        if self._strategy_params.get('warm_up', False):
+            await self._get_historical_price_data()
+        else:
+            if self._bar_store is not None:
+                self._load_stored_bars()
+            await self._subscribe_data_streams()
 
     async def close(self):
         await self._execution_engine.close()
-        await self._websocket_client.close()
+        await self._unsubscribe_data_streams()
+        await connection_manager.release_websocket_client(self._websocket_client)
+        connection_manager.release_api_client(self._api_client)
+        if self._bar_store_writer is not None:
+            connection_manager.release_bar_store_writer(self._bar_store_writer)
 
     async def _subscribe_data_streams(self) -> None:
         await asyncio.gather(
             *(
                 self._websocket_client.subscribe_bars(
+                    instrument=instrument,
+                    consumer=self,
+                    freq=self._strategy_params['bar_freq'],
+                    updates=self._strategy_params.get('bar_updates', BAR_UPDATES_ALL)
+                )
+                for instrument in self._instruments
+            )
+        )
+
+    async def _unsubscribe_data_streams(self) -> None:
+        await asyncio.gather(
+            *(
+                self._websocket_client.unsubscribe_bars(
                     instrument=instrument,
                     consumer=self,
                     freq=self._strategy_params['bar_freq']
@@ -76,8 +155,45 @@ class BarStrategyBase(ABC):
             )
         )
 
-    def _get_historical_price_data(self) -> None:
-        raise NotImplementedError('Loading of historical price data is not supported yet.')
+    def _load_stored_bars(self) -> None:
+        # Warm start from the completed bars of the last "price_df_min_window" minutes in the bar store, which lacks
+        # the bars between the last stored bar and the first live bar
+        since = time.time() - 60 * self._strategy_params['price_df_min_window']
+        freq = self._strategy_params['bar_freq']
+        for instrument in self._instruments:
+            columns = self._bar_store.read(self._exchange_name, instrument.instrument_id, freq, start=since)
+            for row in zip(*(columns[name].tolist() for name in ['timestamp'] + PRICE_COLUMNS)):
+                bar = BarSnapshot(instrument, freq, row[0] / 1e9, *row[1:], True)
+                self._update_price_dfs(BarEvent(bar))
+                self._update_indicators(bar)
+            rootLogger.info(f'Loaded {len(columns["timestamp"])} stored bars of {instrument.name}.')
+        self._price_df_rolled = {instrument.name: False for instrument in self._instruments}
+
+    async def _get_historical_price_data(self) -> None:
+        # Warms up price data and indicators by the trades of the last "warm_up_minutes" (default: price_df_min_window)
+        # minutes, which are aggregated into bars for this strategy only. Live bars received meanwhile are processed
+        # after the warm-up bars, of which they supersede the current bar.
+        warm_up_minutes = self._strategy_params.get('warm_up_minutes', self._strategy_params['price_df_min_window'])
+        since = time.time() - 60 * warm_up_minutes
+        rootLogger.info(f'Warming up {self.strategy_name}-strategy by trades of the last {warm_up_minutes} minutes.')
+
+        self._is_warming_up = True
+        self._pending_bar_events = []
+        bar_events = []
+        try:
+            await self._subscribe_data_streams()
+            bar_events = await self._websocket_client.warm_up_trades(
+                self._instruments,
+                self._strategy_params['bar_freq'],
+                since,
+                cache_dir=self._strategy_params.get('warm_up_cache_dir')
+            )
+        finally:
+            pending_bar_events, self._pending_bar_events = self._pending_bar_events, None
+            for bar_event in bar_events + pending_bar_events:
+                self.handle_event(bar_event)
+            self._is_warming_up = False
+            self._price_df_rolled = {instrument.name: False for instrument in self._instruments}
 
     def handle_event(self, event: Event) -> None:
         try:
@@ -91,29 +207,46 @@ class BarStrategyBase(ABC):
             rootLogger.error(f'Error in handle_event method of {self.strategy_name}-strategy: {e}')
 
     def _handle_bar_update(self, event: BarEvent) -> None:
+        if self._pending_bar_events is not None:
+            self._pending_bar_events.append(event)
+            return
+
         self._update_price_dfs(event)
+        if event.data.is_closed:
+            self._update_indicators(event.data)
+            if self._bar_store_writer is not None:
+                self._bar_store_writer.handle_event(event)
+
+        if self._is_warming_up:
+            return
 
         if any(self._price_df_rolled.values()) and self._do_rebalance(event):
             self._last_roll_ts = pd.Timestamp(event.data.timestamp, unit='s', tz='utc')
             self._price_df_rolled = {instrument.name: False for instrument in self._instruments}
             rootLogger.info("Candle rolled: {}".format(self._last_roll_ts))
 
-            # Get last common timestamp of all price dataframes
-            last_ts = min([v.index[-1] for v in self._price_dfs.values()])
-            price_dfs = {k: v.loc[:last_ts] for k, v in self._price_dfs.items()}
-
             # Calculate position
-            target_position = self._calculate_target_position(price_dfs)
+            if self._price_panel is not None:
+                timestamps, prices = self._get_price_panel()
+                target_position = self._calculate_target_position_from_panel(timestamps, prices)
+                # Last close per instrument, also of instruments without bar at the last timestamp
+                closes = pd.DataFrame(prices[:, :, PRICE_COLUMNS.index('close')], columns=self._price_panel.instrument_names)
+                last_prices = closes.ffill().iloc[-1]
+            else:
+                price_dfs = self._get_price_dfs()
+                target_position = self._calculate_target_position(price_dfs)
+                last_prices = pd.Series({k: price_dfs[k]['close'].iloc[-1] for k in target_position.keys()})
             target_position = (target_position * self._trading_volume)
 
-            self._place_trades(target_position, price_dfs)
+            self._place_trades(target_position, last_prices)
 
-    def _place_trades(self, target_position: pd.Series, price_dfs: Dict[str, pd.DataFrame]) -> None:
-        last_prices = pd.Series({k: price_dfs[k]['close'].iloc[-1] for k in target_position.keys()})
+    def _place_trades(self, target_position: pd.Series, last_prices: pd.Series) -> None:
         position_deltas = target_position / last_prices - self._portfolio_manager.get_current_position()
 
-        rootLogger.info('Target position {}'.format(target_position))
-        rootLogger.info('Initiating execution of position deltas: {}'.format(position_deltas))
+        # Formatting series is costly, which adds up when bars are replayed in backtests
+        if rootLogger.isEnabledFor(logging.INFO):
+            rootLogger.info('Target position {}'.format(target_position))
+            rootLogger.info('Initiating execution of position deltas: {}'.format(position_deltas))
         for instrument in self._instruments:
             position_delta = position_deltas.loc[instrument.name]
             if position_delta != 0:
@@ -128,7 +261,8 @@ class BarStrategyBase(ABC):
         self._portfolio_manager.handle_execution(event)
 
     def _do_rebalance(self, event: BarEvent) -> bool:
-        if self._last_roll_ts is None:
+        # Information-driven bars (e.g. tick or volume bars) are not aligned in time, hence every rolled bar rebalances
+        if self._last_roll_ts is None or not is_time_freq(self._strategy_params['bar_freq']):
             return True
 
         # Only rebalance if difference between current event timestamp and last roll timestamp is larger than bar_freq
@@ -137,31 +271,65 @@ class BarStrategyBase(ABC):
 
     def _update_price_dfs(self, bar_event: BarEvent) -> None:
         bar = bar_event.data
-
-        # get data-frame for a given symbol (or create it if it is not there yet)
-        price_df = self._price_dfs.get(bar.instrument.name, pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume']))
-
-        # create index for the new row
-        candle_ts = pd.Timestamp(bar.timestamp, unit="s", tz="utc")
-
-        if len(price_df) > 0 and candle_ts > price_df.index[-1]:
+        if self._price_panel is not None:
+            if self._price_panel.update(bar):
+                self._price_df_rolled[bar.instrument.name] = True
+            return
+
+        # get price buffer for a given symbol (or create it if it is not there yet)
+        price_buffer = self._price_buffers.get(bar.instrument.name)
+        if price_buffer is None:
+            price_buffer = self._price_buffers[bar.instrument.name] = PriceBuffer(self._price_buffer_size)
+
+        # bars of a new timestamp are appended (rolling the price data), updates of the current bar overwrite it
+        is_empty = len(price_buffer) == 0
+        if price_buffer.update(bar) and not is_empty:
             self._price_df_rolled[bar.instrument.name] = True
 
-        # add the new row to the data-frame
-        price_df.loc[candle_ts, :] = {
-            'open': bar.open,
-            'high': bar.high,
-            'low': bar.low,
-            'close': bar.close,
-            'volume': bar.volume
+    def _get_price_dfs(self) -> Dict[str, pd.DataFrame]:
+        # Data frames of the last "price_df_min_window" minutes up to the last common timestamp of all instruments,
+        # which are views of the price buffers
+        last_ts = pd.Timestamp(min(buffer.last_timestamp for buffer in self._price_buffers.values()), tz='utc')
+        window = pd.Timedelta("{}min".format(self._strategy_params['price_df_min_window']))
+        return {
+            name: price_buffer.to_frame(
+                pd.Timestamp(price_buffer.last_timestamp, tz='utc') - window,
+                last_ts
+            )
+            for name, price_buffer in self._price_buffers.items()
         }
 
-        # get "price_df_window" minutes back relative to the last row - this is the time window of prices kept in memory
-        begin_ts = candle_ts - pd.Timedelta("{}min".format(self._strategy_params['price_df_min_window']))
-
-        # leave only data from the "price_df_min_window" (drop the rest)
-        self._price_dfs[bar.instrument.name] = price_df.loc[begin_ts:candle_ts]
+    def _update_indicators(self, bar: BarSnapshot) -> None:
+        for indicator in self._indicators.get(bar.instrument.name, {}).values():
+            indicator.update(bar)
+
+    def _get_indicator_values(self) -> pd.DataFrame:
+        # Current values of all indicators (columns) by instrument name (index); NaN for indicators without value yet
+        return pd.DataFrame({
+            instrument_name: {
+                indicator_name: indicator.value if indicator.is_ready else np.nan
+                for indicator_name, indicator in indicators.items()
+            }
+            for instrument_name, indicators in self._indicators.items()
+        }, dtype=float).T
+
+    def _get_price_panel(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Timestamps and prices (time x instrument x field) of the last "price_df_min_window" minutes up to the last
+        # common timestamp of all instruments, which are views of the price panel
+        last_ts = self._price_panel.last_common_timestamp
+        window = pd.Timedelta("{}min".format(self._strategy_params['price_df_min_window']))
+        return self._price_panel.get_window(last_ts - window.value, last_ts)
 
     @abstractmethod
     def _calculate_target_position(self, price_dfs: Dict[str, pd.DataFrame]) -> pd.Series:
         pass
+
+    def _calculate_target_position_from_panel(self, timestamps: np.ndarray, prices: np.ndarray) -> pd.Series:
+        # Counterpart of _calculate_target_position for strategies run with price_panel, which receive the timestamps
+        # (int64, nanoseconds) and prices (time x instrument x field) of all instruments. Instruments are ordered as
+        # configured, fields as PRICE_COLUMNS. Strategies configured with price_panel are required to override it.
+        raise NotImplementedError(f'{self.strategy_name}-strategy does not support price panels.')
+
+    @classmethod
+    def _supports_price_panel(cls) -> bool:
+        return cls._calculate_target_position_from_panel is not BarStrategyBase._calculate_target_position_from_panel
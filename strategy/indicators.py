@@ -0,0 +1,243 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple, Type
+
+from core.bar import BarSnapshot
+
+
+class Indicator(ABC):
+    """
+    Streaming indicator updated by every completed bar of an instrument in O(1), such that its current value does not
+    have to be recomputed from the price history. Values are None until the indicator has seen enough bars.
+    """
+    def __init__(self, period: int):
+        if period <= 0:
+            raise ValueError(f'Invalid period of {type(self).__name__}-indicator: {period}')
+        self.period = period
+        self.n_updates = 0
+
+    @property
+    def is_ready(self) -> bool:
+        return self.n_updates >= self.period
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._get_value() if self.is_ready else None
+
+    def update(self, bar: BarSnapshot) -> None:
+        self.n_updates += 1
+        self._update(bar)
+
+    @abstractmethod
+    def _update(self, bar: BarSnapshot) -> None:
+        pass
+
+    @abstractmethod
+    def _get_value(self) -> float:
+        pass
+
+
+class _RollingMoments(object):
+    # Means and co-moment of the pairs of values within a sliding window, updated by Welford's algorithm (and its
+    # inverse for removed pairs), which avoids the cancellation of running sums of squares
+    __slots__ = ('period', 'pairs', 'mean_x', 'mean_y', 'comoment')
+
+    def __init__(self, period: int):
+        self.period = period
+        self.pairs: Deque[Tuple[float, float]] = deque()
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.comoment = 0.0
+
+    def update(self, x: float, y: float) -> None:
+        if len(self.pairs) == self.period:
+            self._remove(*self.pairs.popleft())
+        self.pairs.append((x, y))
+        n = len(self.pairs)
+        dx = x - self.mean_x
+        self.mean_x += dx / n
+        self.mean_y += (y - self.mean_y) / n
+        self.comoment += dx * (y - self.mean_y)
+
+    def _remove(self, x: float, y: float) -> None:
+        # Called after the pair has been removed from the window
+        n = len(self.pairs)
+        if n == 0:
+            self.mean_x = self.mean_y = self.comoment = 0.0
+            return
+        dy = y - self.mean_y
+        self.mean_x -= (x - self.mean_x) / n
+        self.mean_y -= dy / n
+        self.comoment -= (x - self.mean_x) * dy
+
+    def get_covariance(self) -> float:
+        # Sample covariance (ddof=1) like pandas' rolling covariance
+        return self.comoment / (len(self.pairs) - 1) if len(self.pairs) > 1 else math.nan
+
+
+class EMA(Indicator):
+    # Exponential moving average with smoothing factor 2 / (period + 1), seeded with the first value
+    def __init__(self, period: int, field: str = 'close'):
+        super().__init__(period)
+        self.field = field
+        self._alpha = 2 / (period + 1)
+        self._ema: Optional[float] = None
+
+    def _update(self, bar: BarSnapshot) -> None:
+        value = getattr(bar, self.field)
+        self._ema = value if self._ema is None else self._ema + self._alpha * (value - self._ema)
+
+    def _get_value(self) -> float:
+        return self._ema
+
+
+class SMA(Indicator):
+    def __init__(self, period: int, field: str = 'close'):
+        super().__init__(period)
+        self.field = field
+        self._moments = _RollingMoments(period)
+
+    def _update(self, bar: BarSnapshot) -> None:
+        value = getattr(bar, self.field)
+        self._moments.update(value, value)
+
+    def _get_value(self) -> float:
+        return self._moments.mean_x
+
+
+class RollingStd(SMA):
+    # Sample standard deviation (ddof=1) over the last period bars
+    def _get_value(self) -> float:
+        return math.sqrt(max(self._moments.get_covariance(), 0.0))
+
+
+class ZScore(RollingStd):
+    # Deviation of the last value from the mean of the last period bars in standard deviations
+    def __init__(self, period: int, field: str = 'close'):
+        super().__init__(period, field)
+        self._last_value = math.nan
+
+    def _update(self, bar: BarSnapshot) -> None:
+        super()._update(bar)
+        self._last_value = getattr(bar, self.field)
+
+    def _get_value(self) -> float:
+        std = super()._get_value()
+        return (self._last_value - self._moments.mean_x) / std if std > 0 else 0.0
+
+
+class RollingCovariance(Indicator):
+    # Sample covariance (ddof=1) of two bar fields over the last period bars
+    def __init__(self, period: int, field_x: str = 'close', field_y: str = 'volume'):
+        super().__init__(period)
+        self.field_x = field_x
+        self.field_y = field_y
+        self._moments = _RollingMoments(period)
+
+    def _update(self, bar: BarSnapshot) -> None:
+        self._moments.update(getattr(bar, self.field_x), getattr(bar, self.field_y))
+
+    def _get_value(self) -> float:
+        return self._moments.get_covariance()
+
+
+class RollingMax(Indicator):
+    # Maximum over the last period bars, kept as first element of a deque of decreasing values (monotonic deque)
+    def __init__(self, period: int, field: str = 'high'):
+        super().__init__(period)
+        self.field = field
+        self._candidates: Deque[Tuple[int, float]] = deque()
+
+    def _is_dominated(self, value: float, new_value: float) -> bool:
+        return value <= new_value
+
+    def _update(self, bar: BarSnapshot) -> None:
+        new_value = getattr(bar, self.field)
+        while self._candidates and self._is_dominated(self._candidates[-1][1], new_value):
+            self._candidates.pop()
+        self._candidates.append((self.n_updates, new_value))
+        if self._candidates[0][0] <= self.n_updates - self.period:
+            self._candidates.popleft()
+
+    def _get_value(self) -> float:
+        return self._candidates[0][1]
+
+
+class RollingMin(RollingMax):
+    def __init__(self, period: int, field: str = 'low'):
+        super().__init__(period, field)
+
+    def _is_dominated(self, value: float, new_value: float) -> bool:
+        return value >= new_value
+
+
+class ATR(Indicator):
+    # Average true range with Wilder's smoothing, seeded with the mean true range of the first period bars
+    def __init__(self, period: int):
+        super().__init__(period)
+        self._last_close: Optional[float] = None
+        self._atr = 0.0
+
+    def _update(self, bar: BarSnapshot) -> None:
+        true_range = bar.high - bar.low
+        if self._last_close is not None:
+            true_range = max(true_range, abs(bar.high - self._last_close), abs(bar.low - self._last_close))
+        self._last_close = bar.close
+        self._atr += (true_range - self._atr) / min(self.n_updates, self.period)
+
+    def _get_value(self) -> float:
+        return self._atr
+
+
+class RSI(Indicator):
+    # Relative strength index of closes with Wilder's smoothing of gains and losses, seeded with their mean over the
+    # first period changes
+    def __init__(self, period: int, field: str = 'close'):
+        super().__init__(period)
+        self.field = field
+        self._last_value: Optional[float] = None
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+
+    @property
+    def is_ready(self) -> bool:
+        # The first bar does not yield a change
+        return self.n_updates > self.period
+
+    def _update(self, bar: BarSnapshot) -> None:
+        value = getattr(bar, self.field)
+        if self._last_value is not None:
+            change = value - self._last_value
+            n_changes = min(self.n_updates - 1, self.period)
+            self._avg_gain += (max(change, 0.0) - self._avg_gain) / n_changes
+            self._avg_loss += (max(-change, 0.0) - self._avg_loss) / n_changes
+        self._last_value = value
+
+    def _get_value(self) -> float:
+        if self._avg_loss == 0:
+            return 100.0 if self._avg_gain > 0 else 50.0
+        return 100 - 100 / (1 + self._avg_gain / self._avg_loss)
+
+
+INDICATORS: Dict[str, Type[Indicator]] = {
+    'ema': EMA,
+    'sma': SMA,
+    'std': RollingStd,
+    'zscore': ZScore,
+    'cov': RollingCovariance,
+    'max': RollingMax,
+    'min': RollingMin,
+    'atr': ATR,
+    'rsi': RSI
+}
+
+
+def get_indicator(params: Dict) -> Indicator:
+    # Creates an indicator from its configuration, e.g. {'type': 'ema', 'period': 20, 'field': 'close'}
+    params = dict(params)
+    indicator_type = params.pop('type')
+    params.pop('instruments', None)
+    if indicator_type not in INDICATORS:
+        raise ValueError(f'Unknown indicator type: {indicator_type}')
+    return INDICATORS[indicator_type](**params)
@@ -0,0 +1,92 @@
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core.bar import BarSnapshot
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class PriceBuffer(object):
+    """
+    Fixed-capacity ring buffer of the bars of an instrument, holding an int64 timestamp column (nanoseconds) and the
+    OHLCV columns in preallocated NumPy arrays. Bars following a completed bar or of a later timestamp are appended in
+    O(1), updates of the current bar overwrite its row in place and bars beyond the capacity overwrite the oldest ones.
+    Hence, information bars completed within the same timestamp are kept as separate rows.
+
+    Every row is written twice, at its position and one capacity further, such that the last capacity rows are always
+    stored contiguously and can be viewed without copying.
+    """
+    __slots__ = ('capacity', '_timestamps', '_values', '_end', '_size', '_is_closed')
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f'Invalid capacity of price buffer: {capacity}')
+        self.capacity = capacity
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.full((2 * capacity, len(PRICE_COLUMNS)), np.nan)
+        # Position after the last row (in [capacity, 2 * capacity) once the buffer is full) and number of rows
+        self._end = 0
+        self._size = 0
+        # Whether the bar of the last row has been completed
+        self._is_closed = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        return int(self._timestamps[self._end - 1]) if self._size > 0 else None
+
+    def update(self, bar: BarSnapshot) -> bool:
+        # Returns True if the bar has been appended as new row. Bars older than the last row are ignored.
+        timestamp = int(bar.timestamp * 1e9)
+        last_timestamp = self.last_timestamp
+        if last_timestamp is not None and timestamp < last_timestamp:
+            return False
+
+        is_new_row = last_timestamp is None or timestamp > last_timestamp or self._is_closed
+        if is_new_row:
+            if self._end == 2 * self.capacity:
+                self._end = self.capacity
+            self._end += 1
+            self._size = min(self._size + 1, self.capacity)
+
+        row = (bar.open, bar.high, bar.low, bar.close, bar.volume)
+        for idx in self._get_positions(self._end - 1):
+            self._timestamps[idx] = timestamp
+            self._values[idx] = row
+        self._is_closed = bar.is_closed
+        return is_new_row
+
+    def _get_positions(self, idx: int):
+        # Positions a row is written to: its position within the first half and its mirror within the second half
+        idx = idx % self.capacity
+        return idx, idx + self.capacity
+
+    def get_timestamps(self) -> np.ndarray:
+        return self._timestamps[self._end - self._size:self._end]
+
+    def get_values(self) -> np.ndarray:
+        # View of the OHLCV rows in chronological order
+        return self._values[self._end - self._size:self._end]
+
+    def to_frame(self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        # Data frame of the rows with timestamps between start and end (inclusive) indexed by UTC timestamps. The OHLCV
+        # values are a view of the buffer, which is only valid until the next update.
+        timestamps = self.get_timestamps()
+        first = np.searchsorted(timestamps, start.value, side='left') if start is not None else 0
+        last = np.searchsorted(timestamps, end.value, side='right') if end is not None else len(timestamps)
+
+        index = pd.DatetimeIndex(timestamps[first:last].view('datetime64[ns]'), copy=False).tz_localize('utc')
+        return pd.DataFrame(self.get_values()[first:last], index=index, columns=PRICE_COLUMNS, copy=False)
+
+
+def get_buffer_capacity(window_minutes: float, norm_seconds: Optional[float], default_capacity: int) -> int:
+    # Number of bars of the given length (in seconds) within the window, including the bar at its start. Bars without
+    # fixed length (information bars) are buffered up to the default capacity.
+    if norm_seconds is None:
+        return default_capacity
+    return math.ceil(window_minutes * 60 / norm_seconds) + 1
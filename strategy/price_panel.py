@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.bar import BarSnapshot
+from strategy.price_buffer import PRICE_COLUMNS
+
+NO_TIMESTAMP = np.iinfo(np.int64).min
+
+
+class PricePanel(object):
+    """
+    Time-aligned price history of multiple instruments, holding the bars of the last capacity timestamps in a
+    preallocated 3-D array (time x instrument x field, fields ordered as PRICE_COLUMNS) and an int64 timestamp column
+    (nanoseconds). Instruments are ordered as given, missing bars are NaN.
+
+    Like PriceBuffer, rows are mirrored into an array of twice the capacity, such that rows of a window are viewed
+    without copying. A bar of a new timestamp appends a row in O(1); bars of earlier timestamps update their row, which
+    is looked up by binary search. Bars of timestamps between existing rows cannot be inserted and are ignored.
+    """
+    __slots__ = ('capacity', 'instrument_names', '_instrument_idx', '_timestamps', '_values', '_last_timestamps', '_end',
+                 '_size')
+
+    def __init__(self, instrument_names: List[str], capacity: int):
+        if capacity <= 0:
+            raise ValueError(f'Invalid capacity of price panel: {capacity}')
+        self.capacity = capacity
+        self.instrument_names = list(instrument_names)
+        self._instrument_idx: Dict[str, int] = {name: idx for idx, name in enumerate(self.instrument_names)}
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.full((2 * capacity, len(self.instrument_names), len(PRICE_COLUMNS)), np.nan)
+        # Timestamp of the last bar per instrument
+        self._last_timestamps = np.full(len(self.instrument_names), NO_TIMESTAMP, dtype=np.int64)
+        self._end = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def update(self, bar: BarSnapshot) -> bool:
+        # Returns True if the bar rolls its instrument, i.e. is of a later timestamp than its previous bar
+        instrument_idx = self._instrument_idx[bar.instrument.name]
+        timestamp = int(bar.timestamp * 1e9)
+        if self._size == 0 or timestamp > self._timestamps[self._end - 1]:
+            self._append_row(timestamp)
+            row_idx = self._end - 1
+        else:
+            timestamps = self._timestamps[self._end - self._size:self._end]
+            row_idx = int(np.searchsorted(timestamps, timestamp))
+            if row_idx == len(timestamps) or timestamps[row_idx] != timestamp:
+                return False
+            row_idx += self._end - self._size
+
+        row_idx %= self.capacity
+        row = (bar.open, bar.high, bar.low, bar.close, bar.volume)
+        self._values[row_idx, instrument_idx] = row
+        self._values[row_idx + self.capacity, instrument_idx] = row
+
+        last_timestamp = self._last_timestamps[instrument_idx]
+        if timestamp > last_timestamp:
+            self._last_timestamps[instrument_idx] = timestamp
+            return last_timestamp != NO_TIMESTAMP
+        return False
+
+    def _append_row(self, timestamp: int) -> None:
+        if self._end == 2 * self.capacity:
+            self._end = self.capacity
+        self._end += 1
+        self._size = min(self._size + 1, self.capacity)
+
+        row_idx = (self._end - 1) % self.capacity
+        for idx in (row_idx, row_idx + self.capacity):
+            self._timestamps[idx] = timestamp
+            self._values[idx] = np.nan
+
+    @property
+    def last_common_timestamp(self) -> Optional[int]:
+        # Last timestamp for which all instruments with any bar have been updated
+        last_timestamps = self._last_timestamps[self._last_timestamps != NO_TIMESTAMP]
+        return int(last_timestamps.min()) if len(last_timestamps) > 0 else None
+
+    def get_window(self, start: Optional[int] = None, end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Views of the timestamps and prices (time x instrument x field) of the rows between start and end (inclusive,
+        # in nanoseconds), which are only valid until the next update
+        timestamps = self._timestamps[self._end - self._size:self._end]
+        values = self._values[self._end - self._size:self._end]
+        first = np.searchsorted(timestamps, start, side='left') if start is not None else 0
+        last = np.searchsorted(timestamps, end, side='right') if end is not None else len(timestamps)
+        return timestamps[first:last], values[first:last]
+
+    def to_frame(self, field: str, start: Optional[int] = None, end: Optional[int] = None) -> pd.DataFrame:
+        # Wide data frame (time x instrument) of a single field of the rows between start and end
+        timestamps, values = self.get_window(start, end)
+        index = pd.DatetimeIndex(timestamps.view('datetime64[ns]'), copy=False).tz_localize('utc')
+        return pd.DataFrame(values[:, :, PRICE_COLUMNS.index(field)], index=index, columns=self.instrument_names)
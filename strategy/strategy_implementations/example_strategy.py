@@ -1,15 +1,14 @@
+import numpy as np
 import pandas as pd
 from typing import Dict
 from strategy.bar_strategy_base import BarStrategyBase
+from strategy.price_buffer import PRICE_COLUMNS
 
 
 class ExampleBarStrategy(BarStrategyBase):
     def __init__(self, config: Dict, strategy_name: str = 'example_strategy'):
         super().__init__(config, strategy_name)
 
-    def _get_historical_price_data(self) -> None:
-        raise NotImplementedError('Loading of historical price data is not supported yet.')
-
     def _calculate_target_position(self, price_dfs: Dict[str, pd.DataFrame]) -> pd.Series:
         # Naive long-only strategy: Go long if close > open of current bar (independent of bar freq / timeframe)
         target_positions = {}
@@ -20,4 +19,14 @@ class ExampleBarStrategy(BarStrategyBase):
         if normalizer == 0:
             return pd.Series(target_positions)
         else:
-            return pd.Series({k: v / normalizer for k, v in target_positions.items()})
\ No newline at end of file
+            return pd.Series({k: v / normalizer for k, v in target_positions.items()})
+
+    def _calculate_target_position_from_panel(self, timestamps: np.ndarray, prices: np.ndarray) -> pd.Series:
+        # Same strategy on the price panel, computed for all instruments at once
+        last_bars = prices[-1]
+        target_positions = (last_bars[:, PRICE_COLUMNS.index('close')] > last_bars[:, PRICE_COLUMNS.index('open')]).astype(float)
+
+        normalizer = target_positions.sum()
+        if normalizer > 0:
+            target_positions /= normalizer
+        return pd.Series(target_positions, index=self._price_panel.instrument_names)
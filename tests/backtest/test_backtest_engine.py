@@ -0,0 +1,125 @@
+import json
+import asyncio
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import Mock
+from typing import Dict, List
+
+from backtest.backtest_engine import BacktestEngine, merge_trade_frames
+from backtest.simulated_execution import SimulatedExecutionEngine
+from clients.connection_manager import connection_manager
+from clients.ftx.ftx_websocket import FTXWebsocketClient
+from core.const import FTX_TICKER_TO_INSTRUMENTS
+from portfolio.portfolio import Portfolio
+from strategy.strategy_implementations.example_strategy import ExampleBarStrategy
+
+START = 1626900540.0
+
+
+def get_trades_frame(market: str, trade_id: int, timestamp: float, prices: List[float]) -> str:
+    # Trades message with one trade per price, 10 ms apart
+    trades = [
+        {
+            'id': trade_id + idx,
+            'price': price,
+            'size': 0.1,
+            'side': 'buy',
+            'liquidation': False,
+            'time': datetime.fromtimestamp(timestamp + idx / 100, timezone.utc).isoformat()
+        }
+        for idx, price in enumerate(prices)
+    ]
+    return json.dumps({'channel': 'trades', 'market': market, 'type': 'update', 'data': trades})
+
+
+def get_config(execution_engine=SimulatedExecutionEngine) -> Dict:
+    return {
+        'exchange': {'api_client': Mock, 'websocket_client': FTXWebsocketClient, 'api_keys': {'key': 'backtest'}},
+        'instruments': [FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']],
+        'strategy_params': {'bar_freq': '1m', 'bar_updates': 'close', 'price_df_min_window': 10},
+        'trading_volume': 1000.0,
+        'portfolio_manager': Portfolio,
+        'execution_engine': execution_engine,
+        'position_save_path': '',
+        'execution_save_path': None
+    }
+
+
+class TestBacktestEngine(unittest.TestCase):
+    """
+    Unittest to test the replay of trade frames through a strategy with simulated execution
+    """
+    def test_backtest(self):
+        # Rising bars in the first and third minute, a falling bar in the second minute
+        frames = [
+            get_trades_frame('BTC-PERP', 1, START, [100.0, 110.0]),
+            get_trades_frame('BTC-PERP', 3, START + 60, [100.0, 90.0]),
+            get_trades_frame('BTC-PERP', 5, START + 120, [125.0, 100.0, 200.0]),
+            get_trades_frame('BTC-PERP', 8, START + 180, [250.0]),
+            get_trades_frame('BTC-PERP', 9, START + 240, [400.0])
+        ]
+
+        async def run_test():
+            strategy = ExampleBarStrategy(get_config())
+            engine = BacktestEngine(strategy, frames)
+            stats = await engine.run()
+            positions = strategy._portfolio_manager.get_current_position()
+            await engine.close()
+            return stats, positions, engine
+
+        stats, positions, engine = asyncio.run(run_test())
+        execution_engine = engine.execution_engine
+
+        # The falling bar closed by the third frame sells nothing, the rising bar closed by the fourth frame buys
+        # trading_volume at its close, filled at the first trade of the fifth frame
+        fill, = execution_engine.fills
+        self.assertEqual((fill.side, fill.price, fill.size, fill.trade_id), ('buy', 400.0, 5.0, 9))
+        self.assertEqual(positions['btc_usd_perp'], 5.0)
+        self.assertEqual(stats['frames'], 5)
+        self.assertEqual(stats['trades'], 9)
+        self.assertEqual(stats['fills'], 1)
+        self.assertEqual(stats['equity'], 0.0)
+        self.assertGreater(stats['events_per_sec'], 0)
+        self.assertEqual(connection_manager.get_ref_count(engine.websocket_client), 0)
+
+    def test_fees_and_slippage(self):
+        execution_engine = SimulatedExecutionEngine(fee_rate=0.001, slippage_bps=10)
+        instrument = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+        exec_callback = Mock()
+
+        async def run_test():
+            await execution_engine.execute_trade(instrument, -2.0, exec_callback)
+
+        asyncio.run(run_test())
+        client = FTXWebsocketClient({})
+        client._subscribe_consumer('trades.BTC-PERP', execution_engine)
+        client._on_message(json.loads(get_trades_frame('BTC-PERP', 1, START, [100.0, 120.0])))
+
+        # Sold at the first trade after the order, 10 basis points below its price
+        fill, = execution_engine.fills
+        self.assertEqual((fill.side, fill.size), ('sell', 2.0))
+        self.assertAlmostEqual(fill.price, 99.9)
+        self.assertAlmostEqual(fill.fee, 0.1998)
+        self.assertEqual(exec_callback.call_args[0][0].data.size, -2.0)
+        self.assertEqual(execution_engine.active_trades, {})
+        self.assertAlmostEqual(execution_engine.get_equity({instrument.name: -2.0}), 199.8 - 0.1998 - 240.0)
+
+    def test_sharded_client(self):
+        # Frames cannot be attributed to the shards of a sharded websocket client
+        config = get_config()
+        config['exchange']['api_keys'] = {'key': 'backtest_sharded'}
+        config['exchange']['websocket_params'] = {'num_shards': 2}
+
+        async def run_test():
+            strategy = ExampleBarStrategy(config)
+            try:
+                with self.assertRaises(ValueError):
+                    BacktestEngine(strategy, [])
+            finally:
+                await strategy.close()
+
+        asyncio.run(run_test())
+
+    def test_merge_trade_frames(self):
+        cached_frames = [[(1.0, 'a'), (3.0, 'c')], [(2.0, 'b'), (4.0, 'd')]]
+        self.assertEqual(list(merge_trade_frames(*cached_frames)), ['a', 'b', 'c', 'd'])
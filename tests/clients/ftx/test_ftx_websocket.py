@@ -1,12 +1,22 @@
+import json
+import zlib
+import asyncio
+import tempfile
 import unittest
+from unittest.mock import AsyncMock, Mock, patch
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
 
 import numpy as np
 from core.const import FTX_TICKER_TO_INSTRUMENTS
 from core.order_type import OrderType
 from core.order_status import OrderStatus
 from core.order_side import OrderSide
-from core.events import FillEvent, TickEvent, OrderUpdateEvent, QuoteEvent
+from core.events import FillEvent, TickEvent, TickBatchEvent, OrderUpdateEvent, QuoteEvent, BookEvent
+from core.tick_batch import TickBatch, BUY, SELL
+from clients.ftx.ftx_api_wrapper import FTXClientWrapper
 from clients.ftx.ftx_websocket import FTXWebsocketClient
+from utils.timestamp_parser import parse_timestamp
 
 TRADES_MSG = {
     'channel': 'trades',
@@ -92,6 +102,64 @@ ORDERS_MSG = {
     }
 }
 
+ORDERBOOK_PARTIAL_MSG = {
+    'channel': 'orderbook',
+    'market': 'BTC-PERP',
+    'type': 'partial',
+    'data': {
+        'time': 1626900552.9121816,
+        'checksum': 0,
+        'bids': [[31708.0, 18.0695], [31707.0, 0.5], [31706.0, 1e-08]],
+        'asks': [[31709.0, 1.7919], [31710.0, 2.0]],
+        'action': 'partial'
+    }
+}
+
+ORDERBOOK_UPDATE_MSG = {
+    'channel': 'orderbook',
+    'market': 'BTC-PERP',
+    'type': 'update',
+    'data': {
+        'time': 1626900553.0121816,
+        'checksum': 0,
+        'bids': [[31708.0, 0.0], [31707.5, 3.0]],
+        'asks': [[31709.5, 1.0]],
+        'action': 'update'
+    }
+}
+
+
+def get_orderbook_checksum(bids, asks):
+    # Reference implementation following the exchange documentation
+    checksum_values = []
+    for idx in range(max(len(bids), len(asks))):
+        if idx < len(bids):
+            checksum_values.extend(bids[idx])
+        if idx < len(asks):
+            checksum_values.extend(asks[idx])
+    return zlib.crc32(':'.join(str(float(value)) for value in checksum_values).encode())
+
+
+def with_checksum(msg: Dict, checksum: int) -> Dict:
+    return {**msg, 'data': {**msg['data'], 'checksum': checksum}}
+
+
+def get_stub_api_client(trades: List[Dict]) -> FTXClientWrapper:
+    # REST API client whose HTTP session answers requests of the trades endpoint like the exchange, i.e. with the
+    # latest trades (at most limit) of the requested interval in descending order of time
+    def send(request):
+        params = {key: float(value[0]) for key, value in parse_qs(urlparse(request.url).query).items()}
+        result = [
+            trade for trade in trades
+            if params.get('start_time', 0.0) <= parse_timestamp(trade['time']) <= params.get('end_time', float('inf'))
+        ]
+        result = sorted(result, key=lambda trade: parse_timestamp(trade['time']), reverse=True)
+        return Mock(json=Mock(return_value={'success': True, 'result': result[:int(params['limit'])]}))
+
+    api_client = FTXClientWrapper({'key': 'key', 'secret': 'secret'})
+    api_client._session = Mock(send=Mock(side_effect=send))
+    return api_client
+
 
 class TestFTXWebsocketClient(unittest.TestCase):
     """
@@ -101,7 +169,7 @@ class TestFTXWebsocketClient(unittest.TestCase):
         self.client = FTXWebsocketClient({})
 
     def test_parse_orders_msg(self):
-        (sub_key, order_update_event), = self.client._handle_feed_message(ORDERS_MSG)
+        (sub_key, order_update_event), = self.client._handle_message(ORDERS_MSG)
 
         self.assertTrue(isinstance(order_update_event, OrderUpdateEvent))
         self.assertEqual(sub_key, 'orders')
@@ -123,7 +191,7 @@ class TestFTXWebsocketClient(unittest.TestCase):
         self.assertTrue(np.isclose(order_update_event.data.ask_size, np.nan, equal_nan=True))
 
     def test_parse_fills_msg(self):
-        (sub_key, fills_event), = self.client._handle_feed_message(FILLS_MSG)
+        (sub_key, fills_event), = self.client._handle_message(FILLS_MSG)
 
         self.assertTrue(isinstance(fills_event, FillEvent))
         self.assertEqual(sub_key, 'fills')
@@ -140,7 +208,7 @@ class TestFTXWebsocketClient(unittest.TestCase):
         self.assertEqual(fills_event.data.fee, 0.00443786)
 
     def test_parse_trades_msg(self):
-        (sub_key, tick_event), _ = self.client._handle_feed_message(TRADES_MSG)
+        (sub_key, tick_event), _ = self.client._handle_message(TRADES_MSG)
 
         self.assertTrue(isinstance(tick_event, TickEvent))
         self.assertEqual(sub_key, 'trades.BTC-PERP')
@@ -153,7 +221,7 @@ class TestFTXWebsocketClient(unittest.TestCase):
         self.assertEqual(tick_event.data.liquidation, False)
 
     def test_parse_ticker_msg(self):
-        (sub_key, quote_event), = self.client._handle_feed_message(TICKER_MSG)
+        (sub_key, quote_event), = self.client._handle_message(TICKER_MSG)
 
         self.assertTrue(isinstance(quote_event, QuoteEvent))
         self.assertEqual(sub_key, 'ticker.BTC-PERP')
@@ -165,10 +233,29 @@ class TestFTXWebsocketClient(unittest.TestCase):
         self.assertEqual(quote_event.data.ask_size, 1.7919)
         self.assertEqual(quote_event.data.last, 31708.0)
 
+    def test_route_control_msg(self):
+        self.assertFalse(self.client._handle_message({'type': 'subscribed', 'channel': 'trades', 'market': 'BTC-PERP'}))
+        self.assertFalse(self.client._handle_message({'type': 'pong'}))
+        self.assertEqual(self.client._handle_message({'type': 'update', 'channel': 'unknown'}), [])
+
+    def test_peek_subscription_key(self):
+        self.assertEqual(self.client._peek_subscription_key(json.dumps(TRADES_MSG)), 'trades.BTC-PERP')
+        self.assertEqual(self.client._peek_subscription_key(json.dumps(TICKER_MSG)), 'ticker.BTC-PERP')
+        self.assertIsNone(self.client._peek_subscription_key(json.dumps(FILLS_MSG)))
+        self.assertIsNone(self.client._peek_subscription_key(json.dumps({'type': 'subscribed', 'channel': 'trades', 'market': 'BTC-PERP'})))
+
+    def test_skip_inactive_frames(self):
+        client = FTXWebsocketClient({}, skip_inactive_frames=True)
+        self.assertIsNone(client._decode_frame(json.dumps(TRADES_MSG)))
+        self.assertEqual(client._decode_frame(json.dumps(FILLS_MSG)), FILLS_MSG)
+
+        client._feed_subscriptions.add('trades.BTC-PERP')
+        self.assertEqual(client._decode_frame(json.dumps(TRADES_MSG)), TRADES_MSG)
+
     def test_bar_roll(self):
         # Manually initialize bar variable and subscription for test
         self.client._initialize_bar_variables(FTX_TICKER_TO_INSTRUMENTS['BTC-PERP'], '1m')
-        event_list = self.client._handle_feed_message(TRADES_MSG)
+        event_list = self.client._handle_message(TRADES_MSG)
 
         # We expect 4 update events: two TickEvents (trades) and two BarEvents (updates of minute bar)
         self.assertEqual(len(event_list), 4)
@@ -178,4 +265,273 @@ class TestFTXWebsocketClient(unittest.TestCase):
         self.assertEqual(bar_event_1.data.timestamp, 1626900540)
         self.assertEqual(bar_event_2.data.timestamp, 1626900600)
 
+    def test_compact_tick_events(self):
+        client = FTXWebsocketClient({}, compact_tick_events=True)
+        client._initialize_bar_variables(FTX_TICKER_TO_INSTRUMENTS['BTC-PERP'], '1m')
+        event_list = client._handle_message(TRADES_MSG)
+
+        # Tick events are their own ticks and are aggregated into bars like ticks
+        (_, tick_event), _, (_, bar_event), _ = event_list
+        self.assertIsInstance(tick_event, TickEvent)
+        self.assertIs(tick_event.data, tick_event)
+        self.assertEqual((tick_event.price, tick_event.side, tick_event.publisher_id), (31708.0, 'sell', client.websocket_id))
+        self.assertEqual(bar_event.data.close, 31708.0)
+
+    def test_tick_batches(self):
+        async def run_test():
+            self.client.ws = AsyncMock()
+            instrument = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+            batch_consumer, tick_consumer = Mock(), Mock()
+            await self.client.subscribe_tick_batches(instrument, batch_consumer)
+            self.assertIn('trades.BTC-PERP', self.client._feed_subscriptions)
+
+            # Without trade or bar consumers, trades are parsed into a tick batch without creating ticks
+            with patch.object(self.client, '_tick_cls') as tick_cls:
+                (sub_key, batch_event), = self.client._handle_message(TRADES_MSG)
+                tick_cls.from_ftx_msg.assert_not_called()
+            self.assertIsInstance(batch_event, TickBatchEvent)
+            self.assertEqual(sub_key, 'tick_batch.BTC-PERP')
+            tick_batch = batch_event.data
+            np.testing.assert_array_equal(tick_batch.timestamps, [1626900552.908392, 1626900612.908392])
+            np.testing.assert_array_equal(tick_batch.prices, [31708.0, 31710.0])
+            np.testing.assert_array_equal(tick_batch.sides, [SELL, BUY])
+            self.assertEqual(tick_batch.trade_ids, [1468501329, 1468501569])
+            self.assertEqual(self.client._handle_message(TRADES_MSG), [])
+
+            # Alongside trade consumers, tick batches are built from the parsed ticks
+            await self.client.subscribe_trades(instrument, tick_consumer)
+            trade = {**TRADES_MSG['data'][1], 'id': 1468501570, 'price': 31711.0}
+            (_, tick_event), (_, batch_event) = self.client._handle_message({**TRADES_MSG, 'data': [trade]})
+            expected = TickBatch.from_ticks(instrument, [tick_event.data])
+            np.testing.assert_array_equal(batch_event.data.prices, expected.prices)
+            self.assertEqual(batch_event.data.trade_ids, [1468501570])
+
+            # The trades feed is kept as long as tick batches are subscribed
+            await self.client.unsubscribe_trades(instrument, tick_consumer)
+            self.assertIn('trades.BTC-PERP', self.client._feed_subscriptions)
+            await self.client.unsubscribe_tick_batches(instrument, batch_consumer)
+            self.assertNotIn('trades.BTC-PERP', self.client._feed_subscriptions)
+
+        asyncio.run(run_test())
+
+    async def _subscribe_shared_bars(self):
+        self.client.ws = AsyncMock()
+        instrument = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+        consumer_1, consumer_2 = Mock(), Mock()
+
+        await self.client.subscribe_bars(instrument, '1m', consumer_1)
+        await self.client.subscribe_bars(instrument, '1m', consumer_2, updates='close')
+        self.assertEqual(self.client.ws.send.await_count, 1)
+
+        # Every trades message is parsed once and fanned out to both consumers; bars are updated at the most frequent
+        # policy of their consumers, while the consumer of completed bars only receives the completed bar
+        self.client._on_message(TRADES_MSG)
+        self.assertEqual(consumer_1.handle_event.call_count, 2)
+        consumer_2.handle_event.assert_called_once()
+        self.assertTrue(consumer_2.handle_event.call_args[0][0].data.is_closed)
+
+        await self.client.unsubscribe_bars(instrument, '1m', consumer_1)
+        self.assertIn('trades.BTC-PERP', self.client._feed_subscriptions)
+        self.assertIsNone(self.client._bar_aggregator._bars['BTC-PERP']['1m'].update_interval)
+
+        await self.client.unsubscribe_bars(instrument, '1m', consumer_2)
+        self.assertNotIn('trades.BTC-PERP', self.client._feed_subscriptions)
+        self.assertEqual(len(self.client._bar_aggregator), 0)
+        self.assertEqual(self.client.ws.send.await_count, 2)
+
+    def test_shared_bar_subscription(self):
+        asyncio.run(self._subscribe_shared_bars())
+
+    def test_bar_update_filter(self):
+        async def run_test():
+            self.client.ws = AsyncMock()
+            instrument = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+            consumer_all, consumer_throttled = Mock(), Mock()
+            await self.client.subscribe_bars(instrument, '1m', consumer_all)
+            await self.client.subscribe_bars(instrument, '1m', consumer_throttled, updates=5000)
+
+            # Updates of the shared bar reach the throttled consumer at most every 5 seconds of trade time, completed
+            # bars and the first update of the next bar always
+            for idx, time_str in enumerate(['20:49:00', '20:49:02', '20:49:06', '20:50:01']):
+                trade = {**TRADES_MSG['data'][0], 'id': idx, 'time': f'2021-07-21T{time_str}+00:00'}
+                self.client._on_message({**TRADES_MSG, 'data': [trade]})
+
+            self.assertEqual(consumer_all.handle_event.call_count, 5)
+            events = [call[0][0] for call in consumer_throttled.handle_event.call_args_list]
+            self.assertEqual([event.data.is_closed for event in events], [False, False, True, False])
+            self.assertEqual([event.updated_at for event in events], [1626900540.0, 1626900546.0, None, 1626900601.0])
+
+        asyncio.run(run_test())
+
+    def test_close_bars_by_time(self):
+        async def run_test():
+            client = FTXWebsocketClient({}, bar_close_delay=0.5)
+            consumer = Mock()
+            client._consumer_subscriptions['bar.BTC-PERP.1m'].append(consumer)
+            client._initialize_bar_variables(FTX_TICKER_TO_INSTRUMENTS['BTC-PERP'], '1m')
+            client._on_message(TRADES_MSG)
+            consumer.reset_mock()
+
+            # Bar of the last trade is closed half a second after the end of its minute without any further trade
+            with patch('clients.websocket_base.time.time', return_value=1626900661.0):
+                timer_task = asyncio.create_task(client._close_bars_by_time())
+                await asyncio.sleep(0.01)
+                timer_task.cancel()
+
+            consumer.handle_event.assert_called_once()
+            bar = consumer.handle_event.call_args[0][0].data
+            self.assertEqual((bar.timestamp, bar.close), (1626900600, 31710.0))
+            self.assertTrue(bar.is_closed)
+
+            # A trade of the closed minute arriving afterwards is dropped and counted
+            late_trade = {**TRADES_MSG['data'][1], 'id': 1468501600, 'time': '2021-07-21T20:50:59.5+00:00'}
+            client._on_message({**TRADES_MSG, 'data': [late_trade]})
+            self.assertEqual(client.get_ingestion_stats()['late_ticks'], 1)
+
+        asyncio.run(run_test())
+
+    def test_close_unconnected(self):
+        # Clients that never connected (e.g. due to a failed connection attempt) close without error
+        asyncio.run(self.client.close())
+        self.assertIsNone(self.client.ws)
+        self.assertFalse(self.client.is_running)
+
+    def test_orderbook_msg(self):
+        async def run_test():
+            self.client.ws = AsyncMock()
+            instrument = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+            await self.client.subscribe_book(instrument)
+
+            partial_msg = with_checksum(ORDERBOOK_PARTIAL_MSG, get_orderbook_checksum(ORDERBOOK_PARTIAL_MSG['data']['bids'], ORDERBOOK_PARTIAL_MSG['data']['asks']))
+            (sub_key, book_event), = self.client._handle_message(partial_msg)
+            self.assertTrue(isinstance(book_event, BookEvent))
+            self.assertEqual(sub_key, 'orderbook.BTC-PERP')
+            self.assertEqual(book_event.data.bids[-1], (31706.0, 1e-08))
+
+            checksum = get_orderbook_checksum([[31707.5, 3.0], [31707.0, 0.5], [31706.0, 1e-08]], [[31709.0, 1.7919], [31709.5, 1.0], [31710.0, 2.0]])
+            (_, book_event), = self.client._handle_message(with_checksum(ORDERBOOK_UPDATE_MSG, checksum))
+            self.assertEqual(book_event.data.timestamp, 1626900553.0121816)
+            book = self.client.get_order_book(instrument)
+            self.assertEqual(book.best_bid(), (31707.5, 3.0))
+            self.assertEqual(book.best_ask(), (31709.0, 1.7919))
+
+            # Books are invalidated and resubscribed on checksum mismatches
+            self.assertEqual(self.client._handle_message(ORDERBOOK_UPDATE_MSG), [])
+            self.assertIsNone(self.client.get_order_book(instrument))
+            await asyncio.sleep(0)
+            self.assertEqual([json.loads(call[0][0])['op'] for call in self.client.ws.send.call_args_list[-2:]], ['unsubscribe', 'subscribe'])
+
+        asyncio.run(run_test())
+
+    def test_duplicate_trades(self):
+        self.assertEqual(len(self.client._handle_message(TRADES_MSG)), 2)
+        self.assertEqual(self.client._handle_message(TRADES_MSG), [])
+
+        # Trades at the timestamp of the last seen trade are told apart by their id
+        trade = {**TRADES_MSG['data'][1], 'id': 1468501570}
+        (_, tick_event), = self.client._handle_message({**TRADES_MSG, 'data': [TRADES_MSG['data'][1], trade]})
+        self.assertEqual(tick_event.data.trade_id, 1468501570)
+
+    def test_reconnect_backfill(self):
+        async def run_test():
+            client = FTXWebsocketClient({}, reconnect_interval=0.001)
+            client.ws = AsyncMock()
+            await client.subscribe_trades(FTX_TICKER_TO_INSTRUMENTS['BTC-PERP'])
+            client._handle_message(TRADES_MSG)
+
+            missed_trade = {**TRADES_MSG['data'][1], 'id': 1468501600, 'time': '2021-07-21T20:51:12.908392+00:00'}
+            api_client = get_stub_api_client(TRADES_MSG['data'] + [missed_trade])
+            client.set_api_client(api_client)
+
+            new_ws = AsyncMock()
+            with patch('clients.ftx.ftx_websocket.websockets.connect', AsyncMock(side_effect=[None, new_ws])):
+                await client._reconnect()
+
+            self.assertIs(client.ws, new_ws)
+            self.assertEqual(json.loads(new_ws.send.call_args[0][0]), {'op': 'subscribe', 'channel': 'trades', 'market': 'BTC-PERP'})
+            first_request = api_client._session.send.call_args_list[0][0][0]
+            self.assertEqual(parse_qs(urlparse(first_request.url).query)['start_time'], ['1626900612.908392'])
+
+            # Backfilled trades are queued before live frames and replayed without duplicates
+            (_, tick_event), = client._handle_message(client._decode_frame(await client._frame_queue.get()))
+            self.assertEqual(tick_event.data.trade_id, 1468501600)
+
+        asyncio.run(run_test())
+
+    def test_warm_up_trades_from_api(self):
+        # Warm-up through the REST API client itself, whose HTTP session is stubbed
+        async def run_test():
+            instrument = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+            client = FTXWebsocketClient({})
+            client.set_api_client(get_stub_api_client(TRADES_MSG['data']))
+            with patch('clients.ftx.ftx_api.time.time', return_value=1626900660.0):
+                return await client.warm_up_trades([instrument], '1m', 1626900540.0)
+
+        closed_bar, current_bar = [bar_event.data for bar_event in asyncio.run(run_test())]
+        self.assertEqual((closed_bar.timestamp, closed_bar.close, closed_bar.volume, closed_bar.is_closed), (1626900540, 31708.0, 0.0786, True))
+        self.assertEqual((current_bar.timestamp, current_bar.close, current_bar.is_closed), (1626900600, 31710.0, False))
+
+    def test_get_all_trades(self):
+        # Trades of intervals exceeding the page limit are paged backwards, windows are paged forward
+        trades = [
+            {**TRADES_MSG['data'][0], 'id': idx, 'time': f'2021-07-21T20:{idx // 60:02d}:{idx % 60:02d}+00:00'}
+            for idx in range(600)
+        ]
+        api_client = get_stub_api_client(trades)
+        start_time = parse_timestamp(trades[0]['time'])
+        with patch('clients.ftx.ftx_api.TRADES_PAGE_LIMIT', 7):
+            fetched_trades = api_client.get_all_trades('BTC-PERP', start_time, start_time + 599)
+        self.assertEqual([trade['id'] for trade in fetched_trades], list(range(600)))
+
+    def test_warm_up_trades(self):
+        async def run_test():
+            instrument = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+            with tempfile.TemporaryDirectory() as cache_dir:
+                for fetched_trades, expected_start in [(TRADES_MSG['data'], 1626900540.0), ([], 1626900612.908392)]:
+                    client = FTXWebsocketClient({})
+                    client.set_api_client(Mock(get_all_trades=Mock(return_value=fetched_trades)))
+                    bar_events = await client.warm_up_trades([instrument], '1m', 1626900540.0, cache_dir=cache_dir)
+                    self.assertEqual(client._api_client.get_all_trades.call_args[1]['start_time'], expected_start)
+
+                    # The second warm-up replays the cached trades and only fetches trades after them
+                    bars = [bar_event.data for bar_event in bar_events]
+                    self.assertEqual(
+                        [(bar.timestamp, bar.close, bar.volume, bar.is_closed) for bar in bars],
+                        [(1626900540, 31708.0, 0.0786, True), (1626900600, 31710.0, 0.0536, False)]
+                    )
+
+                # Trades of cached frames before the start of the warm-up are dropped
+                client = FTXWebsocketClient({})
+                client.set_api_client(Mock(get_all_trades=Mock(return_value=[])))
+                bar_events = await client.warm_up_trades([instrument], '1m', 1626900600.0, cache_dir=cache_dir)
+                self.assertEqual([(event.data.timestamp, event.data.volume) for event in bar_events], [(1626900600, 0.0536)])
+
+        asyncio.run(run_test())
+
+    def test_warm_up_shared_client(self):
+        # A consumer warming up on a client shared with a live consumer of the same bars
+        async def run_test():
+            instrument = FTX_TICKER_TO_INSTRUMENTS['BTC-PERP']
+            client = FTXWebsocketClient({})
+            client.ws = AsyncMock()
+            client.set_api_client(Mock(get_all_trades=Mock(return_value=TRADES_MSG['data'])))
+            live_consumer, warm_up_consumer = Mock(), Mock()
+            await client.subscribe_bars(instrument, '1m', live_consumer)
+            live_trade = {**TRADES_MSG['data'][1], 'id': 1468501600, 'time': '2021-07-21T20:51:12.908392+00:00'}
+            client._on_message({**TRADES_MSG, 'data': [live_trade]})
+            live_consumer.reset_mock()
+
+            await client.subscribe_bars(instrument, '1m', warm_up_consumer)
+            bar_events = await client.warm_up_trades([instrument], '1m', 1626900540.0)
+            return client, live_consumer, warm_up_consumer, bar_events
+
+        client, live_consumer, warm_up_consumer, bar_events = asyncio.run(run_test())
 
+        # Trades older than the last live trade warm up the new consumer only; live bars, deduplication and dispatching
+        # are not affected
+        bars = [bar_event.data for bar_event in bar_events]
+        self.assertEqual([(bar.timestamp, bar.is_closed) for bar in bars], [(1626900540, True), (1626900600, False)])
+        live_consumer.handle_event.assert_not_called()
+        warm_up_consumer.handle_event.assert_not_called()
+        self.assertEqual(client._last_trades['BTC-PERP'][0], 1626900672.908392)
+        self.assertTrue(client._dispatch_resumed.is_set())
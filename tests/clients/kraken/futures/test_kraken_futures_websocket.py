@@ -1,11 +1,14 @@
+import json
+import asyncio
 import unittest
+from unittest.mock import AsyncMock
 
 import numpy as np
 from core.const import KRAKEN_TICKER_TO_INSTRUMENTS
 from core.order_type import OrderType
 from core.order_status import OrderStatus
 from core.order_side import OrderSide
-from core.events import FillEvent, TickEvent, OrderUpdateEvent, QuoteEvent
+from core.events import FillEvent, TickEvent, OrderUpdateEvent, QuoteEvent, BookEvent
 from clients.kraken.futures.kraken_futures_ws import KrakenFuturesWSClient
 
 TRADES_MSG = {
@@ -88,6 +91,26 @@ ORDERS_MSG = {
     'reason': 'new_placed_order_by_user'
 }
 
+BOOK_SNAPSHOT_MSG = {
+    'feed': 'book_snapshot',
+    'product_id': 'PI_XBTUSD',
+    'timestamp': 1612269825817,
+    'seq': 326072249,
+    'tickSize': None,
+    'bids': [{'price': 34892.5, 'qty': 6385}, {'price': 34892.0, 'qty': 10924}],
+    'asks': [{'price': 34911.5, 'qty': 20598}, {'price': 34912.0, 'qty': 2300}]
+}
+
+BOOK_MSG = {
+    'feed': 'book',
+    'product_id': 'PI_XBTUSD',
+    'side': 'sell',
+    'seq': 326094134,
+    'price': 34981.0,
+    'qty': 0,
+    'timestamp': 1612269953629
+}
+
 
 class TestKrakenFuturesWSClient(unittest.TestCase):
     """
@@ -97,7 +120,7 @@ class TestKrakenFuturesWSClient(unittest.TestCase):
         self.client = KrakenFuturesWSClient({})
 
     def test_parse_orders_msg(self):
-        (sub_key, order_update_event), = self.client._handle_feed_message(ORDERS_MSG)
+        (sub_key, order_update_event), = self.client._handle_message(ORDERS_MSG)
 
         self.assertTrue(isinstance(order_update_event, OrderUpdateEvent))
         self.assertEqual(sub_key, 'open_orders')
@@ -119,7 +142,7 @@ class TestKrakenFuturesWSClient(unittest.TestCase):
         self.assertTrue(np.isclose(order_update_event.data.ask_size, np.nan, equal_nan=True))
 
     def test_parse_fills_msg(self):
-        (sub_key, fills_event), = self.client._handle_feed_message(FILLS_MSG)
+        (sub_key, fills_event), = self.client._handle_message(FILLS_MSG)
 
         self.assertTrue(isinstance(fills_event, FillEvent))
         self.assertEqual(sub_key, 'fills')
@@ -135,7 +158,7 @@ class TestKrakenFuturesWSClient(unittest.TestCase):
         self.assertEqual(fills_event.data.fee, 0.00685588921)
 
     def test_parse_trades_msg(self):
-        (sub_key, tick_event), = self.client._handle_feed_message(TRADES_MSG)
+        (sub_key, tick_event), = self.client._handle_message(TRADES_MSG)
 
         self.assertTrue(isinstance(tick_event, TickEvent))
         self.assertEqual(sub_key, 'trade.PI_XBTUSD')
@@ -148,7 +171,7 @@ class TestKrakenFuturesWSClient(unittest.TestCase):
         self.assertEqual(tick_event.data.liquidation, False)
 
     def test_parse_ticker_msg(self):
-        (sub_key, quote_event), = self.client._handle_feed_message(TICKER_MSG)
+        (sub_key, quote_event), = self.client._handle_message(TICKER_MSG)
 
         self.assertTrue(isinstance(quote_event, QuoteEvent))
         self.assertEqual(sub_key, 'ticker.PI_XBTUSD')
@@ -160,4 +183,32 @@ class TestKrakenFuturesWSClient(unittest.TestCase):
         self.assertEqual(quote_event.data.ask_size, 2300)
         self.assertEqual(quote_event.data.last, 34852)
 
-
+    def test_peek_subscription_key(self):
+        self.assertEqual(self.client._peek_subscription_key(json.dumps(TRADES_MSG)), 'trade.PI_XBTUSD')
+        self.assertEqual(self.client._peek_subscription_key(json.dumps(TICKER_MSG)), 'ticker.PI_XBTUSD')
+        self.assertEqual(self.client._peek_subscription_key(json.dumps({**TRADES_MSG, 'feed': 'trade_snapshot'})), 'trade.PI_XBTUSD')
+        self.assertIsNone(self.client._peek_subscription_key(json.dumps(FILLS_MSG)))
+
+    def test_book_msg(self):
+        async def run_test():
+            self.client = KrakenFuturesWSClient({'key': 'key', 'secret': 'secret'})
+            self.client.ws = AsyncMock()
+            instrument = KRAKEN_TICKER_TO_INSTRUMENTS['PI_XBTUSD']
+            await self.client.subscribe_book(instrument)
+
+            (sub_key, book_event), = self.client._handle_message(BOOK_SNAPSHOT_MSG)
+            self.assertTrue(isinstance(book_event, BookEvent))
+            self.assertEqual(sub_key, 'book.PI_XBTUSD')
+            self.assertEqual(book_event.data.bids, [(34892.5, 6385), (34892.0, 10924)])
+
+            (_, book_event), = self.client._handle_message({**BOOK_MSG, 'seq': 326072250, 'price': 34911.5, 'qty': 100})
+            self.assertEqual(book_event.data.asks[0], (34911.5, 100))
+            self.assertEqual(book_event.data.timestamp, 1612269953.629)
+
+            # Books are invalidated and resubscribed on sequence gaps
+            self.assertEqual(self.client._handle_message(BOOK_MSG), [])
+            self.assertIsNone(self.client.get_order_book(instrument))
+            await asyncio.sleep(0)
+            self.assertEqual([json.loads(call[0][0])['event'] for call in self.client.ws.send.call_args_list[-2:]], ['unsubscribe', 'subscribe'])
+
+        asyncio.run(run_test())
@@ -1,8 +1,13 @@
+import json
+import zlib
+import asyncio
 import unittest
+from unittest.mock import AsyncMock, Mock, patch
 
 import numpy as np
 from core.const import KRAKEN_TICKER_TO_INSTRUMENTS
-from core.events import TickEvent, QuoteEvent
+from core.events import TickEvent, QuoteEvent, BookEvent, BarEvent
+from core.tick_batch import TickBatch
 from clients.kraken.spot.kraken_spot_ws import KrakenSpotWSClient
 
 # Ticker / quotes are called spread on the kraken spot exchange
@@ -44,6 +49,41 @@ TRADE_MSG = [
     "XBT/USD"
 ]
 
+BOOK_SNAPSHOT_MSG = [
+    0,
+    {
+        "as": [
+            ["5541.30000", "2.50700000", "1534614248.123678"],
+            ["5541.80000", "0.33000000", "1534614098.345543"],
+            ["5542.70000", "0.64700000", "1534614244.654432"]
+        ],
+        "bs": [
+            ["5541.20000", "1.52900000", "1534614248.765567"],
+            ["5539.90000", "0.30000000", "1534614241.769870"],
+            ["5539.50000", "5.00000000", "1534613831.243486"]
+        ]
+    },
+    "book-10",
+    "XBT/USD"
+]
+
+
+def get_book_checksum(asks, bids):
+    # Reference implementation of the checksum on the price and volume strings of the exchange
+    return str(zlib.crc32(''.join(
+        price.replace('.', '').lstrip('0') + volume.replace('.', '').lstrip('0') for price, volume in asks + bids
+    ).encode()))
+
+
+def get_book_update_msg(checksum: str):
+    return [
+        0,
+        {"a": [["5541.30000", "0.00000000", "1534614335.345903"], ["5542.00000", "1.00000000", "1534614335.345903"]]},
+        {"b": [["5541.20000", "2.00000000", "1534614335.345904", "r"]], "c": checksum},
+        "book-10",
+        "XBT/USD"
+    ]
+
 
 class TestKrakenSpotWSClient(unittest.TestCase):
     """
@@ -53,7 +93,7 @@ class TestKrakenSpotWSClient(unittest.TestCase):
         self.client = KrakenSpotWSClient({})
 
     def test_parse_trades_msg(self):
-        (sub_key, tick_event_1), (sub_key, tick_event_2) = self.client._handle_feed_message(TRADE_MSG)
+        (sub_key, tick_event_1), (sub_key, tick_event_2) = self.client._handle_message(TRADE_MSG)
 
         # Test correctness of first trade / tick event
         self.assertTrue(isinstance(tick_event_1, TickEvent))
@@ -78,7 +118,7 @@ class TestKrakenSpotWSClient(unittest.TestCase):
         self.assertEqual(tick_event_2.data.liquidation, None)
 
     def test_parse_ticker_msg(self):
-        (sub_key, quote_event), = self.client._handle_feed_message(TICKER_MSG)
+        (sub_key, quote_event), = self.client._handle_message(TICKER_MSG)
 
         self.assertTrue(isinstance(quote_event, QuoteEvent))
         self.assertEqual(sub_key, 'spread.XBT/USD')
@@ -89,3 +129,86 @@ class TestKrakenSpotWSClient(unittest.TestCase):
         self.assertEqual(quote_event.data.ask, 5700.00000)
         self.assertEqual(quote_event.data.ask_size, 0.98765432)
         self.assertTrue(np.isclose(quote_event.data.last, np.nan, equal_nan=True))
+
+    def test_peek_subscription_key(self):
+        self.assertEqual(self.client._peek_subscription_key(json.dumps(TRADE_MSG)), 'trade.XBT/USD')
+        self.assertEqual(self.client._peek_subscription_key(json.dumps(TICKER_MSG)), 'spread.XBT/USD')
+        self.assertIsNone(self.client._peek_subscription_key(json.dumps({'event': 'heartbeat'})))
+
+    def test_bar_msg(self):
+        self.client._initialize_bar_variables(KRAKEN_TICKER_TO_INSTRUMENTS['XBT/USD'], '1m')
+        event_list = self.client._handle_message(TRADE_MSG)
+
+        # Two tick events and one update of the minute bar
+        self.assertEqual(len(event_list), 3)
+        sub_key, bar_event = event_list[-1]
+        self.assertTrue(isinstance(bar_event, BarEvent))
+        self.assertEqual(sub_key, 'bar.XBT/USD.1m')
+        self.assertEqual(bar_event.data.timestamp, 1534614000)
+        self.assertEqual((bar_event.data.open, bar_event.data.high, bar_event.data.close), (5541.2, 6060.0, 6060.0))
+        self.assertEqual(bar_event.data.volume, 0.15850568 + 0.02455)
+
+    def test_tick_batch_msg(self):
+        instrument = KRAKEN_TICKER_TO_INSTRUMENTS['XBT/USD']
+        ticks = [tick_event.data for _, tick_event in KrakenSpotWSClient({})._handle_message(TRADE_MSG)]
+        expected = TickBatch.from_ticks(instrument, ticks)
+
+        self.client._consumer_subscriptions['tick_batch.XBT/USD'].append(object())
+        (sub_key, batch_event), = self.client._handle_message(TRADE_MSG)
+        self.assertEqual(sub_key, 'tick_batch.XBT/USD')
+        for column in ['timestamps', 'prices', 'sizes', 'sides', 'liquidations']:
+            np.testing.assert_array_equal(getattr(batch_event.data, column), getattr(expected, column))
+        self.assertIsNone(batch_event.data.trade_ids)
+
+        # Lacking trade ids, duplicates are told apart by price, size and side
+        self.assertEqual(self.client._handle_message(TRADE_MSG), [])
+        self.assertEqual(self.client._last_trades['XBT/USD'][1], {(6060.0, 0.02455, 'buy')})
+
+    def test_fetch_trade_frames(self):
+        # Pages of the Trades endpoint are followed by their cursor until an incomplete page
+        trades = [[f'{5541.2 + idx:.5f}', '0.10000000', f'{1534614057.3 + idx:.6f}', 'b', 'l', ''] for idx in range(5)]
+        pages = [
+            {'XXBTZUSD': trades[:2], 'last': '1534614058300000000'},
+            {'XXBTZUSD': trades[2:4], 'last': '1534614060300000000'},
+            {'XXBTZUSD': trades[4:], 'last': '1534614061300000000'}
+        ]
+        self.client.set_api_client(Mock(query_public=Mock(side_effect=[{'result': page} for page in pages])))
+        with patch('clients.kraken.spot.kraken_spot_ws.TRADES_PAGE_LIMIT', 2):
+            frames = self.client._fetch_trade_frames('XBT/USD', 1534614057.0)
+
+        cursors = [call[0][1]['since'] for call in self.client._api_client.query_public.call_args_list]
+        self.assertEqual(cursors, [1534614057000000000, 1534614058300000000, 1534614060300000000])
+        self.assertEqual([trade for frame in frames for trade in json.loads(frame)[1]], trades)
+
+    def test_book_msg(self):
+        async def run_test():
+            self.client.ws = AsyncMock()
+            instrument = KRAKEN_TICKER_TO_INSTRUMENTS['XBT/USD']
+            await self.client.subscribe_book(instrument, depth=10)
+            self.assertEqual(json.loads(self.client.ws.send.call_args[0][0])['subscription'], {'name': 'book', 'depth': 10})
+
+            (sub_key, book_event), = self.client._handle_message(BOOK_SNAPSHOT_MSG)
+            self.assertTrue(isinstance(book_event, BookEvent))
+            self.assertEqual(sub_key, 'book-10.XBT/USD')
+            self.assertEqual(book_event.data.bids[0], (5541.2, 1.529))
+            self.assertEqual(book_event.data.asks[-1], (5542.7, 0.647))
+
+            checksum = get_book_checksum(
+                [("5541.80000", "0.33000000"), ("5542.00000", "1.00000000"), ("5542.70000", "0.64700000")],
+                [("5541.20000", "2.00000000"), ("5539.90000", "0.30000000"), ("5539.50000", "5.00000000")]
+            )
+            (_, book_event), = self.client._handle_message(get_book_update_msg(checksum))
+            self.assertEqual(book_event.data.timestamp, 1534614335.345904)
+            self.assertEqual(book_event.data.asks[0], (5541.8, 0.33))
+            self.assertEqual(self.client.get_order_book(instrument).best_bid(), (5541.2, 2.0))
+
+            # Books are invalidated and resubscribed on checksum mismatches
+            self.assertEqual(self.client._handle_message(get_book_update_msg('123')), [])
+            self.assertIsNone(self.client.get_order_book(instrument))
+            await asyncio.sleep(0)
+            self.assertEqual([json.loads(call[0][0])['event'] for call in self.client.ws.send.call_args_list[-2:]], ['unsubscribe', 'subscribe'])
+
+            self.client._handle_message(BOOK_SNAPSHOT_MSG)
+            self.assertIsNotNone(self.client.get_order_book(instrument))
+
+        asyncio.run(run_test())
@@ -0,0 +1,232 @@
+import unittest
+
+import numpy as np
+
+from core.bar import BarSnapshot
+from core.tick import Tick
+from core.events import BarEvent
+from core.const import KRAKEN_NAME_TO_INSTRUMENTS
+from clients.bar_aggregator import BarAggregator, get_update_interval, get_most_permissive_interval
+
+
+class TestBarAggregator(unittest.TestCase):
+    """
+    Unittest to test implementation of exchange-agnostic bar aggregation
+    """
+    def setUp(self):
+        self.instrument = KRAKEN_NAME_TO_INSTRUMENTS['btc_usd']
+        self.aggregator = BarAggregator('test')
+        self.aggregator.add_bar(self.instrument, '1m', 'bar.XBT/USD.1m')
+        self.aggregator.add_bar(self.instrument, '15m', 'bar.XBT/USD.15m')
+
+    def _get_ticks(self, timestamps, prices, sides=None):
+        sides = sides or ['buy'] * len(timestamps)
+        return [Tick(ts, self.instrument, None, price, 1.0, side, None) for ts, price, side in zip(timestamps, prices, sides)]
+
+    def test_update(self):
+        ticks = self._get_ticks([1626900540.5, 1626900550.0, 1626900600.1], [100.0, 105.0, 95.0])
+        event_list = self.aggregator.update(self.instrument, ticks)
+
+        # Minute bar: one completed bar and one update; 15 minute bar: one update
+        self.assertEqual([sub_key for sub_key, _ in event_list], ['bar.XBT/USD.1m'] * 2 + ['bar.XBT/USD.15m'])
+        (_, completed_bar), (_, current_bar), (_, bar_15m) = event_list
+        self.assertTrue(isinstance(completed_bar, BarEvent))
+        self.assertEqual(completed_bar.data.timestamp, 1626900540)
+        self.assertEqual((completed_bar.data.open, completed_bar.data.high, completed_bar.data.close), (100.0, 105.0, 105.0))
+        self.assertEqual(completed_bar.data.volume, 2.0)
+        self.assertEqual(current_bar.data.timestamp, 1626900600)
+        self.assertEqual(bar_15m.data.low, 95.0)
+
+        # Published bars are immutable snapshots, which are not changed by subsequent updates
+        self.assertIsInstance(current_bar.data, BarSnapshot)
+        self.aggregator.update(self.instrument, self._get_ticks([1626900610.0], [90.0]))
+        self.assertEqual(current_bar.data.low, 95.0)
+        with self.assertRaises(AttributeError):
+            current_bar.data.low = 90.0
+
+    def _assert_equal_events(self, event_list, other_event_list):
+        self.assertEqual(len(event_list), len(other_event_list))
+        for (sub_key, event), (other_sub_key, other_event) in zip(event_list, other_event_list):
+            self.assertEqual((sub_key, event.data.timestamp, event.data.is_closed), (other_sub_key, other_event.data.timestamp, other_event.data.is_closed))
+            self.assertEqual(
+                (event.data.open, event.data.high, event.data.low, event.data.close),
+                (other_event.data.open, other_event.data.high, other_event.data.low, other_event.data.close)
+            )
+            self.assertAlmostEqual(event.data.volume, other_event.data.volume)
+
+    def test_roll_up(self):
+        # Rolled up bars have to be published like bars aggregated from ticks, also after removal of the finest bar
+        rng = np.random.default_rng(1)
+        timestamps = np.sort(1626900540 + rng.uniform(0, 3600, 2000))
+        ticks = self._get_ticks(timestamps.tolist(), (100 + rng.normal(size=2000)).tolist())
+
+        aggregators = [BarAggregator('test', batch_threshold=64), BarAggregator('test', batch_threshold=64, roll_up=True)]
+        for aggregator in aggregators:
+            for freq in ['1m', '5m', '15m', '90s']:
+                aggregator.add_bar(self.instrument, freq, f'bar.XBT/USD.{freq}')
+        rolled_up = aggregators[1]._bars[self.instrument.instrument_id]
+        self.assertEqual([rolled_up[freq].source for freq in ['1m', '90s']], [None, None])
+        self.assertIs(rolled_up['15m'].source, rolled_up['1m'])
+
+        event_lists = [[], []]
+        message_ends = [1, 4, 104, 109, 609, 610, 612, 2000]
+        for idx, (start, end) in enumerate(zip([0] + message_ends, message_ends)):
+            if idx == 6:
+                for aggregator in aggregators:
+                    aggregator.remove_bar(self.instrument, '1m')
+            for aggregator, event_list in zip(aggregators, event_lists):
+                event_list.extend(aggregator.update(self.instrument, ticks[start:end]))
+
+        self.assertIsNone(rolled_up['15m'].source)
+        self._assert_equal_events(*event_lists)
+
+    def test_roll_up_coarse_first(self):
+        # Sources do not depend on the order of subscription, also for finer bars subscribed while trading
+        rng = np.random.default_rng(2)
+        timestamps = np.sort(1626900540 + rng.uniform(0, 7200, 1000))
+        ticks = self._get_ticks(timestamps.tolist(), (100 + rng.normal(size=1000)).tolist())
+
+        aggregators = [BarAggregator('test'), BarAggregator('test', roll_up=True)]
+        event_lists = [[], []]
+        for aggregator, event_list in zip(aggregators, event_lists):
+            for freq in ['1h', '5m']:
+                aggregator.add_bar(self.instrument, freq, f'bar.XBT/USD.{freq}')
+            event_list.extend(aggregator.update(self.instrument, ticks[:300]))
+            aggregator.add_bar(self.instrument, '1m', 'bar.XBT/USD.1m')
+            event_list.extend(aggregator.update(self.instrument, ticks[300:]))
+
+        rolled_up = aggregators[1]._bars[self.instrument.instrument_id]
+        self.assertEqual(list(rolled_up), ['1m', '5m', '1h'])
+        self.assertIsNone(rolled_up['1m'].source)
+        self.assertIs(rolled_up['5m'].source, rolled_up['1m'])
+        self.assertIs(rolled_up['1h'].source, rolled_up['1m'])
+        self._assert_equal_events(*event_lists)
+
+    def test_roll_up_update(self):
+        # Updates of rolled-up bars include the finer bar in progress without merging it into the rolled-up bar
+        aggregator = BarAggregator('test', roll_up=True)
+        for freq in ['1m', '5m']:
+            aggregator.add_bar(self.instrument, freq, f'bar.XBT/USD.{freq}')
+        ticks = self._get_ticks([1626900600.5, 1626900610.0, 1626900660.1], [100.0, 105.0, 95.0])
+        event_list = aggregator.update(self.instrument, ticks)
+
+        bar_5m = event_list[-1][1].data
+        self.assertEqual(event_list[-1][0], 'bar.XBT/USD.5m')
+        self.assertEqual(
+            (bar_5m.timestamp, bar_5m.open, bar_5m.high, bar_5m.low, bar_5m.close, bar_5m.volume),
+            (1626900600, 100.0, 105.0, 95.0, 95.0, 3.0)
+        )
+        rolled_up_bar = aggregator._bars[self.instrument.instrument_id]['5m'].bar
+        self.assertEqual((rolled_up_bar.close, rolled_up_bar.volume), (105.0, 2.0))
+
+    def test_close_bars(self):
+        aggregator = BarAggregator('test', roll_up=True)
+        aggregator.add_bar(self.instrument, '1m', 'bar.XBT/USD.1m', update_interval=None)
+        aggregator.add_bar(self.instrument, '2m', 'bar.XBT/USD.2m', update_interval=None)
+        aggregator.update(self.instrument, self._get_ticks([1626900540.5, 1626900550.0], [100.0, 105.0]))
+        self.assertEqual(aggregator.get_next_close_time(), 1626900600)
+
+        # Bars are closed at the end of their intervals; the following quiet minute is carried forward
+        event_list = aggregator.close_bars(1626900600.5)
+        self.assertEqual(
+            [(sub_key, event.data.timestamp) for sub_key, event in event_list],
+            [('bar.XBT/USD.1m', 1626900540), ('bar.XBT/USD.2m', 1626900480)]
+        )
+        self.assertEqual(event_list[1][1].data.volume, 2.0)
+        event_list = aggregator.close_bars(1626900661.0)
+        self.assertEqual([(sub_key, event.data.timestamp) for sub_key, event in event_list], [('bar.XBT/USD.1m', 1626900600)])
+        carried_bar = event_list[0][1].data
+        self.assertEqual((carried_bar.open, carried_bar.low, carried_bar.close, carried_bar.volume), (105.0, 105.0, 105.0, 0))
+        self.assertTrue(carried_bar.is_closed)
+
+        # Late ticks of a closed interval are dropped instead of being aggregated into the next bar
+        self.assertEqual(aggregator.update(self.instrument, self._get_ticks([1626900650.0], [90.0])), [])
+        self.assertEqual(aggregator.late_ticks, 1)
+        event_list = aggregator.update(self.instrument, self._get_ticks([1626900725.0], [95.0]))
+        self.assertEqual(
+            [(sub_key, event.data.timestamp) for sub_key, event in event_list],
+            [('bar.XBT/USD.1m', 1626900660), ('bar.XBT/USD.2m', 1626900600)]
+        )
+        self.assertEqual((event_list[0][1].data.low, event_list[0][1].data.volume), (105.0, 0))
+        self.assertEqual((event_list[1][1].data.open, event_list[1][1].data.volume), (105.0, 0))
+        self.assertEqual(aggregator.close_bars(1626900721.0), [])
+
+        # Late ticks of the vectorized path are dropped alike
+        aggregator = BarAggregator('test', batch_threshold=2)
+        aggregator.add_bar(self.instrument, '1m', 'bar.XBT/USD.1m', update_interval=None)
+        aggregator.update(self.instrument, self._get_ticks([1626900540.5], [100.0]))
+        aggregator.close_bars(1626900600.5)
+        aggregator.update(self.instrument, self._get_ticks([1626900550.0, 1626900551.0, 1626900605.0], [90.0, 91.0, 110.0]))
+        event_list = aggregator.close_bars(1626900660.5)
+        self.assertEqual((event_list[0][1].data.open, event_list[0][1].data.volume), (110.0, 1.0))
+        self.assertEqual(aggregator.late_ticks, 2)
+
+    def test_update_policies(self):
+        aggregator = BarAggregator('test')
+        aggregator.add_bar(self.instrument, '1m', 'bar.XBT/USD.1m', update_interval=None)
+        aggregator.add_bar(self.instrument, '15m', 'bar.XBT/USD.15m', update_interval=get_update_interval(5000))
+
+        # Completed bars only for the minute bar; updates of the 15 minute bar at most every 5 seconds
+        event_list = []
+        for ts in [1626900540.5, 1626900542.0, 1626900546.0, 1626900600.1]:
+            event_list.extend(aggregator.update(self.instrument, self._get_ticks([ts], [100.0])))
+
+        self.assertEqual([sub_key for sub_key, _ in event_list], ['bar.XBT/USD.15m'] * 2 + ['bar.XBT/USD.1m', 'bar.XBT/USD.15m'])
+        (_, first_update), _, (_, completed_bar), _ = event_list
+        self.assertFalse(first_update.data.is_closed)
+        self.assertTrue(completed_bar.data.is_closed)
+        self.assertEqual(completed_bar.data.volume, 3.0)
+
+    def test_update_interval(self):
+        self.assertIsNone(get_update_interval('close'))
+        self.assertEqual(get_update_interval('all'), 0.0)
+        self.assertEqual(get_update_interval(250), 0.25)
+        self.assertRaises(ValueError, get_update_interval, 'never')
+        self.assertEqual(get_most_permissive_interval([None, 0.25, 1.0]), 0.25)
+        self.assertIsNone(get_most_permissive_interval([None]))
+
+    def test_information_bars(self):
+        aggregator = BarAggregator('test', batch_threshold=1)
+        aggregator.add_bar(self.instrument, 'tick:2', 'bar.XBT/USD.tick:2', update_interval=None)
+        aggregator.add_bar(self.instrument, 'dollar:250', 'bar.XBT/USD.dollar:250', update_interval=None)
+        aggregator.add_bar(self.instrument, 'imbalance:2', 'bar.XBT/USD.imbalance:2', update_interval=None)
+
+        ticks = self._get_ticks(
+            [1626900540.5, 1626900541.0, 1626900542.0, 1626900543.0, 1626900544.0],
+            [100.0, 105.0, 95.0, 110.0, 90.0],
+            ['buy', 'sell', 'buy', 'buy', 'buy']
+        )
+        event_list = aggregator.update(self.instrument, ticks)
+        bars = {}
+        for sub_key, event in event_list:
+            self.assertTrue(event.data.is_closed)
+            bars.setdefault(sub_key.split('.')[-1], []).append(event.data)
+
+        # Bars close with the trade reaching their threshold and are time-stamped with their first trade
+        self.assertEqual([(bar.timestamp, bar.open, bar.close) for bar in bars['tick:2']], [(1626900540.5, 100.0, 105.0), (1626900542.0, 95.0, 110.0)])
+        self.assertEqual([(bar.high, bar.low, bar.volume) for bar in bars['dollar:250']], [(105.0, 95.0, 3.0)])
+        self.assertEqual([(bar.timestamp, bar.volume) for bar in bars['imbalance:2']], [(1626900540.5, 4.0)])
+        self.assertRaises(ValueError, aggregator.add_bar, self.instrument, 'trades:10', 'bar.XBT/USD.trades:10')
+
+    def test_remove_bar(self):
+        self.assertIn(self.instrument.instrument_id, self.aggregator)
+        self.aggregator.remove_bar(self.instrument, '1m')
+        self.aggregator.remove_bar(self.instrument, '15m')
+        self.assertNotIn(self.instrument.instrument_id, self.aggregator)
+        self.assertEqual(self.aggregator.update(self.instrument, self._get_ticks([1626900540.5], [100.0])), [])
+
+    def test_batch_update(self):
+        # Batch path has to publish the same bars as the per-tick path, also for ticks out of order
+        rng = np.random.default_rng(0)
+        timestamps = np.sort(1626900540 + rng.uniform(0, 1000, 200))
+        timestamps[[50, 120]] = timestamps[[120, 50]]
+        ticks = self._get_ticks(timestamps.tolist(), (100 + rng.normal(size=200)).tolist())
+
+        batch_aggregator = BarAggregator('test', batch_threshold=1)
+        batch_aggregator.add_bar(self.instrument, '1m', 'bar.XBT/USD.1m')
+        batch_aggregator.add_bar(self.instrument, '15m', 'bar.XBT/USD.15m')
+
+        event_list = self.aggregator.update(self.instrument, ticks[:100]) + self.aggregator.update(self.instrument, ticks[100:])
+        batch_event_list = batch_aggregator.update(self.instrument, ticks[:100]) + batch_aggregator.update(self.instrument, ticks[100:])
+
+        self._assert_equal_events(event_list, batch_event_list)
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock
+
+from clients.connection_manager import ConnectionManager
+from clients.ftx.ftx_websocket import FTXWebsocketClient
+from clients.kraken.futures.kraken_futures_ws import KrakenFuturesWSClient
+
+API_KEYS = {'key': 'key', 'secret': 'secret'}
+
+
+class TestConnectionManager(unittest.IsolatedAsyncioTestCase):
+    """
+    Unittest to test implementation of the process-level connection manager
+    """
+    def setUp(self):
+        self.manager = ConnectionManager()
+
+    def test_shared_clients(self):
+        client_1 = self.manager.acquire_websocket_client(FTXWebsocketClient, API_KEYS, subaccount='sub_1')
+        client_2 = self.manager.acquire_websocket_client(FTXWebsocketClient, API_KEYS, subaccount='sub_1')
+        client_3 = self.manager.acquire_websocket_client(FTXWebsocketClient, API_KEYS, subaccount='sub_2')
+        client_4 = self.manager.acquire_websocket_client(KrakenFuturesWSClient, API_KEYS)
+
+        self.assertIs(client_1, client_2)
+        self.assertIsNot(client_1, client_3)
+        self.assertIsInstance(client_4, KrakenFuturesWSClient)
+        self.assertEqual(client_1.subaccount, 'sub_1')
+        self.assertEqual(self.manager.get_ref_count(client_1), 2)
+
+    async def test_release_closes_last_reference(self):
+        client = self.manager.acquire_websocket_client(FTXWebsocketClient, API_KEYS)
+        self.manager.acquire_websocket_client(FTXWebsocketClient, API_KEYS)
+        client.is_running = True
+        client.close = AsyncMock()
+
+        await self.manager.release_websocket_client(client)
+        client.close.assert_not_awaited()
+
+        await self.manager.release_websocket_client(client)
+        client.close.assert_awaited_once()
+        self.assertEqual(self.manager.get_ref_count(client), 0)
+
+        # Once released, a new client is created for the same account
+        self.assertIsNot(self.manager.acquire_websocket_client(FTXWebsocketClient, API_KEYS), client)
+
+    def test_shared_bar_store_writer(self):
+        with tempfile.TemporaryDirectory() as root:
+            writer_1 = self.manager.acquire_bar_store_writer(root, 'ftx')
+            writer_2 = self.manager.acquire_bar_store_writer(os.path.join(root, '.'), 'ftx')
+            writer_3 = self.manager.acquire_bar_store_writer(root, 'kraken')
+            self.assertIs(writer_1, writer_2)
+            self.assertIsNot(writer_1, writer_3)
+
+            self.manager.release_bar_store_writer(writer_1)
+            self.assertTrue(writer_1._thread.is_alive())
+            self.manager.release_bar_store_writer(writer_2)
+            self.manager.release_bar_store_writer(writer_3)
+            self.assertFalse(writer_1._thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
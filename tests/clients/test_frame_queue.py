@@ -0,0 +1,63 @@
+import asyncio
+import unittest
+
+from clients.frame_queue import FrameQueue, OverflowPolicy
+
+
+class TestFrameQueue(unittest.IsolatedAsyncioTestCase):
+    """
+    Unittest to test implementation of the frame queue between websocket receive loop and message dispatcher
+    """
+    async def test_fifo(self):
+        queue = FrameQueue(maxsize=3)
+        for frame in ['a', 'b', 'c']:
+            await queue.put(frame)
+
+        self.assertEqual([await queue.get() for _ in range(3)], ['a', 'b', 'c'])
+        self.assertEqual(queue.get_stats(), {'depth': 0, 'max_depth': 3, 'enqueued': 3, 'dropped': 0, 'conflated': 0})
+
+    async def test_block(self):
+        queue = FrameQueue(maxsize=1, policy='block')
+        await queue.put('a')
+
+        put_task = asyncio.create_task(queue.put('b'))
+        await asyncio.sleep(0)
+        self.assertFalse(put_task.done())
+
+        self.assertEqual(await queue.get(), 'a')
+        await put_task
+        self.assertEqual(await queue.get(), 'b')
+        self.assertEqual(queue.get_stats()['dropped'], 0)
+
+    async def test_drop_oldest(self):
+        queue = FrameQueue(maxsize=2, policy=OverflowPolicy.DROP_OLDEST)
+        for frame in ['a', 'b', 'c']:
+            await queue.put(frame)
+
+        self.assertEqual([await queue.get(), await queue.get()], ['b', 'c'])
+        self.assertEqual(queue.get_stats()['dropped'], 1)
+
+    async def test_conflate(self):
+        queue = FrameQueue(maxsize=10, policy=OverflowPolicy.CONFLATE)
+        await queue.put('ticker_1', 'ticker.BTC-PERP')
+        await queue.put('trades_1')
+        await queue.put('ticker_2', 'ticker.BTC-PERP')
+        await queue.put('ticker_3', 'ticker.ETH-PERP')
+
+        self.assertEqual(len(queue), 3)
+        self.assertEqual([await queue.get() for _ in range(3)], ['ticker_2', 'trades_1', 'ticker_3'])
+        self.assertEqual(queue.get_stats()['conflated'], 1)
+
+        # Once dispatched, a frame can no longer be conflated
+        await queue.put('ticker_4', 'ticker.BTC-PERP')
+        self.assertEqual(await queue.get(), 'ticker_4')
+
+    async def test_conflation_key_ignored_without_conflate_policy(self):
+        queue = FrameQueue(maxsize=10)
+        await queue.put('ticker_1', 'ticker.BTC-PERP')
+        await queue.put('ticker_2', 'ticker.BTC-PERP')
+        self.assertEqual(len(queue), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import json
+import unittest
+
+from clients.json_decoder import JSONDecoder, JSON_BACKENDS, peek_field, peek_list_tail
+
+
+class TestJSONDecoder(unittest.TestCase):
+    """
+    Unittest to test implementation of JSON decoder shared by websocket clients
+    """
+    def test_backends(self):
+        frame = json.dumps({'channel': 'trades', 'data': [{'price': 31708.0, 'size': 0.0786, 'liquidation': False}]})
+        for backend in JSON_BACKENDS.keys():
+            decoder = JSONDecoder(backend)
+            self.assertEqual(decoder.backend, backend)
+            self.assertEqual(decoder.loads(frame), json.loads(frame))
+
+    def test_backend_fallback(self):
+        self.assertEqual(JSONDecoder('not_a_backend').backend, 'json')
+        self.assertEqual(JSONDecoder().backend, next(iter(JSON_BACKENDS)))
+
+    def test_peek_field(self):
+        frame = '{"channel": "trades", "market": "BTC-PERP", "type": "update", "data": []}'
+        self.assertEqual(peek_field(frame, 'channel'), 'trades')
+        self.assertEqual(peek_field(frame.encode(), 'market'), 'BTC-PERP')
+        self.assertIsNone(peek_field(frame, 'feed'))
+
+        # Fields outside of the peek window are not found
+        self.assertIsNone(peek_field('{"data": "%s", "channel": "trades"}' % ('x' * 200), 'channel'))
+
+    def test_peek_list_tail(self):
+        self.assertEqual(peek_list_tail('[0,[["5541.2","0.1"]],"trade","XBT/USD"]'), ('trade', 'XBT/USD'))
+        self.assertIsNone(peek_list_tail('[[{"id": 1}],"openOrders",{"sequence":1}]'))
@@ -0,0 +1,69 @@
+import json
+import unittest
+from unittest.mock import Mock
+
+from clients.latency import LatencyHistogram, LatencyMonitor, StampedFrame, EXCHANGE_TO_RECEIVE, RECEIVE_TO_PARSE, PARSE_TO_DISPATCH
+from clients.ftx.ftx_websocket import FTXWebsocketClient
+from tests.clients.ftx.test_ftx_websocket import TRADES_MSG
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """
+    Unittest to test implementation of latency histogram
+    """
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(50))
+
+        for latency in [0.001] * 98 + [0.1, 0.5]:
+            histogram.record(latency)
+
+        stats = histogram.get_stats()
+        self.assertEqual(stats['count'], 100)
+        self.assertAlmostEqual(stats['p50'], 0.001, delta=0.001 * 0.1)
+        self.assertAlmostEqual(stats['p99'], 0.1, delta=0.1 * 0.1)
+        self.assertEqual(stats['max'], 0.5)
+
+    def test_out_of_range(self):
+        histogram = LatencyHistogram()
+        histogram.record(-0.01)
+        histogram.record(1e9)
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(histogram.min, -0.01)
+        self.assertEqual(histogram.percentile(100), 1e9)
+
+
+class TestLatencyMonitor(unittest.TestCase):
+    """
+    Unittest to test latency instrumentation of websocket clients
+    """
+    def test_sampling(self):
+        monitor = LatencyMonitor(sample_every=3)
+        frames = [monitor.stamp_frame('{}') for _ in range(6)]
+        self.assertEqual([isinstance(frame, StampedFrame) for frame in frames], [False, False, True] * 2)
+        self.assertRaises(ValueError, LatencyMonitor, 0)
+
+    def test_instrumented_dispatch(self):
+        client = FTXWebsocketClient({}, latency_sample_every=1)
+        consumer = Mock()
+        client._consumer_subscriptions['trades.BTC-PERP'].append(consumer)
+
+        frame = client._latency_monitor.stamp_frame(json.dumps(TRADES_MSG))
+        client._on_stamped_frame(frame)
+
+        self.assertEqual(consumer.handle_event.call_count, 2)
+        event = consumer.handle_event.call_args[0][0]
+        self.assertEqual(event.received_at, frame.received_at)
+        self.assertGreaterEqual(event.dispatched_at, event.received_at)
+
+        (stats_key, stats), = client.get_latency_stats().items()
+        self.assertEqual(stats_key, ('trades', 'BTC-PERP'))
+        self.assertEqual(stats[EXCHANGE_TO_RECEIVE]['count'], 2)
+        self.assertEqual(stats[RECEIVE_TO_PARSE]['count'], 2)
+        self.assertGreaterEqual(stats[PARSE_TO_DISPATCH]['p99'], 0.0)
+        self.assertEqual(client.get_latency_stats(channel='ticker'), {})
+
+    def test_disabled(self):
+        client = FTXWebsocketClient({})
+        self.assertIsNone(client._latency_monitor)
+        self.assertEqual(client.get_latency_stats(), {})
@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+from core.const import FTX_NAME_TO_INSTRUMENTS
+from clients.connection_manager import ConnectionManager
+from clients.ftx.ftx_websocket import FTXWebsocketClient
+from clients.sharded_websocket import ShardedWebsocketClient
+from tests.clients.ftx.test_ftx_websocket import TRADES_MSG
+
+API_KEYS = {'key': 'key', 'secret': 'secret'}
+
+
+class TestShardedWebsocketClient(unittest.IsolatedAsyncioTestCase):
+    """
+    Unittest to test implementation of sharded websocket client
+    """
+    def setUp(self):
+        self.client = ShardedWebsocketClient(
+            FTXWebsocketClient,
+            api_keys=API_KEYS,
+            num_shards=3,
+            shard_groups=[['btc_usd_perp', 'eth_usd_perp'], ['LTC-PERP']],
+            subaccount='sub'
+        )
+        for shard in self.client.shards:
+            shard.ws = AsyncMock()
+
+    def test_shard_assignment(self):
+        shards = self.client.shards
+        self.assertEqual(len(shards), 3)
+        self.assertEqual(shards[2].subaccount, 'sub')
+        self.assertIs(self.client._get_shard(FTX_NAME_TO_INSTRUMENTS['btc_usd_perp']), shards[0])
+        self.assertIs(self.client._get_shard(FTX_NAME_TO_INSTRUMENTS['eth_usd_perp']), shards[0])
+        self.assertIs(self.client._get_shard(FTX_NAME_TO_INSTRUMENTS['ltc_usd_perp']), shards[1])
+        self.assertIs(self.client._get_shard(), shards[0])
+
+        # Instruments without explicit group are assigned by a stable hash
+        instrument = FTX_NAME_TO_INSTRUMENTS['xrp_usd_perp']
+        self.assertIs(self.client._get_shard(instrument), self.client._get_shard(instrument))
+
+    async def test_shared_consumer_registry(self):
+        instrument = FTX_NAME_TO_INSTRUMENTS['btc_usd_perp']
+        consumer = Mock()
+        await self.client.subscribe_trades(instrument, consumer)
+        await self.client.subscribe_orders(consumer)
+
+        shard = self.client.shards[0]
+        self.assertEqual(shard._feed_subscriptions, {'trades.BTC-PERP', 'orders'})
+        self.assertEqual(self.client.shards[1]._feed_subscriptions, set())
+        self.assertEqual(self.client._consumer_subscriptions['trades.BTC-PERP'], [consumer])
+
+        shard._on_message(TRADES_MSG)
+        self.assertEqual(consumer.handle_event.call_count, 2)
+
+        await self.client.unsubscribe_trades(instrument, consumer)
+        self.assertEqual(shard._feed_subscriptions, {'orders'})
+
+    async def test_start(self):
+        async def start_shard(shard, keepalive):
+            shard.is_running = True
+            while shard.is_running:
+                await asyncio.sleep(0.01)
+
+        for shard in self.client.shards:
+            shard.start = lambda keepalive, shard=shard: start_shard(shard, keepalive)
+        task = asyncio.create_task(self.client.start())
+        await asyncio.sleep(0.2)
+        self.assertTrue(self.client.is_running)
+
+        for shard in self.client.shards:
+            shard.is_running = False
+        await asyncio.wait_for(task, 1.0)
+        self.assertFalse(self.client.is_running)
+
+    async def test_start_failure(self):
+        # Exceptions of shards failing to connect are propagated and stop the other shards
+        async def connect_slowly(keepalive):
+            await asyncio.sleep(10)
+
+        shards = self.client.shards
+        shards[0].start = shards[2].start = connect_slowly
+        shards[1].start = AsyncMock(side_effect=ConnectionRefusedError('refused'))
+        with self.assertRaises(ConnectionRefusedError):
+            await self.client.start()
+        self.assertFalse(self.client.is_running)
+
+        # Shards which do not connect in time
+        client = ShardedWebsocketClient(FTXWebsocketClient, api_keys=API_KEYS, num_shards=2, start_timeout=0.2)
+        for shard in client.shards:
+            shard.start = connect_slowly
+        with self.assertRaises(ConnectionError):
+            await client.start()
+
+    def test_reject_messages(self):
+        with self.assertRaises(TypeError):
+            self.client._handle_message(TRADES_MSG)
+        with self.assertRaises(TypeError):
+            self.client._on_message(TRADES_MSG)
+
+    def test_connection_manager(self):
+        manager = ConnectionManager()
+        client = manager.acquire_websocket_client(FTXWebsocketClient, API_KEYS, num_shards=2)
+        self.assertIsInstance(client, ShardedWebsocketClient)
+        self.assertIs(manager.acquire_websocket_client(FTXWebsocketClient, API_KEYS), client)
+
+
+if __name__ == '__main__':
+    unittest.main()
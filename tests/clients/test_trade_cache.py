@@ -0,0 +1,33 @@
+import os
+import json
+import pickle
+import tempfile
+import unittest
+
+from clients.trade_cache import get_cache_path, load_trade_frames, save_trade_frames
+
+
+class TestTradeCache(unittest.TestCase):
+    """
+    Unittest to test the on-disk cache of fetched trade frames
+    """
+    def test_save_and_load(self):
+        frames = [(1.0, json.dumps({'data': [1]})), (2.5, json.dumps({'data': [2, 3]}))]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = get_cache_path(cache_dir, 'ftx', 'BTC/USD')
+            save_trade_frames(path, frames)
+            self.assertEqual(os.path.basename(path), 'ftx_BTC-USD.jsonl')
+            self.assertEqual(load_trade_frames(path), frames)
+            self.assertEqual(load_trade_frames(path, since=2.0), frames[1:])
+
+            # Caches are JSON lines; other content (e.g. pickles of former caches) is discarded without being loaded
+            with open(path) as f:
+                self.assertEqual([json.loads(line) for line in f], [list(frame) for frame in frames])
+            with open(path, 'wb') as f:
+                pickle.dump(frames, f)
+            self.assertEqual(load_trade_frames(path), [])
+            self.assertEqual(load_trade_frames(os.path.join(cache_dir, 'missing.jsonl')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from core.const import KRAKEN_NAME_TO_INSTRUMENTS
+from core.order_book import OrderBook
+
+
+class TestOrderBook(unittest.TestCase):
+    """
+    Unittest to test implementation of order book
+    """
+    def setUp(self):
+        self.book = OrderBook(KRAKEN_NAME_TO_INSTRUMENTS['btc_usd'], depth=3)
+        self.book.apply_snapshot([(100.0, 1.0), (99.0, 2.0), (98.0, 3.0)], [(101.0, 1.5), (102.0, 2.5)], 1.0)
+
+    def test_snapshot(self):
+        self.assertTrue(self.book.is_valid)
+        self.assertEqual(self.book.best_bid(), (100.0, 1.0))
+        self.assertEqual(self.book.best_ask(), (101.0, 1.5))
+        self.assertEqual(self.book.bids.levels(), [(100.0, 1.0), (99.0, 2.0), (98.0, 3.0)])
+
+    def test_update(self):
+        self.book.update(True, 99.5, 4.0)
+        self.book.update(True, 100.0, 0.0)
+        self.book.update(False, 102.0, 5.0)
+        self.book.update(False, 103.0, 0.0)
+        self.book.end_update(2.0)
+
+        book = self.book.get_book(2)
+        self.assertEqual(book.timestamp, 2.0)
+        self.assertEqual(book.bids, [(99.5, 4.0), (99.0, 2.0)])
+        self.assertEqual(book.asks, [(101.0, 1.5), (102.0, 5.0)])
+        self.assertEqual(self.book.bids.get_size(98.0), 3.0)
+
+    def test_truncate(self):
+        self.book.update(True, 100.5, 1.0)
+        self.book.end_update()
+        self.assertEqual(len(self.book.bids), 3)
+        self.assertEqual(self.book.bids.get_size(98.0), 0.0)
+
+    def test_unbounded_depth(self):
+        # Levels of books without depth limit are inserted and removed in any order
+        book = OrderBook(KRAKEN_NAME_TO_INSTRUMENTS['btc_usd'])
+        book.apply_snapshot([], [], 1.0)
+        prices = [100.0 + (idx * 7919) % 5000 / 10 for idx in range(5000)]
+        for price in prices:
+            book.update(False, price, 1.0)
+            book.update(True, price - 1000.0, 2.0)
+        for price in prices[::2]:
+            book.update(False, price, 0.0)
+
+        asks = book.asks.levels()
+        self.assertEqual(len(asks), 2500)
+        self.assertEqual(asks, sorted(asks))
+        self.assertEqual(book.best_ask(), asks[0])
+        self.assertEqual(book.best_bid(), (max(prices) - 1000.0, 2.0))
+        self.assertEqual(book.bids.get_size(prices[0] - 1000.0), 2.0)
+
+    def test_invalidate(self):
+        self.book.invalidate()
+        self.assertFalse(self.book.is_valid)
+        self.assertIsNone(self.book.best_bid())
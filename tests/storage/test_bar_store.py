@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from core.bar import BarSnapshot
+from core.events import BarEvent
+from core.const import KRAKEN_NAME_TO_INSTRUMENTS
+from storage.bar_store import BAR_COLUMNS, BarStore, BarStoreWriter
+
+
+class TestBarStore(unittest.TestCase):
+    """
+    Unittest to test implementation of the columnar on-disk bar store
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = BarStore(self.tmp_dir.name)
+        self.instrument = KRAKEN_NAME_TO_INSTRUMENTS['btc_usd']
+        # Hour bars of two and a half days, starting at 2021-07-21 00:00 UTC
+        self.bars = [
+            BarSnapshot(self.instrument, '1h', 1626825600.0 + 3600 * idx, 100.0 + idx, 101.0 + idx, 99.0 + idx, 100.5 + idx, 1.0, True)
+            for idx in range(60)
+        ]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_append_and_read(self):
+        self.assertEqual(self.store.append('kraken', 'XBT/USD', '1h', self.bars[:30]), 30)
+        # Bars already stored are skipped, also by a new store instance
+        self.assertEqual(BarStore(self.tmp_dir.name).append('kraken', 'XBT/USD', '1h', self.bars[20:]), 30)
+
+        columns = self.store.read('kraken', 'XBT/USD', '1h')
+        np.testing.assert_array_equal(columns['timestamp'], [int(bar.timestamp * 1e9) for bar in self.bars])
+        np.testing.assert_array_equal(columns['close'], [bar.close for bar in self.bars])
+
+        # Ranges within a day are memory-mapped views, ranges across days are concatenated
+        columns = self.store.read('kraken', 'XBT/USD', '1h', start=1626825600.0 + 3600 * 2, end=1626825600.0 + 3600 * 5)
+        self.assertIsInstance(columns['close'], np.memmap)
+        np.testing.assert_array_equal(columns['open'], [102.0, 103.0, 104.0, 105.0])
+        columns = self.store.read('kraken', 'XBT/USD', '1h', start=1626825600.0 + 3600 * 23.5, end=1626825600.0 + 3600 * 48)
+        np.testing.assert_array_equal(columns['open'], 100.0 + np.arange(24, 49))
+        self.assertEqual(len(self.store.read('kraken', 'XBT/USD', '1m')['timestamp']), 0)
+
+    def test_interrupted_append(self):
+        # Rows of an append interrupted after the first columns are dropped before the next append
+        self.store.append('kraken', 'XBT/USD', '1h', self.bars[:2])
+        partition_dir = os.path.join(self.tmp_dir.name, 'kraken', 'XBT-USD', '1h', '2021-07-21')
+        for name in ['timestamp', 'open']:
+            with open(os.path.join(partition_dir, name), 'ab') as f:
+                f.write(np.zeros(1, dtype=BAR_COLUMNS[name]).tobytes())
+
+        BarStore(self.tmp_dir.name).append('kraken', 'XBT/USD', '1h', self.bars[2:4])
+        columns = self.store.read('kraken', 'XBT/USD', '1h')
+        np.testing.assert_array_equal(columns['timestamp'], [int(bar.timestamp * 1e9) for bar in self.bars[:4]])
+        np.testing.assert_array_equal(columns['open'], [bar.open for bar in self.bars[:4]])
+
+    def test_same_timestamp(self):
+        # Tick bars completed within the same trade timestamp are told apart by their sequence number
+        bars = [
+            BarSnapshot(self.instrument, 'tick:2', 1626900540.0, 100.0, 101.0, 100.0, 101.0, 2.0, True, 0),
+            BarSnapshot(self.instrument, 'tick:2', 1626900540.0, 102.0, 103.0, 102.0, 103.0, 2.0, True, 1),
+            BarSnapshot(self.instrument, 'tick:2', 1626900541.0, 104.0, 105.0, 104.0, 105.0, 2.0, True, 2)
+        ]
+        writer = BarStoreWriter(self.store, 'kraken')
+        for bar in bars:
+            writer.handle_event(BarEvent(bar))
+            writer.handle_event(BarEvent(bar))
+        writer.close()
+        self.assertEqual(self.store.read('kraken', 'XBT/USD', 'tick:2')['close'].tolist(), [101.0, 103.0, 105.0])
+
+        # Bars already stored are skipped by the same store; bars of the last timestamp on disk by a new store
+        self.assertEqual(self.store.append('kraken', 'XBT/USD', 'tick:2', bars), 0)
+        self.assertEqual(BarStore(self.tmp_dir.name).append('kraken', 'XBT/USD', 'tick:2', bars), 0)
+
+    def test_writer(self):
+        # Bars received by multiple consumers sharing the writer are written once
+        writer = BarStoreWriter(self.store, 'kraken')
+        for bar in self.bars:
+            writer.handle_event(BarEvent(bar))
+            writer.handle_event(BarEvent(bar))
+            writer.handle_event(BarEvent(bar._replace(is_closed=False)))
+        writer.close()
+        self.assertEqual(len(self.store.read('kraken', 'XBT/USD', '1h')['timestamp']), 60)
@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from typing import Dict
+from unittest.mock import AsyncMock, Mock, patch
+
+import pandas as pd
+
+from backtest.simulated_execution import SimulatedExecutionEngine
+from clients.connection_manager import connection_manager
+from strategy.bar_strategy_base import BarStrategyBase
+from tests.clients.ftx.test_ftx_websocket import TRADES_MSG
+from strategy.strategy_implementations.example_strategy import ExampleBarStrategy
+from tests.backtest.test_backtest_engine import get_config
+
+
+class PricesOnlyStrategy(BarStrategyBase):
+    def __init__(self, config: Dict, strategy_name: str = 'prices_only_strategy'):
+        super().__init__(config, strategy_name)
+
+    def _calculate_target_position(self, price_dfs: Dict[str, pd.DataFrame]) -> pd.Series:
+        return pd.Series({name: 0.0 for name in price_dfs})
+
+
+class TestBarStrategyBase(unittest.TestCase):
+    """
+    Unittest to test the configuration of bar strategies
+    """
+    def test_price_panel(self):
+        config = get_config(SimulatedExecutionEngine)
+        config['strategy_params']['price_panel'] = True
+        strategy = ExampleBarStrategy(config)
+        self.assertIsNotNone(strategy._price_panel)
+        asyncio.run(strategy.close())
+
+        # Strategies without panel counterpart of _calculate_target_position are rejected before acquiring clients
+        config['exchange']['api_keys'] = {'key': 'prices_only'}
+        with self.assertRaises(ValueError):
+            PricesOnlyStrategy(config)
+        self.assertFalse(PricesOnlyStrategy._supports_price_panel())
+        self.assertTrue(ExampleBarStrategy._supports_price_panel())
+
+        config['strategy_params']['price_panel'] = False
+        strategy = PricesOnlyStrategy(config)
+        self.assertIsNone(strategy._price_panel)
+        self.assertEqual(connection_manager.get_ref_count(strategy._websocket_client), 1)
+        asyncio.run(strategy.close())
+        self.assertEqual(connection_manager.get_ref_count(strategy._websocket_client), 0)
+
+    def test_warm_up(self):
+        # Live bars received during the warm-up are processed after the warm-up bars
+        live_trade = {**TRADES_MSG['data'][1], 'id': 1468501600, 'time': '2021-07-21T20:51:12.908392+00:00'}
+        config = get_config(SimulatedExecutionEngine)
+        config['exchange']['api_keys'] = {'key': 'warm_up'}
+        config['strategy_params'] = {**config['strategy_params'], 'bar_updates': 'all', 'warm_up': True}
+
+        async def run_test():
+            strategy = ExampleBarStrategy(config)
+            client = strategy._websocket_client
+            client.ws = AsyncMock()
+
+            def get_all_trades(market, start_time):
+                client._on_message({**TRADES_MSG, 'data': [live_trade]})
+                return TRADES_MSG['data']
+
+            strategy._api_client.get_all_trades = Mock(side_effect=get_all_trades)
+            client.set_api_client(strategy._api_client)
+            with patch('strategy.bar_strategy_base.time.time', return_value=1626900680.0):
+                await strategy._get_historical_price_data()
+            await strategy.close()
+            return strategy
+
+        strategy = asyncio.run(run_test())
+        price_buffer = strategy._price_buffers['btc_usd_perp']
+        self.assertEqual(price_buffer.get_timestamps().tolist(), [1626900540 * 10 ** 9, 1626900600 * 10 ** 9, 1626900660 * 10 ** 9])
+        self.assertEqual(price_buffer.get_values()[:, 3].tolist(), [31708.0, 31710.0, 31710.0])
+        self.assertFalse(strategy._is_warming_up)
+        self.assertIsNone(strategy._pending_bar_events)
+
+
+if __name__ == '__main__':
+    unittest.main()
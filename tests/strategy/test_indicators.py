@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from core.bar import BarSnapshot
+from core.const import KRAKEN_NAME_TO_INSTRUMENTS
+from strategy.indicators import ATR, RSI, get_indicator
+
+
+class TestIndicators(unittest.TestCase):
+    """
+    Unittest to test implementation of streaming indicators against their pandas counterparts
+    """
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        closes = 30000 + np.cumsum(rng.normal(0, 50, 500))
+        self.df = pd.DataFrame({
+            'open': closes + rng.normal(0, 10, 500),
+            'high': closes + rng.uniform(10, 60, 500),
+            'low': closes - rng.uniform(10, 60, 500),
+            'close': closes,
+            'volume': rng.exponential(2, 500)
+        })
+        instrument = KRAKEN_NAME_TO_INSTRUMENTS['btc_usd']
+        self.bars = [
+            BarSnapshot(instrument, '1m', 60.0 * idx, row.open, row.high, row.low, row.close, row.volume, True)
+            for idx, row in enumerate(self.df.itertuples())
+        ]
+
+    def _get_values(self, indicator):
+        values = []
+        for bar in self.bars:
+            indicator.update(bar)
+            values.append(indicator.value if indicator.is_ready else np.nan)
+        return np.array(values, dtype=float)
+
+    def test_rolling_indicators(self):
+        close, high, low, volume = self.df['close'], self.df['high'], self.df['low'], self.df['volume']
+        rolling_std = close.rolling(20).std()
+        for params, expected in [
+            ({'type': 'sma', 'period': 20}, close.rolling(20).mean()),
+            ({'type': 'ema', 'period': 20}, close.ewm(span=20, adjust=False).mean().where(close.index >= 19)),
+            ({'type': 'std', 'period': 20}, rolling_std),
+            ({'type': 'zscore', 'period': 20}, (close - close.rolling(20).mean()) / rolling_std),
+            ({'type': 'cov', 'period': 30, 'field_x': 'close', 'field_y': 'volume'}, close.rolling(30).cov(volume)),
+            ({'type': 'max', 'period': 15}, high.rolling(15).max()),
+            ({'type': 'min', 'period': 15, 'field': 'close'}, close.rolling(15).min())
+        ]:
+            np.testing.assert_allclose(self._get_values(get_indicator(params)), expected.to_numpy(), rtol=1e-9, atol=1e-8, err_msg=str(params))
+
+    def test_wilder_indicators(self):
+        # Wilder's smoothing seeded with the mean of the first period values
+        high, low, close = self.df['high'], self.df['low'], self.df['close']
+        prev_close = close.shift(1)
+        true_range = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+        expected_atr = [np.nan] * 13 + [true_range[:14].mean()]
+        for value in true_range[14:]:
+            expected_atr.append(expected_atr[-1] + (value - expected_atr[-1]) / 14)
+        np.testing.assert_allclose(self._get_values(ATR(14)), expected_atr, rtol=1e-9)
+
+        change = close.diff()
+        gains, losses = change.clip(lower=0), (-change).clip(lower=0)
+        avg_gain, avg_loss = gains[1:15].mean(), losses[1:15].mean()
+        expected_rsi = [np.nan] * 14 + [100 - 100 / (1 + avg_gain / avg_loss)]
+        for gain, loss in zip(gains[15:], losses[15:]):
+            avg_gain += (gain - avg_gain) / 14
+            avg_loss += (loss - avg_loss) / 14
+            expected_rsi.append(100 - 100 / (1 + avg_gain / avg_loss))
+        np.testing.assert_allclose(self._get_values(RSI(14)), expected_rsi, rtol=1e-9)
+
+    def test_invalid_indicators(self):
+        self.assertRaises(ValueError, get_indicator, {'type': 'macd', 'period': 20})
+        self.assertRaises(ValueError, get_indicator, {'type': 'sma', 'period': 0})
+        self.assertIsNone(get_indicator({'type': 'sma', 'period': 2}).value)
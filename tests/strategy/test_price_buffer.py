@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from core.bar import BarSnapshot
+from core.const import KRAKEN_NAME_TO_INSTRUMENTS
+from strategy.price_buffer import PriceBuffer, get_buffer_capacity
+
+
+class TestPriceBuffer(unittest.TestCase):
+    """
+    Unittest to test implementation of the ring buffer of price bars
+    """
+    def setUp(self):
+        self.instrument = KRAKEN_NAME_TO_INSTRUMENTS['btc_usd']
+
+    def _get_bar(self, timestamp: float, close: float) -> BarSnapshot:
+        return BarSnapshot(self.instrument, '1m', timestamp, close - 1, close + 1, close - 2, close, 1.0, False)
+
+    def test_update(self):
+        price_buffer = PriceBuffer(3)
+        self.assertTrue(price_buffer.update(self._get_bar(1626900540.0, 100.0)))
+        self.assertFalse(price_buffer.update(self._get_bar(1626900540.0, 101.0)))
+        self.assertTrue(price_buffer.update(self._get_bar(1626900600.0, 102.0)))
+
+        # Updates of the current bar overwrite it, outdated bars are ignored
+        self.assertFalse(price_buffer.update(self._get_bar(1626900540.0, 99.0)))
+        np.testing.assert_array_equal(price_buffer.get_values()[:, 3], [101.0, 102.0])
+        self.assertEqual(price_buffer.last_timestamp, 1626900600 * 10 ** 9)
+
+    def test_information_bars(self):
+        # Tick bars completed within the same trade timestamp are appended as separate rows
+        price_buffer = PriceBuffer(4)
+        bars = [
+            BarSnapshot(self.instrument, 'tick:2', 1626900540.0, 100.0, 101.0, 100.0, 101.0, 2.0, False),
+            BarSnapshot(self.instrument, 'tick:2', 1626900540.0, 100.0, 101.0, 100.0, 101.0, 2.0, True),
+            BarSnapshot(self.instrument, 'tick:2', 1626900540.0, 102.0, 102.0, 102.0, 102.0, 1.0, False),
+            BarSnapshot(self.instrument, 'tick:2', 1626900540.0, 102.0, 103.0, 102.0, 103.0, 2.0, True),
+            BarSnapshot(self.instrument, 'tick:2', 1626900540.0, 104.0, 105.0, 104.0, 105.0, 2.0, True)
+        ]
+        self.assertEqual([price_buffer.update(bar) for bar in bars], [True, False, True, False, True])
+        np.testing.assert_array_equal(price_buffer.get_values()[:, 3], [101.0, 103.0, 105.0])
+        np.testing.assert_array_equal(price_buffer.get_timestamps(), [1626900540 * 10 ** 9] * 3)
+
+    def test_wrap_around(self):
+        # The last capacity bars are kept in order and viewed without copying
+        price_buffer = PriceBuffer(4)
+        for idx in range(11):
+            price_buffer.update(self._get_bar(1626900540.0 + 60 * idx, 100.0 + idx))
+            closes = price_buffer.get_values()[:, 3]
+            np.testing.assert_array_equal(closes, 100.0 + np.arange(max(idx - 3, 0), idx + 1))
+            self.assertTrue(np.all(np.diff(price_buffer.get_timestamps()) == 60 * 10 ** 9))
+        self.assertEqual(len(price_buffer), 4)
+        self.assertTrue(np.shares_memory(price_buffer.to_frame().values, price_buffer.get_values()))
+
+    def test_to_frame(self):
+        # Data frames equal the data frames previously maintained by appending rows and slicing the time window
+        rng = np.random.default_rng(0)
+        price_buffer = PriceBuffer(get_buffer_capacity(10, 60, 0))
+        price_df = pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume'])
+        timestamp = 1626900540.0
+        for _ in range(100):
+            timestamp += 60 * int(rng.integers(0, 3))
+            bar = self._get_bar(timestamp, float(rng.normal(100)))
+            price_buffer.update(bar)
+            candle_ts = pd.Timestamp(bar.timestamp, unit='s', tz='utc')
+            price_df.loc[candle_ts, :] = {'open': bar.open, 'high': bar.high, 'low': bar.low, 'close': bar.close, 'volume': bar.volume}
+            price_df = price_df.loc[candle_ts - pd.Timedelta('10min'):candle_ts]
+
+            end = candle_ts - pd.Timedelta('1min')
+            price_frame = price_buffer.to_frame(candle_ts - pd.Timedelta('10min'), end)
+            pd.testing.assert_frame_equal(price_frame, price_df.loc[:end].astype(float), check_freq=False, check_index_type=False)
+
+    def test_buffer_capacity(self):
+        self.assertEqual(get_buffer_capacity(60, 60.0, 1000), 61)
+        self.assertEqual(get_buffer_capacity(60, 7.0, 1000), 516)
+        self.assertEqual(get_buffer_capacity(60, None, 1000), 1000)
+        self.assertRaises(ValueError, PriceBuffer, 0)
@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+
+from core.bar import BarSnapshot
+from core.const import KRAKEN_NAME_TO_INSTRUMENTS
+from strategy.price_panel import PricePanel
+
+NS = 10 ** 9
+
+
+class TestPricePanel(unittest.TestCase):
+    """
+    Unittest to test implementation of the time-aligned price panel of multiple instruments
+    """
+    def setUp(self):
+        self.btc = KRAKEN_NAME_TO_INSTRUMENTS['btc_usd']
+        self.eth = KRAKEN_NAME_TO_INSTRUMENTS['eth_usd']
+        self.panel = PricePanel([self.btc.name, self.eth.name], 4)
+
+    def _get_bar(self, instrument, timestamp: float, close: float) -> BarSnapshot:
+        return BarSnapshot(instrument, '1m', timestamp, close - 1, close + 1, close - 2, close, 1.0, False)
+
+    def test_alignment(self):
+        self.assertFalse(self.panel.update(self._get_bar(self.btc, 60.0, 100.0)))
+        self.assertFalse(self.panel.update(self._get_bar(self.eth, 60.0, 10.0)))
+        self.assertTrue(self.panel.update(self._get_bar(self.btc, 120.0, 101.0)))
+        self.assertEqual(self.panel.last_common_timestamp, 60 * NS)
+
+        # Bars of lagging instruments update their rows, bars between rows are ignored
+        self.assertFalse(self.panel.update(self._get_bar(self.eth, 60.0, 11.0)))
+        self.assertFalse(self.panel.update(self._get_bar(self.eth, 90.0, 12.0)))
+        self.assertTrue(self.panel.update(self._get_bar(self.eth, 120.0, 13.0)))
+
+        timestamps, prices = self.panel.get_window()
+        np.testing.assert_array_equal(timestamps, [60 * NS, 120 * NS])
+        np.testing.assert_array_equal(prices[:, :, 3], [[100.0, 11.0], [101.0, 13.0]])
+
+        close_df = self.panel.to_frame('close', end=60 * NS)
+        self.assertEqual(list(close_df.columns), [self.btc.name, self.eth.name])
+        self.assertEqual(close_df.iloc[-1].tolist(), [100.0, 11.0])
+
+    def test_wrap_around(self):
+        # Only the last capacity timestamps are kept; instruments without bar of a timestamp are NaN
+        for idx in range(10):
+            self.panel.update(self._get_bar(self.btc, 60.0 * idx, 100.0 + idx))
+            if idx % 2 == 0:
+                self.panel.update(self._get_bar(self.eth, 60.0 * idx, 10.0 + idx))
+
+        timestamps, prices = self.panel.get_window(start=7 * 60 * NS)
+        np.testing.assert_array_equal(timestamps, np.array([7, 8, 9]) * 60 * NS)
+        np.testing.assert_array_equal(prices[:, 0, 3], [107.0, 108.0, 109.0])
+        np.testing.assert_array_equal(prices[:, 1, 3], [np.nan, 18.0, np.nan])
+        self.assertEqual(len(self.panel), 4)
+        self.assertTrue(np.shares_memory(prices, self.panel._values))
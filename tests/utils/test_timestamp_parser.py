@@ -0,0 +1,36 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from utils.timestamp_parser import parse_timestamp
+
+
+class TestTimestampParser(unittest.TestCase):
+    """
+    Unittest to test implementation of ISO-8601 timestamp parsing
+    """
+    def test_exchange_formats(self):
+        for value in [
+            '2021-07-21T20:49:12.908392+00:00',
+            '2021-07-21T20:49:12.908+00:00',
+            '2021-07-21T20:49:12+00:00',
+            '2021-07-21T20:49:12.908392Z',
+            '2021-07-21 20:49:12.5+05:30',
+            '2021-07-21T20:49:12.1234567-03:00'
+        ]:
+            self.assertEqual(parse_timestamp(value), datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+
+    def test_random_timestamps(self):
+        # Timestamps are identical to datetime.timestamp(), i.e. rounded alike
+        rng = np.random.default_rng(0)
+        for timestamp, offset in zip(rng.uniform(0, 2e9, 10000).tolist(), rng.integers(-12, 12, 10000).tolist()):
+            value = datetime.fromtimestamp(timestamp, timezone(timedelta(hours=offset))).isoformat()
+            self.assertEqual(parse_timestamp(value), datetime.fromisoformat(value).timestamp())
+
+    def test_repeated_and_invalid_timestamps(self):
+        # Timestamps without UTC offset are interpreted in local time like by datetime
+        for _ in range(2):
+            self.assertEqual(parse_timestamp('2021-07-21T20:49:12'), datetime.fromisoformat('2021-07-21T20:49:12').timestamp())
+        self.assertRaises(ValueError, parse_timestamp, '2021-07-21T20:49:61+00:00')
+        self.assertRaises(ValueError, parse_timestamp, 'not a timestamp')
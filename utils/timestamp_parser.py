@@ -0,0 +1,23 @@
+from typing import Tuple
+
+from ciso8601 import parse_datetime
+
+# Last parsed timestamp string and its POSIX time; trades of a message (e.g. fills of a single taker order) frequently
+# share their timestamp
+_last_parsed: Tuple[str, float] = ('', 0.0)
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Converts an ISO-8601 timestamp (e.g. '2021-07-21T20:49:12.908392+00:00') into POSIX time by ciso8601. Results are
+    identical to datetime.fromisoformat(value).timestamp(), i.e. timestamps without UTC offset are interpreted in local
+    time. Repeated timestamps are not parsed again.
+    """
+    global _last_parsed
+    last_value, last_timestamp = _last_parsed
+    if value == last_value:
+        return last_timestamp
+
+    timestamp = parse_datetime(value).timestamp()
+    _last_parsed = (value, timestamp)
+    return timestamp